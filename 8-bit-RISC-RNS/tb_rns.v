@@ -178,7 +178,7 @@ always @(posedge clk100)
 begin
     if (proc_top1.stage_IFID.push_stack == 1'b1) 
     begin
-        $display("\n\nPushing %03h to stack ptr pos %0d. Stack contents before push:", proc_top1.prog_ctr, proc_top1.call_return_stack.sp);
+        $display("\n\nPushing %03h to stack ptr pos %0d at %0d ns. Stack contents before push:", proc_top1.prog_ctr, proc_top1.call_return_stack.sp, $time);
         for (L = 0; L < 8; L = L + 1)
         begin
             $display("%0d\t| %3h | %10b", L, proc_top1.call_return_stack.stack[L], proc_top1.call_return_stack.stack[L]);
@@ -186,7 +186,7 @@ begin
     end
     else if (proc_top1.stage_IFID.pop_stack == 1'b1) 
     begin
-        $display("\n\nPopping from stack.");
+        $display("\n\nPopping from stack at %0d ns.", $time);
         $display("Returning to sp pos %0d - From %03h\nStack contents:", proc_top1.call_return_stack.sp - 1, proc_top1.prog_ctr);
         for (L = 0; L < 8; L = L + 1)
         begin
@@ -1,73 +1,572 @@
 #This script will take the raw bytes output from a serial console log and verify their arithmetic correctness.
 #Written to currently target UART output from Full_Test.asm
+#Use --live to check the output as it arrives from the board's serial port instead of from a saved log.
 import sys
-from typing import TextIO
+import os
+import asyncio
+from math import lcm
+from time import perf_counter
+from typing import TextIO, BinaryIO
+
+import numpy as np
+
+from rns_golden import RNSModel
+
+# Each result is sent as two bytes: UNRLU (domain 1, mod 256) then UNRLL (domain 0, mod 129)
+RNS_MODEL = RNSModel()
+OUT_DOMAINS = (1, 0)
+OUT_MODULI = tuple(int(RNS_MODEL.moduli[dom]) for dom in OUT_DOMAINS)
+XONXOFF_BYTES = (0x11, 0x13)
+EXPECTED_OPS = {
+    "add": (lambda k: k + k, "{k}+{k}={v}"),
+    "mul": (lambda k: k * k, "{k}*{k}={v}"),
+}
+DEFAULT_SECTIONS = [("ENDADD", "add"), ("ENDMUL", "mul")]
+DEFAULT_BAUD = 9600 # rs232_uart's baud clock
 
 def get_file_bytes(file: TextIO) -> list:
     file.seek(0)
     return list(file.read())
 
 def split_list(bytelist: list, splits: list = ['ENDADD', 'ENDMUL']) -> list:
+    """
+    Bytes in front of each marker, in marker order. Each marker is searched for in what follows the last one found,
+    so a marker missing from the log is skipped and the next one still splits (unlike --stream / --live, which wait
+    for the markers in order). Bytes after the last marker found are dropped.
+    """
+    data = bytes(bytelist)
     split_lists = []
-    len_bytelist = len(bytelist)
-    ord_splits = [[ord(ch) for ch in split] for split in splits]
-    
-    for split in ord_splits:
-        split_len = len(split)
-        for i in range(len_bytelist - split_len + 1):
-            if bytelist[i:i + split_len] == split:
-                split_lists.append(bytelist[:i])
-                bytelist = bytelist[i + split_len:]
-                break
-            
+    for split in splits:
+        idx = data.find(split.encode())
+        if idx >= 0:
+            split_lists.append(list(data[:idx]))
+            data = data[idx + len(split):]
     return split_lists
 
 def get_rns_pairs(split_list: list) -> list:
+    """
+    (mod 256, mod 129) pairs of each split. A trailing odd byte is dropped, as are empty splits.
+    """
     add_and_mul_pairs = []
     for split in split_list:
-        pair_set = []
-        for i in range(0, len(split), 2):
-            if i + 1 < len(split):
-                pair_set.append((split[i], split[i + 1]))
-        
+        pair_set = list(zip(split[0::2], split[1::2]))
         if pair_set:
             add_and_mul_pairs.append(pair_set)
-            
+
     return add_and_mul_pairs
 
 def print_add_pairs(add_pairs: list):
     print(f"Index\t|Intended Op \t\t| %129 binary  | %129 decimal  | %256 binary   | %256 decimal  | Reconstructed value")
+    rec_vals = get_rec_values(add_pairs)
     for i, pair in enumerate(add_pairs):
         mod256_int = pair[0]
         mod256_bin = format(mod256_int, '08b')
         mod129_int = pair[1]
         mod129_bin = format(mod129_int, '08b')
-        rec_val = (mod129_int * 16384 + mod256_int * 16641) % 33024
+        rec_val = rec_vals[i]
 
         print(f"{i+1}\t |{i+1}+{i+1}={(i+1) + (i+1)} \t\t| {mod129_bin}\t| {mod129_int}\t\t| {mod256_bin}\t| {mod256_int}\t\t| {rec_val}")
 
 def print_mul_pairs(mul_pairs: list):
     print(f"Index\t|Intended Op \t\t| %129 binary  | %129 decimal  | %256 binary   | %256 decimal  | Reconstructed value")
+    rec_vals = get_rec_values(mul_pairs)
     for i, pair in enumerate(mul_pairs):
         mod256_int = pair[0]
         mod256_bin = format(mod256_int, '08b')
         mod129_int = pair[1]
         mod129_bin = format(mod129_int, '08b')
-        rec_val = (mod129_int * 16384 + mod256_int * 16641) % 33024
+        rec_val = rec_vals[i]
         
         print(f"{i+1}\t|{i+1}*{i+1} = {(i+1) * (i+1)} \t\t| {mod129_bin}\t| {mod129_int}\t\t| {mod256_bin}\t| {mod256_int}\t\t| {rec_val}")
 
+def parse_sections(arg: str) -> list:
+    """
+    'ENDADD:add,ENDMUL:mul,DONE' -> [('ENDADD', 'add'), ('ENDMUL', 'mul'), ('DONE', None)]
+    A marker with no op just skips the bytes in front of it.
+    """
+    sections = []
+    for item in arg.split(','):
+        marker, _, op = item.partition(':')
+        if op and op not in EXPECTED_OPS:
+            raise ValueError(f"Unknown op '{op}' for marker '{marker}' (expected one of {', '.join(EXPECTED_OPS)})")
+        sections.append((marker, op or None))
+    return sections
+
+
+def get_expected_period(op: str) -> bytes:
+    """
+    Expected UART bytes for k = 1 .. lcm(OUT_MODULI). The residues of a polynomial in k repeat with that period,
+    so a section of any length can be checked against slices of this one buffer.
+    The residues come from the RNS golden model (rns_golden.RNSModel), in UART byte order.
+    """
+    k = np.arange(1, lcm(*OUT_MODULI) + 1)
+    return RNS_MODEL.to_rns(RNS_MODEL.int_op(op, k, k))[:, list(OUT_DOMAINS)].astype(np.uint8).tobytes()
+
+
+def get_rec_values(pairs: list) -> list:
+    """
+    CRT reconstruction of UART (mod 256, mod 129) pairs with the RNS golden model.
+    """
+    if not pairs:
+        return []
+    res = np.zeros((len(pairs), len(OUT_DOMAINS)), dtype=np.int64)
+    res[:, list(OUT_DOMAINS)] = np.array(pairs, dtype=np.int64)
+    return RNS_MODEL.from_rns(res).tolist()
+
+
+class StreamParser:
+    """
+    Incremental marker splitter shared by every mode. Bytes are fed in as they are read, markers are searched for with
+    bytes.find, and each byte is handed to take() as soon as it is known not to be part of a marker.
+    On its own, it collects each section's bytes in StreamParser.closed as (marker, bytes); subclasses override
+    take() / close_section() to consume them instead.
+    """
+    def __init__(self, sections: list = DEFAULT_SECTIONS, repeat: bool = False):
+        self.sections = sections
+        self.repeat = repeat
+
+        self.buf = bytearray()
+        self.offset = 0     # file offset of buf[0]
+        self.sec_idx = 0
+        self.round = 0
+        self.trailing = 0
+        self.cur = bytearray()
+        self.closed = []
+
+
+    def take(self, end: int):
+        """
+        buf[:end] belongs to the current section.
+        """
+        self.cur += self.buf[:end]
+
+
+    def close_section(self, end_offset: int):
+        """
+        The current section's marker was found at end_offset.
+        """
+        self.closed.append((self.sections[self.sec_idx][0], bytes(self.cur)))
+        self.cur.clear()
+
+
+    def is_done(self) -> bool:
+        return self.sec_idx == len(self.sections)
+
+
+    def end_section(self, end_offset: int):
+        self.close_section(end_offset)
+        self.sec_idx += 1
+        if self.sec_idx == len(self.sections) and self.repeat:
+            self.sec_idx = 0
+            self.round += 1
+
+
+    def feed(self, data: bytes):
+        self.buf += data
+        while True:
+            if self.sec_idx == len(self.sections):
+                self.trailing += len(self.buf)
+                self.offset += len(self.buf)
+                self.buf.clear()
+                return
+
+            marker = self.sections[self.sec_idx][0].encode()
+            idx = self.buf.find(marker)
+            if idx < 0:
+                # the tail could be the start of a marker split across chunks, keep it for the next feed
+                safe = len(self.buf) - len(marker) + 1
+                if safe > 0:
+                    self.take(safe)
+                    del self.buf[:safe]
+                    self.offset += safe
+                return
+
+            self.take(idx)
+            self.end_section(self.offset + idx)
+            del self.buf[:idx + len(marker)]
+            self.offset += idx + len(marker)
+
+
+    def finish(self):
+        """
+        Flush what's left in the buffer. Bytes of a section whose marker never arrived still go to take().
+        """
+        if self.sec_idx < len(self.sections):
+            self.take(len(self.buf))
+        else:
+            self.trailing += len(self.buf)
+        self.offset += len(self.buf)
+        self.buf.clear()
+
+
+class StreamVerifier(StreamParser):
+    """
+    Checks each section's residue bytes against the expected stream of its op, instead of keeping them.
+    Used by --stream for captures that don't fit in memory and by --live.
+    Memory use is bounded by the chunk size + one period of expected bytes per op.
+    """
+    SEG_LEN = 4096 # bytes compared at once, before falling back to a byte-by-byte walk
+
+    def __init__(self, sections: list = DEFAULT_SECTIONS, max_errors: int = 20, xonxoff: bool = False, repeat: bool = False):
+        super().__init__(sections, repeat)
+        self.max_errors = max_errors
+        self.xonxoff = xonxoff
+        self.periods = {op: get_expected_period(op) * 2 for _, op in sections if op}
+
+        self.exp_pos = 0    # position in the current section's expected byte stream
+        self.sec_errors = 0
+        self.sec_dropped = 0
+        self.num_pairs = 0  # pairs checked in closed sections
+        self.summaries = [] # (round, marker, op, pairs, errors, dropped, end offset)
+        self.mismatches = [] # first max_errors of (round, marker, k, modulus, expected, got, offset)
+        self.num_mismatches = 0
+
+
+    def take(self, end: int):
+        self.check(end)
+
+
+    def get_num_pairs(self) -> int:
+        """
+        Residue pairs checked so far, including the current section's.
+        """
+        return self.num_pairs + self.exp_pos // 2
+
+
+    def check(self, end: int):
+        """
+        Check buf[:end] against the current section's expected stream.
+        """
+        op = self.sections[self.sec_idx][1]
+        if op is None:
+            self.exp_pos += end
+            return
+
+        period = self.periods[op]
+        plen = len(period) // 2
+        buf = self.buf
+        pos = 0
+        while pos < end:
+            seg = min(self.SEG_LEN, end - pos)
+            start = self.exp_pos % plen
+            if buf[pos:pos + seg] == period[start:start + seg]:
+                pos += seg
+                self.exp_pos += seg
+                continue
+
+            seg_end = pos + seg
+            while pos < seg_end:
+                exp = period[self.exp_pos % plen]
+                got = buf[pos]
+                if got != exp:
+                    if self.xonxoff and exp in XONXOFF_BYTES and period[(self.exp_pos + 1) % plen] == got:
+                        # the terminal ate a flow-control byte; skip it in the expected stream
+                        self.sec_dropped += 1
+                        self.exp_pos += 1
+                        continue
+                    self.add_mismatch(exp, got, self.offset + pos)
+                pos += 1
+                self.exp_pos += 1
+
+
+    def add_mismatch(self, exp: int, got: int, offset: int):
+        self.num_mismatches += 1
+        self.sec_errors += 1
+        if len(self.mismatches) < self.max_errors:
+            k = self.exp_pos // 2 + 1
+            self.mismatches.append((self.round, self.sections[self.sec_idx][0], k, OUT_MODULI[self.exp_pos % 2], exp, got, offset))
+
+
+    def close_section(self, end_offset: int):
+        marker, op = self.sections[self.sec_idx]
+        self.summaries.append((self.round, marker, op, self.exp_pos // 2, self.sec_errors, self.sec_dropped, end_offset))
+        self.num_pairs += self.exp_pos // 2
+        self.exp_pos = 0
+        self.sec_errors = 0
+        self.sec_dropped = 0
+
+
+    def get_summary_lines(self) -> list:
+        lines = [f"Round\t| Marker\t| Op\t| Pairs\t| Mismatches\t| XON/XOFF dropped\t| Marker offset"]
+        for rnd, marker, op, pairs, errors, dropped, end_offset in self.summaries:
+            lines.append(f"{rnd}\t| {marker}\t| {op}\t| {pairs}\t| {errors}\t\t| {dropped}\t\t\t| {end_offset}")
+        if self.sec_idx < len(self.sections) and (self.exp_pos or self.round == 0):
+            marker, op = self.sections[self.sec_idx]
+            lines.append(f"{self.round}\t| ({marker})\t| {op}\t| {self.exp_pos // 2}\t| {self.sec_errors}\t\t| {self.sec_dropped}\t\t\t| unterminated")
+        if self.trailing:
+            lines.append(f"{self.trailing} trailing bytes after the last marker were not checked")
+
+        lines.append(f"\n{self.num_mismatches} mismatches in {self.offset} bytes" + (f", first {len(self.mismatches)}:" if self.mismatches else ""))
+        if self.mismatches:
+            lines.append(f"Round\t| Section\t| Index\t| Intended Op\t\t| Modulus\t| Expected\t| Got\t| Offset")
+        for rnd, marker, k, mod, exp, got, offset in self.mismatches:
+            op = dict(self.sections)[marker]
+            func, fmt = EXPECTED_OPS[op]
+            lines.append(f"{rnd}\t| {marker}\t| {k}\t| {fmt.format(k=k, v=func(k))}\t\t| %{mod}\t\t| {exp}\t\t| {got}\t| {offset}")
+        return lines
+
+
+def stream_verify(in_file: BinaryIO, verifier: StreamVerifier, chunk_size: int = 1 << 20) -> StreamVerifier:
+    for chunk in iter(lambda: in_file.read(chunk_size), b''):
+        verifier.feed(chunk)
+    verifier.finish()
+    return verifier
+
+
+def open_serial(path: str, baud: int) -> int:
+    """
+    Open a serial device (or pty) non-blocking and put it in raw 8N1 mode at baud, so no byte is translated or eaten.
+    Returns the fd.
+    """
+    import termios
+    import tty
+    fd = os.open(path, os.O_RDONLY | os.O_NOCTTY | os.O_NONBLOCK)
+    if os.isatty(fd):
+        tty.setraw(fd)
+        attrs = termios.tcgetattr(fd)
+        attrs[2] = (attrs[2] & ~(termios.PARENB | termios.CSTOPB | termios.CSIZE)) | termios.CS8 | termios.CLOCAL | termios.CREAD
+        speed = getattr(termios, f"B{baud}", None)
+        if speed is None:
+            os.close(fd)
+            raise ValueError(f"Unsupported baud rate {baud}")
+        attrs[4] = attrs[5] = speed
+        termios.tcsetattr(fd, termios.TCSANOW, attrs)
+    return fd
+
+
+def open_pty() -> tuple:
+    """
+    Local stand-in for the board: a raw pty pair. Returns (master fd to read from, slave fd, slave path to write to).
+    """
+    import tty
+    master_fd, slave_fd = os.openpty()
+    tty.setraw(master_fd)
+    tty.setraw(slave_fd)
+    os.set_blocking(master_fd, False)
+    return master_fd, slave_fd, os.ttyname(slave_fd)
+
+
+async def replay_log(fd: int, path: str, baud: int):
+    """
+    Write a captured log into fd at the UART's byte rate (10 bits per byte), as the board would send it.
+    """
+    with open(path, 'rb') as in_file:
+        data = in_file.read()
+    chunk = max(1, baud // 100) # ~10ms of bytes
+    start = perf_counter()
+    for pos in range(0, len(data), chunk):
+        os.write(fd, data[pos:pos + chunk])
+        await asyncio.sleep(max(0.0, start + (pos + chunk) * 10 / baud - perf_counter()))
+
+
+class LiveMonitor:
+    """
+    Feeds a StreamVerifier from a serial / pty fd as bytes arrive (asyncio reader callback), printing each new mismatch
+    right away and a running status line (bytes, byte rate, pairs checked, mismatches) every interval seconds.
+    Stops at EOF / EIO (the writer closed the line), when every marker has been seen (unless --repeat), after idle seconds
+    without data (if idle), or on Ctrl-C.
+    """
+    READ_SIZE = 4096
+
+    def __init__(self, fd: int, verifier: StreamVerifier, interval: float = 1.0, idle: float = None):
+        self.fd = fd
+        self.verifier = verifier
+        self.interval = interval
+        self.idle = idle
+        self.num_bytes = 0
+        self.num_printed = 0
+        self.start = None
+        self.last_data = None
+        self.done = None
+
+
+    def on_readable(self):
+        try:
+            data = os.read(self.fd, self.READ_SIZE)
+        except BlockingIOError:
+            return
+        except OSError:
+            data = b'' # EIO: the pty's other end was closed
+        if not data:
+            self.stop()
+            return
+        self.num_bytes += len(data)
+        self.last_data = perf_counter()
+        self.verifier.feed(data)
+        self.print_mismatches()
+        if self.verifier.is_done():
+            self.stop()
+
+
+    def stop(self):
+        if not self.done.done():
+            self.done.set_result(None)
+
+
+    def print_mismatches(self):
+        for rnd, marker, k, mod, exp, got, offset in self.verifier.mismatches[self.num_printed:]:
+            op = dict(self.verifier.sections)[marker]
+            func, fmt = EXPECTED_OPS[op]
+            print(f"\r\033[1;31mMismatch\033[0m round {rnd} {marker} {fmt.format(k=k, v=func(k))} %{mod}: expected {exp}, got {got} at byte {offset}\033[K")
+        self.num_printed = len(self.verifier.mismatches)
+
+
+    def get_status(self) -> str:
+        elapsed = perf_counter() - self.start
+        rate = self.num_bytes / elapsed if elapsed else 0.0
+        section = self.verifier.sections[self.verifier.sec_idx][0] if not self.verifier.is_done() else "done"
+        return (
+            f"{self.num_bytes} bytes in {elapsed:.1f}s ({rate:.0f} B/s) | {self.verifier.get_num_pairs()} pairs | "
+            f"{self.verifier.num_mismatches} mismatches | round {self.verifier.round}, waiting for {section}"
+        )
+
+
+    async def report(self):
+        end = '\r' if sys.stdout.isatty() else '\n'
+        while True:
+            await asyncio.sleep(self.interval)
+            print(self.get_status() + '\033[K', end=end, flush=True)
+            if self.idle and perf_counter() - (self.last_data or self.start) > self.idle:
+                self.stop()
+
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        self.done = loop.create_future()
+        self.start = perf_counter()
+        loop.add_reader(self.fd, self.on_readable)
+        reporter = asyncio.create_task(self.report())
+        try:
+            await self.done
+        finally:
+            loop.remove_reader(self.fd)
+            reporter.cancel()
+        self.verifier.finish()
+        self.print_mismatches()
+        print(self.get_status() + '\033[K')
+
+
+async def live_verify(device: str, verifier: StreamVerifier, baud: int = DEFAULT_BAUD, interval: float = 1.0,
+                      idle: float = None, replay: str = None) -> LiveMonitor:
+    """
+    Verify UART output live from device, or from a local pty if device is 'pty' (its path is printed; replay writes
+    a captured log into it).
+    """
+    slave_fd = None
+    if device == 'pty':
+        fd, slave_fd, slave_path = open_pty()
+        print(f"\033[1;32mListening on {slave_path}\033[0m")
+    else:
+        fd = open_serial(device, baud)
+
+    monitor = LiveMonitor(fd, verifier, interval, idle)
+    writer = None
+    if replay:
+        writer = asyncio.create_task(replay_log(slave_fd, replay, baud))
+        # once the whole log is written, closing the slave makes the master read EIO, which ends the run
+        writer.add_done_callback(lambda _, slave_fd=slave_fd: os.close(slave_fd))
+        slave_fd = None
+    try:
+        await monitor.run()
+    finally:
+        if writer:
+            writer.cancel()
+        if slave_fd is not None:
+            os.close(slave_fd)
+        os.close(fd)
+    return monitor
+
+
 if __name__ == "__main__":
-    if len(sys.argv) != 2:
-        print("Usage: python console_verify.py <console_log_file>")
+    if len(sys.argv) < 2:
+        print("""\033[1;31mUsage: \033[22mpython console_verify.py <console_log_file || '-' for stdin>\033[0m\n
+        \033[1;32mAdditional optional arguments:\033[0m\n
+        \033[32m--stream\033[0m\n
+        \tRead the log in chunks and check residue pairs as they arrive. Prints a per-section summary + the first mismatches
+        \tinstead of every row. Exits with 1 if anything mismatched.
+        \033[32m--live\033[0m\n
+        \tRead <console_log_file> as a serial device (or 'pty' for a local pseudo-terminal) and check residue pairs as
+        \tthey arrive, with a running status line. Takes the --stream options below. Exits with 1 if anything mismatched.
+        \033[32m--baud <rate>\033[0m\n
+        \tSerial baud rate for --live (default: 9600, rs232_uart's)
+        \033[32m--interval <s>\033[0m\n
+        \tSeconds between --live status lines (default: 1)
+        \033[32m--idle <s>\033[0m\n
+        \tStop --live after this many seconds without data (default: run until every marker is seen, EOF or Ctrl-C)
+        \033[32m--replay <log_file>\033[0m\n
+        \tWith --live pty, write a captured log into the pty at the baud rate, standing in for the board
+        \033[32m--markers <MARKER[:op],...>\033[0m\n
+        \tSection end markers and the op each section is checked against (ops: add, mul; default: ENDADD:add,ENDMUL:mul)
+        \033[32m--max_errors <n>\033[0m\n
+        \tNumber of mismatches to list (default: 20)
+        \033[32m--xonxoff\033[0m\n
+        \tExpect 0x11 / 0x13 residues to be missing from the log (eaten by the terminal as flow control)
+        \033[32m--repeat\033[0m\n
+        \tStart over at the first marker after the last one, for captures of a program that loops
+        \033[32m--chunk_size <bytes>\033[0m\n
+        \tRead size for --stream (default: 1 MiB)
+        """)
         sys.exit(1)
-    
+
+    if "--stream" in sys.argv or "--live" in sys.argv:
+        sections = DEFAULT_SECTIONS
+        max_errors = 20
+        chunk_size = 1 << 20
+        if "--markers" in sys.argv:
+            sections = parse_sections(sys.argv[sys.argv.index("--markers") + 1])
+        if "--max_errors" in sys.argv:
+            max_errors = int(sys.argv[sys.argv.index("--max_errors") + 1])
+        if "--chunk_size" in sys.argv:
+            chunk_size = int(sys.argv[sys.argv.index("--chunk_size") + 1])
+
+        verifier = StreamVerifier(sections, max_errors, "--xonxoff" in sys.argv, "--repeat" in sys.argv)
+
+        if "--live" in sys.argv:
+            baud = DEFAULT_BAUD
+            interval = 1.0
+            idle = None
+            replay = None
+            if "--baud" in sys.argv:
+                baud = int(sys.argv[sys.argv.index("--baud") + 1])
+            if "--interval" in sys.argv:
+                interval = float(sys.argv[sys.argv.index("--interval") + 1])
+            if "--idle" in sys.argv:
+                idle = float(sys.argv[sys.argv.index("--idle") + 1])
+            if "--replay" in sys.argv:
+                replay = sys.argv[sys.argv.index("--replay") + 1]
+                if sys.argv[1] != 'pty':
+                    print("--replay needs 'pty' as the device")
+                    sys.exit(1)
+            try:
+                asyncio.run(live_verify(sys.argv[1], verifier, baud, interval, idle, replay))
+            except KeyboardInterrupt:
+                verifier.finish()
+            except (OSError, ValueError) as e:
+                print(f"Error opening device: {e}")
+                sys.exit(1)
+            print('\n'.join(verifier.get_summary_lines()))
+            sys.exit(1 if verifier.num_mismatches else 0)
+
+        try:
+            in_file = sys.stdin.buffer if sys.argv[1] == '-' else open(sys.argv[1], 'rb')
+        except Exception as e:
+            print(f"Error opening file: {e}")
+            sys.exit(1)
+        stream_verify(in_file, verifier, chunk_size)
+        in_file.close()
+
+        print('\n'.join(verifier.get_summary_lines()))
+        sys.exit(1 if verifier.num_mismatches else 0)
+
     try:
         in_file = open(sys.argv[1], 'rb')
         file_bytes = get_file_bytes(in_file)
         in_file.close()
         
         split_lists = split_list(file_bytes)
+        for marker in ('ENDADD', 'ENDMUL'):
+            if marker.encode() not in bytes(file_bytes):
+                print(f"Warning: marker {marker} not found in the log")
         rns_pairs = get_rns_pairs(split_lists)
         
         print(f"\n\n\nAddition values:")
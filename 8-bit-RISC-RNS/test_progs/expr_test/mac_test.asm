@@ -0,0 +1,55 @@
+# Compiled by ASMExpr.py from mac_test.expr (--domain auto: auto chosen), predicted 820 cycles
+# homes: x -> m0, y -> m1, acc -> x0/x1
+# line 2: u8 x = 3
+LDI x2, 0x03
+RLLM m0, x2, x2
+# line 3: u8 y = 0x21
+LDI x2, 0x21
+RLLM m1, x2, x2
+# line 4: u16 acc = 0
+LDI x0, 0x00
+LDI x1, 0x00
+# line 5: repeat 32 {
+LDI x2, 0x20
+LOOP_0:
+# line 6: acc += x * y
+MULM m2, m0, m1
+UNRLU x3, m2
+LDI x4, 0x80
+ANDBIT x5, x0, x4
+ANDBIT x6, x3, x4
+ADD x0, x0, x3
+ANDBIT x4, x0, x4
+NOT x4, x4, x4
+OR x3, x5, x6
+AND x3, x3, x4
+AND x5, x5, x6
+OR x3, x3, x5
+ADD x1, x1, x3
+# line 7: x = x * 5 + 1
+LDI x3, 0x05
+MULM m2, m0, x3
+LDI x3, 0x01
+ADDM m0, m2, x3
+# line 8: y = y + x
+ADDM m1, m1, m0
+LDI x3, 0x01
+COMPARE x2, x3
+SUB x2, x2, x3
+JMPGT LOOP_0
+# line 10: store 0x0100, acc
+LDI x2, 0x01
+LDI x3, 0x00
+RSTORE x0, x2, x3
+LDI x3, 0x01
+RSTORE x1, x2, x3
+# line 11: store 0x0102, x
+UNRLU x2, m0
+LDI x3, 0x01
+LDI x4, 0x02
+RSTORE x2, x3, x4
+# line 12: store 0x0103, y
+UNRLU x2, m1
+LDI x3, 0x01
+LDI x4, 0x03
+RSTORE x2, x3, x4
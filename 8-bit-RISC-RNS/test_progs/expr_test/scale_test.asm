@@ -0,0 +1,201 @@
+# Compiled by ASMExpr.py from scale_test.expr (--domain auto: auto chosen), predicted 2018 cycles
+# homes: a -> m0, acc -> m1
+# line 2: u8 a = 3
+LDI x0, 0x03
+RLLM m0, x0, x0
+# line 3: u16 acc = a * 300
+UNRLU x0, m0
+LDI x1, 0x00
+LDI x4, 0x80
+ANDBIT x5, x0, x4
+AND x5, x5, x5
+SHL x3, x1, x1
+ORBIT x3, x3, x5
+SHL x2, x0, x0
+LDI x1, 0x80
+ANDBIT x4, x2, x1
+AND x4, x4, x4
+SHL x3, x3, x3
+ORBIT x3, x3, x4
+SHL x2, x2, x2
+LDI x1, 0x80
+ANDBIT x4, x2, x1
+AND x4, x4, x4
+SHL x3, x3, x3
+ORBIT x3, x3, x4
+SHL x2, x2, x2
+LDI x1, 0x80
+ANDBIT x4, x2, x1
+ANDBIT x5, x0, x1
+ADD x2, x2, x0
+ANDBIT x1, x2, x1
+NOT x1, x1, x1
+OR x6, x4, x5
+AND x6, x6, x1
+AND x4, x4, x5
+OR x6, x6, x4
+ADD x3, x3, x6
+LDI x1, 0x80
+ANDBIT x4, x2, x1
+AND x4, x4, x4
+SHL x3, x3, x3
+ORBIT x3, x3, x4
+SHL x2, x2, x2
+LDI x1, 0x80
+ANDBIT x4, x2, x1
+AND x4, x4, x4
+SHL x3, x3, x3
+ORBIT x3, x3, x4
+SHL x2, x2, x2
+LDI x1, 0x80
+ANDBIT x4, x2, x1
+ANDBIT x5, x0, x1
+ADD x2, x2, x0
+ANDBIT x1, x2, x1
+NOT x1, x1, x1
+OR x6, x4, x5
+AND x6, x6, x1
+AND x4, x4, x5
+OR x6, x6, x4
+ADD x3, x3, x6
+LDI x1, 0x80
+ANDBIT x4, x2, x1
+AND x4, x4, x4
+SHL x3, x3, x3
+ORBIT x3, x3, x4
+SHL x2, x2, x2
+LDI x1, 0x80
+ANDBIT x4, x2, x1
+ANDBIT x5, x0, x1
+ADD x2, x2, x0
+ANDBIT x1, x2, x1
+NOT x1, x1, x1
+OR x6, x4, x5
+AND x6, x6, x1
+AND x4, x4, x5
+OR x6, x6, x4
+ADD x3, x3, x6
+LDI x1, 0x80
+ANDBIT x4, x2, x1
+AND x4, x4, x4
+SHL x3, x3, x3
+ORBIT x3, x3, x4
+SHL x2, x2, x2
+LDI x1, 0x80
+ANDBIT x4, x2, x1
+AND x4, x4, x4
+SHL x3, x3, x3
+ORBIT x3, x3, x4
+SHL x2, x2, x2
+RLLM m1, x3, x2
+# line 4: repeat 20 {
+LDI x0, 0x14
+LOOP_0:
+# line 5: acc += a * 0x103
+UNRLU x1, m0
+LDI x2, 0x00
+LDI x5, 0x80
+ANDBIT x6, x1, x5
+AND x6, x6, x6
+SHL x4, x2, x2
+ORBIT x4, x4, x6
+SHL x3, x1, x1
+LDI x2, 0x80
+ANDBIT x5, x3, x2
+AND x5, x5, x5
+SHL x4, x4, x4
+ORBIT x4, x4, x5
+SHL x3, x3, x3
+LDI x2, 0x80
+ANDBIT x5, x3, x2
+AND x5, x5, x5
+SHL x4, x4, x4
+ORBIT x4, x4, x5
+SHL x3, x3, x3
+LDI x2, 0x80
+ANDBIT x5, x3, x2
+AND x5, x5, x5
+SHL x4, x4, x4
+ORBIT x4, x4, x5
+SHL x3, x3, x3
+LDI x2, 0x80
+ANDBIT x5, x3, x2
+AND x5, x5, x5
+SHL x4, x4, x4
+ORBIT x4, x4, x5
+SHL x3, x3, x3
+LDI x2, 0x80
+ANDBIT x5, x3, x2
+AND x5, x5, x5
+SHL x4, x4, x4
+ORBIT x4, x4, x5
+SHL x3, x3, x3
+LDI x2, 0x80
+ANDBIT x5, x3, x2
+AND x5, x5, x5
+SHL x4, x4, x4
+ORBIT x4, x4, x5
+SHL x3, x3, x3
+LDI x2, 0x80
+ANDBIT x5, x3, x2
+ANDBIT x6, x1, x2
+ADD x3, x3, x1
+ANDBIT x2, x3, x2
+NOT x2, x2, x2
+OR x7, x5, x6
+AND x7, x7, x2
+AND x5, x5, x6
+OR x7, x7, x5
+ADD x4, x4, x7
+LDI x2, 0x80
+ANDBIT x5, x3, x2
+AND x5, x5, x5
+SHL x4, x4, x4
+ORBIT x4, x4, x5
+SHL x3, x3, x3
+LDI x2, 0x80
+ANDBIT x5, x3, x2
+ANDBIT x6, x1, x2
+ADD x3, x3, x1
+ANDBIT x2, x3, x2
+NOT x2, x2, x2
+OR x7, x5, x6
+AND x7, x7, x2
+AND x5, x5, x6
+OR x7, x7, x5
+ADD x4, x4, x7
+UNRLL x1, m1
+UNRLU x2, m1
+LDI x5, 0x80
+ANDBIT x6, x1, x5
+ANDBIT x7, x3, x5
+ADD x1, x1, x3
+ANDBIT x5, x1, x5
+NOT x5, x5, x5
+OR x3, x6, x7
+AND x3, x3, x5
+AND x6, x6, x7
+OR x3, x3, x6
+ADD x2, x2, x4
+ADD x2, x2, x3
+RLLM m1, x2, x1
+# line 6: a = a + 7
+LDI x1, 0x07
+ADDM m0, m0, x1
+LDI x1, 0x01
+COMPARE x0, x1
+SUB x0, x0, x1
+JMPGT LOOP_0
+# line 8: store 0x0100, acc
+UNRLL x0, m1
+UNRLU x1, m1
+LDI x2, 0x01
+LDI x3, 0x00
+RSTORE x0, x2, x3
+LDI x3, 0x01
+RSTORE x1, x2, x3
+# line 9: store 0x0102, a
+UNRLU x0, m0
+LDI x1, 0x01
+LDI x2, 0x02
+RSTORE x0, x1, x2
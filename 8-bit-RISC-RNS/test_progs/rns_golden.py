@@ -0,0 +1,203 @@
+#Vectorized RNS reference model for checking RNS results in bulk (UART logs, simulator dumps, operand sweeps).
+#Works for any pairwise-coprime moduli vector, in the domain order PL_EX uses: domain i is RNS reg bits [8i+7:8i].
+import sys
+import re
+from math import gcd, prod
+from time import perf_counter
+
+import numpy as np
+
+# PL_EX's default MODULI = {9'd256, 9'd129}: domain 0 is mod 129, domain 1 is mod 256
+DEFAULT_MODULI = (129, 256)
+OPS = ("add", "sub", "mul")
+
+
+def parse_moduli(arg: str) -> tuple:
+    """
+    Accepts '129,256' (domain order) or a Verilog literal like "{9'd256, 9'd129}" (MSB domain first, as PL_EX declares it).
+    """
+    if '{' in arg or "'" in arg:
+        return tuple(int(val) for val in reversed(re.findall(r"'d(\d+)", arg)))
+    return tuple(int(val) for val in arg.split(','))
+
+
+class RNSModel:
+    """
+    Golden model of the RNS datapath for one moduli set.
+    CRT constants are computed once in the constructor: M, M_i = M / m_i, inv_i = M_i^-1 mod m_i, and the
+    weights w_i = M_i * inv_i mod M, so that x = sum(r_i * w_i) mod M.
+    All ops take/return numpy arrays of residues with the domain as the last axis.
+    """
+    def __init__(self, moduli: tuple = DEFAULT_MODULI):
+        for i, mod_a in enumerate(moduli):
+            if mod_a < 2:
+                raise ValueError(f"Modulus {mod_a} is < 2")
+            for mod_b in moduli[i + 1:]:
+                if gcd(mod_a, mod_b) != 1:
+                    raise ValueError(f"Moduli {mod_a} and {mod_b} are not coprime")
+
+        self.moduli = np.array(moduli, dtype=np.int64)
+        self.M = prod(moduli)
+        if self.M >= 2 ** 53:
+            raise ValueError(f"Dynamic range {self.M} doesn't fit the int64 reconstruction")
+        self.M_i = [self.M // mod for mod in moduli]
+        self.inverses = [pow(M_i % mod, -1, mod) for M_i, mod in zip(self.M_i, moduli)]
+        self.weights = np.array([(M_i * inv) % self.M for M_i, inv in zip(self.M_i, self.inverses)], dtype=np.int64)
+
+
+    def to_rns(self, x) -> np.ndarray:
+        """
+        Forward conversion: x (any shape) -> residues of shape x.shape + (num_domains,)
+        """
+        return np.asarray(x, dtype=np.int64)[..., None] % self.moduli
+
+
+    def from_rns(self, res) -> np.ndarray:
+        """
+        CRT reconstruction. Reduces after each domain so r_i * w_i never overflows int64.
+        """
+        res = np.asarray(res, dtype=np.int64)
+        out = np.zeros(res.shape[:-1], dtype=np.int64)
+        for i in range(len(self.moduli)):
+            out = (out + res[..., i] * self.weights[i]) % self.M
+        return out
+
+
+    def add(self, res_a, res_b, rtl: bool = False) -> np.ndarray:
+        """
+        ADDM. rtl=True mirrors RNS_adder, which truncates the sum to 8 bits before the modulo.
+        """
+        total = np.asarray(res_a, dtype=np.int64) + res_b
+        if rtl:
+            total &= 0xFF
+        return total % self.moduli
+
+
+    def sub(self, res_a, res_b, rtl: bool = False) -> np.ndarray:
+        """
+        SUBM. rtl=True mirrors RNS_sub, which wraps a - b + m at 9 bits before the modulo.
+        """
+        diff = np.asarray(res_a, dtype=np.int64) - res_b + self.moduli
+        if rtl:
+            diff &= 0x1FF
+        return diff % self.moduli
+
+
+    def mul(self, res_a, res_b, rtl: bool = False) -> np.ndarray:
+        """
+        MULM. The multiplier keeps the full product, so rtl makes no difference.
+        """
+        return (np.asarray(res_a, dtype=np.int64) * res_b) % self.moduli
+
+
+    def apply(self, op: str, res_a, res_b, rtl: bool = False) -> np.ndarray:
+        return getattr(self, op)(res_a, res_b, rtl)
+
+
+    def int_op(self, op: str, a, b) -> np.ndarray:
+        """
+        Reference result of op on integers, mod M.
+        """
+        a = np.asarray(a, dtype=np.int64) % self.M
+        b = np.asarray(b, dtype=np.int64) % self.M
+        if op == "add":
+            return (a + b) % self.M
+        elif op == "sub":
+            return (a - b) % self.M
+        return (a * b) % self.M
+
+
+    def pack(self, res) -> np.ndarray:
+        """
+        Residues -> RNS register words (domain i in bits [8i+7:8i]), as held in Reg_File / printed by tb_rns.
+        """
+        res = np.asarray(res, dtype=np.int64)
+        return sum(res[..., i] << (8 * i) for i in range(len(self.moduli)))
+
+
+    def unpack(self, words) -> np.ndarray:
+        words = np.asarray(words, dtype=np.int64)
+        return np.stack([(words >> (8 * i)) & 0xFF for i in range(len(self.moduli))], axis=-1)
+
+
+    def verify(self, values, res) -> np.ndarray:
+        """
+        Mask of the rows of res (residue tuples) that are not the forward conversion of values.
+        """
+        return np.any(self.to_rns(values) != np.asarray(res), axis=-1)
+
+
+    def sweep(self, op: str, a_values, b_values, rtl: bool = False, rows_per_chunk: int = 256, max_errors: int = 10) -> tuple:
+        """
+        Check op for every (a, b) in a_values x b_values against the integer result.
+        The product grid is evaluated rows_per_chunk values of a at a time, so memory stays bounded.
+        Returns (pairs checked, mismatches, first max_errors of (a, b, expected, got)).
+        """
+        if self.M >= 2 ** 31 and op == "mul":
+            raise ValueError(f"Dynamic range {self.M} is too wide to check MULM against an int64 product")
+
+        a_values = np.asarray(a_values, dtype=np.int64)
+        b_values = np.asarray(b_values, dtype=np.int64)
+        res_b = self.to_rns(b_values)
+        checked = 0
+        num_errors = 0
+        errors = []
+        for start in range(0, len(a_values), rows_per_chunk):
+            a_chunk = a_values[start:start + rows_per_chunk]
+            got = self.from_rns(self.apply(op, self.to_rns(a_chunk)[:, None, :], res_b[None, :, :], rtl))
+            expected = self.int_op(op, a_chunk[:, None], b_values[None, :])
+            bad = got != expected
+            checked += bad.size
+            num_bad = int(np.count_nonzero(bad))
+            if num_bad:
+                num_errors += num_bad
+                for row, col in np.argwhere(bad)[:max_errors - len(errors)]:
+                    errors.append((int(a_chunk[row]), int(b_values[col]), int(expected[row, col]), int(got[row, col])))
+        return checked, num_errors, errors
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] not in OPS:
+        print(f"""\033[1;31mUsage: \033[22mpython rns_golden.py <{'|'.join(OPS)}>\033[0m\n
+        Sweeps every (a, b) operand pair through the RNS model and checks the reconstructed result against integer math.\n
+        \033[1;32mAdditional optional arguments:\033[0m\n
+        \033[32m--moduli <'129,256' || "{{9'd256, 9'd129}}">\033[0m\n
+        \tModuli set, in domain order or as the Verilog MODULI literal (default: 129,256)
+        \033[32m--range <n>\033[0m\n
+        \tSweep a, b over [0, n) (default: the full dynamic range M)
+        \033[32m--rtl\033[0m\n
+        \tApply the RNS_adder / RNS_sub truncation, to see where the hardware deviates from the golden results
+        \033[32m--max_errors <n>\033[0m\n
+        \tNumber of mismatches to list (default: 10)
+        """)
+        sys.exit(1)
+
+    op = sys.argv[1]
+    moduli = DEFAULT_MODULI
+    max_errors = 10
+    if "--moduli" in sys.argv:
+        moduli = parse_moduli(sys.argv[sys.argv.index("--moduli") + 1])
+    if "--max_errors" in sys.argv:
+        max_errors = int(sys.argv[sys.argv.index("--max_errors") + 1])
+
+    try:
+        model = RNSModel(moduli)
+    except ValueError as e:
+        print(f"\033[1;31mError: {e}\033[0m")
+        sys.exit(1)
+    sweep_range = model.M
+    if "--range" in sys.argv:
+        sweep_range = int(sys.argv[sys.argv.index("--range") + 1])
+
+    print(f"Moduli {moduli}: M = {model.M}, CRT weights = {model.weights.tolist()}, inverses = {model.inverses}")
+    values = np.arange(sweep_range, dtype=np.int64)
+    start = perf_counter()
+    checked, num_errors, errors = model.sweep(op, values, values, "--rtl" in sys.argv, max_errors=max_errors)
+    elapsed = perf_counter() - start
+
+    print(f"{op}: {checked} operand pairs in {elapsed:.2f}s ({checked / elapsed / 1e6:.1f}M/s), {num_errors} mismatches")
+    if errors:
+        print(f"a\t| b\t| Expected\t| Got")
+        for a, b, expected, got in errors:
+            print(f"{a}\t| {b}\t| {expected}\t\t| {got}")
+    sys.exit(1 if num_errors else 0)
@@ -0,0 +1,302 @@
+#Moduli-set design-space explorer: ranks pairwise-coprime moduli sets for the RNS datapath by hardware cost.
+#Every domain is an 8-bit residue, so each modulus is <= 256. Emits the MODULI literal for PL_EX / processor_top and
+#the CRT constants console_verify.py uses, computed with rns_golden.RNSModel.
+import sys
+import heapq
+from math import prod
+from time import perf_counter
+
+import numpy as np
+
+from rns_golden import RNSModel
+
+MAX_MODULUS = 256 # residues are 8 bits wide
+MIN_MODULUS = 2
+FIT_IN_BITS = 16  # the RNS_fit_xxx reducers take the 16-bit multiplier output
+DEFAULT_TOP = 10
+HW_MODULI = (256, 129) # the moduli PL_ALU_RNS has an RNS_fit_xxx reducer for
+
+
+def get_reduce_cost(mod: int) -> int:
+    """
+    Rough cost of reducing a FIT_IN_BITS-bit value mod mod, in full-adder cells.
+        2^k         bit select (RNS_fit_256): free
+        2^k - 1     end-around-carry fold of k-bit chunks + one conditional subtract
+        2^k + 1     alternating fold of k-bit chunks + one conditional subtract / add (the commented-out RNS_fit_129)
+        other       Barrett reduction: a FIT_IN_BITS x (k + 1) constant multiply + two k-bit corrections
+    """
+    k = mod.bit_length()
+    if mod & (mod - 1) == 0:
+        return 0
+    if (mod + 1) & mod == 0:
+        return (-(-FIT_IN_BITS // k) - 1) * k + k
+    if (mod - 1) & (mod - 2) == 0:
+        k -= 1
+        return (-(-FIT_IN_BITS // k) - 1) * (k + 1) + 2 * (k + 1)
+    return FIT_IN_BITS * (k + 1) // 2 + 2 * k
+
+
+def get_form(mod: int) -> str:
+    if mod & (mod - 1) == 0:
+        return f"2^{mod.bit_length() - 1}"
+    if (mod + 1) & mod == 0:
+        return f"2^{mod.bit_length()}-1"
+    if (mod - 1) & (mod - 2) == 0:
+        return f"2^{(mod - 1).bit_length() - 1}+1"
+    return "general"
+
+
+class ModuliTables:
+    """
+    Tables shared by every candidate, built once:
+        coprime[a, b]   gcd(a, b) == 1, as a numpy bool matrix
+        masks[a]        the same row as an int bitmask (bit b set if b is coprime with a), for set intersection
+        inverse[m, x]   x^-1 mod m (0 where x has no inverse)
+        costs[m]        get_reduce_cost(m)
+    Moduli run from MIN_MODULUS to max_mod.
+    """
+    def __init__(self, max_mod: int = MAX_MODULUS):
+        self.max_mod = max_mod
+        vals = np.arange(max_mod + 1)
+        self.coprime = np.gcd.outer(vals, vals) == 1
+        self.coprime[:MIN_MODULUS, :] = False
+        self.coprime[:, :MIN_MODULUS] = False
+
+        self.masks = [0] * (max_mod + 1)
+        for mod in range(MIN_MODULUS, max_mod + 1):
+            self.masks[mod] = sum(1 << other for other in np.flatnonzero(self.coprime[mod]).tolist())
+
+        self.inverse = np.zeros((max_mod + 1, max_mod + 1), dtype=np.int64)
+        for mod in range(MIN_MODULUS, max_mod + 1):
+            for x in np.flatnonzero(self.coprime[mod, :mod]).tolist():
+                self.inverse[mod, x] = pow(x, -1, mod)
+        self.inverse[MIN_MODULUS:, 1] = 1 # gcd(m, 1) == 1, though 1 isn't a modulus
+
+        self.costs = [get_reduce_cost(mod) if mod >= MIN_MODULUS else 0 for mod in range(max_mod + 1)]
+        # moduli grouped by cost, cheapest first, each group as a bitmask
+        classes = {}
+        for mod in range(MIN_MODULUS, max_mod + 1):
+            classes[self.costs[mod]] = classes.get(self.costs[mod], 0) | (1 << mod)
+        self.cost_classes = sorted(classes.items())
+
+
+    def get_crt(self, moduli: tuple) -> tuple:
+        """
+        (M, weights) from the inverse table: w_i = M_i * (M_i^-1 mod m_i) mod M.
+        """
+        big_m = prod(moduli)
+        weights = tuple(big_m // mod * int(self.inverse[mod, big_m // mod % mod]) % big_m for mod in moduli)
+        return big_m, weights
+
+
+class ModuliSearch:
+    """
+    Exhaustive search over sets of num_domains pairwise-coprime moduli m_1 > m_2 > ... (each <= max_mod) whose
+    product M is at least min_range. Sets are ranked by (total reduction cost, CRT width = bits of M - 1), or with
+    sort='crt' by CRT width first.
+    Prefixes are extended by intersecting coprimality bitmasks; at the last domain the candidates of each cost class
+    come out of one AND, and the smallest one that reaches min_range is the best of its class, so the last domain
+    is never iterated one modulus at a time.
+    """
+    def get_key(self, cost: int, big_m: int) -> tuple:
+        crt_bits = (big_m - 1).bit_length()
+        return (cost, crt_bits, big_m) if self.sort == 'reduce' else (crt_bits, cost, big_m)
+
+
+    def offer(self, key: tuple, moduli: tuple) -> bool:
+        """
+        Keep moduli if it's among the top best so far. Returns False if it wasn't.
+        """
+        item = (tuple(-val for val in key), moduli)
+        if len(self.best) < self.top:
+            heapq.heappush(self.best, item)
+        elif item > self.best[0]:
+            heapq.heapreplace(self.best, item)
+        else:
+            return False
+        return True
+
+
+    def is_hopeless(self, cost: int, part_m: int) -> bool:
+        """
+        True if no set extending a prefix with this cost and product can make the top list (prune only).
+        """
+        if not self.prune or len(self.best) < self.top:
+            return False
+        bound = self.get_key(cost, max(part_m, self.min_range))
+        return tuple(-val for val in bound) < self.best[0][0]
+
+
+    def search_last(self, prefix: tuple, cand: int, cost: int, part_m: int):
+        need = max(MIN_MODULUS, -(-self.min_range // part_m))
+        cand &= ~((1 << need) - 1)
+        if not cand:
+            return
+        self.num_sets += bin(cand).count('1')
+        for class_cost, class_mask in self.tables.cost_classes:
+            in_class = cand & class_mask
+            # within a class the key only grows with the modulus, so the smallest ones are the only contenders
+            for _ in range(self.top):
+                if not in_class:
+                    break
+                low_bit = in_class & -in_class
+                in_class ^= low_bit
+                mod = low_bit.bit_length() - 1
+                if not self.offer(self.get_key(cost + class_cost, part_m * mod), prefix + (mod,)):
+                    break
+
+
+    def search(self, prefix: tuple, cand: int, cost: int, part_m: int):
+        """
+        Extend prefix by one modulus from the bitmask cand (all coprime with prefix, smaller than its last modulus).
+        """
+        left = self.num_domains - len(prefix)
+        if left == 1:
+            self.search_last(prefix, cand, cost, part_m)
+            return
+        tables = self.tables
+        while cand:
+            mod = cand.bit_length() - 1
+            cand &= ~(1 << mod)
+            # the rest are all smaller than mod, so they can't reach min_range if mod^left can't
+            if part_m * mod ** left < self.min_range:
+                return
+            if self.is_hopeless(cost + tables.costs[mod], part_m * mod):
+                continue
+            self.search(prefix + (mod,), cand & tables.masks[mod], cost + tables.costs[mod], part_m * mod)
+
+
+    def getRanked(self) -> list:
+        """
+        [(moduli, reduction cost, CRT bits, M)], best first.
+        """
+        ranked = sorted(self.best, reverse=True)
+        return [(moduli, sum(self.tables.costs[mod] for mod in moduli), (prod(moduli) - 1).bit_length(), prod(moduli))
+                for _, moduli in ranked]
+
+
+    def __init__(self, min_range: int, num_domains: int = 2, top: int = DEFAULT_TOP, sort: str = 'reduce',
+                 tables: ModuliTables = None, prune: bool = True):
+        '''
+        Search every set of num_domains pairwise-coprime moduli with a dynamic range of at least min_range and keep
+        the top best. With prune, prefixes that already rank below the top list's worst are skipped, so
+        ModuliSearch.num_sets only counts every set that qualifies when prune is False.
+        '''
+        if num_domains < 1:
+            raise ValueError(f"NUM_DOMAINS must be >= 1, got {num_domains}")
+        if sort not in ('reduce', 'crt'):
+            raise ValueError(f"Unknown sort '{sort}' (expected reduce or crt)")
+        self.tables = tables or ModuliTables()
+        self.min_range = min_range
+        self.num_domains = num_domains
+        self.top = top
+        self.sort = sort
+        self.prune = prune
+        self.best = []
+        self.num_sets = 0
+        all_mods = sum(1 << mod for mod in range(MIN_MODULUS, self.tables.max_mod + 1))
+        self.search((), all_mods, 0, 1)
+
+
+def get_params(moduli: tuple, tables: ModuliTables = None) -> tuple:
+    """
+    (lines to paste, notes) for one moduli set. moduli are in descending order; domain 0 (RNS reg bits [7:0]) gets
+    the smallest, as in PL_EX's default {9'd256, 9'd129}.
+    """
+    domains = tuple(sorted(moduli))
+    model = RNSModel(domains)
+    if tables is not None:
+        # the inverse table has to agree with the model console_verify.py / rns_golden.py check against
+        assert tables.get_crt(domains) == (model.M, tuple(model.weights.tolist()))
+    out_moduli = domains[::-1] # UART order: the highest domain (UNRLU) is sent first
+    out_weights = tuple(int(w) for w in model.weights.tolist()[::-1])
+    lines = [
+        f"// PL_EX / processor_top",
+        f"NUM_DOMAINS = {len(domains)}",
+        f"MODULI = {{{', '.join(f'9{chr(39)}d{mod}' for mod in out_moduli)}}}",
+        f"# console_verify.py",
+        f"OUT_MODULI = {out_moduli}",
+        f"CRT_RANGE = {model.M}",
+        f"CRT_WEIGHTS = {out_weights}",
+        f"# M_i = {[int(M_i) for M_i in model.M_i[::-1]]}, M_i^-1 mod m_i = {model.inverses[::-1]}",
+    ]
+    notes = []
+    new_fits = [mod for mod in domains if mod not in HW_MODULI]
+    if new_fits:
+        notes.append(f"PL_ALU_RNS only has RNS_fit_129 / RNS_fit_256; add reducers for {', '.join(map(str, new_fits))}")
+    wide_adds = [mod for mod in domains if 2 * (mod - 1) > 0xFF and mod != 256]
+    if wide_adds:
+        notes.append(f"RNS_adder sums in 8 bits, so ADDM wraps before the modulo for {', '.join(map(str, wide_adds))} (see rns_golden.py --rtl)")
+    if len(domains) != 2:
+        notes.append("UNRLL / UNRLU and the Assembler simulators only address two domains")
+    return lines, notes
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("""\033[1;31mUsage: \033[22mpython rns_moduli.py <min dynamic range>\033[0m\n
+        Ranks every set of pairwise-coprime moduli <= 256 whose product reaches the range, by reduction cost and CRT width,
+        and prints the MODULI literal + console_verify.py constants for the best one.\n
+        \033[1;32mAdditional optional arguments:\033[0m\n
+        \033[32m--domains <n>\033[0m\n
+        \tNUM_DOMAINS, the number of moduli in a set (default: 2)
+        \033[32m--top <n>\033[0m\n
+        \tNumber of sets to list (default: 10)
+        \033[32m--sort <reduce || crt>\033[0m\n
+        \tRank by reduction cost first (default), or by CRT reconstruction width first
+        \033[32m--pick <n>\033[0m\n
+        \tPrint the parameters for the n-th listed set instead of the best one (1-based)
+        \033[32m--count\033[0m\n
+        \tVisit every qualifying set so the total is exact, instead of skipping prefixes that can't make the list
+        \033[32m--max_mod <n>\033[0m\n
+        \tLargest modulus to consider (default: 256)
+        """)
+        sys.exit(1)
+
+    min_range = int(sys.argv[1], 0)
+    num_domains = 2
+    top = DEFAULT_TOP
+    sort = 'reduce'
+    pick = 1
+    max_mod = MAX_MODULUS
+    if "--domains" in sys.argv:
+        num_domains = int(sys.argv[sys.argv.index("--domains") + 1])
+    if "--top" in sys.argv:
+        top = int(sys.argv[sys.argv.index("--top") + 1])
+    if "--sort" in sys.argv:
+        sort = sys.argv[sys.argv.index("--sort") + 1]
+    if "--pick" in sys.argv:
+        pick = int(sys.argv[sys.argv.index("--pick") + 1])
+        top = max(top, pick)
+    if "--max_mod" in sys.argv:
+        max_mod = min(int(sys.argv[sys.argv.index("--max_mod") + 1]), MAX_MODULUS)
+
+    start = perf_counter()
+    tables = ModuliTables(max_mod)
+    tables_time = perf_counter() - start
+    try:
+        search = ModuliSearch(min_range, num_domains, top, sort, tables, "--count" not in sys.argv)
+    except ValueError as e:
+        print(f"\033[1;31mError: {e}\033[0m")
+        sys.exit(1)
+    elapsed = perf_counter() - start
+    ranked = search.getRanked()
+
+    print(f"{search.num_sets} sets of {num_domains} coprime moduli <= {max_mod} reach M >= {min_range}"
+          f"{' among those examined (--count for all)' if search.prune else ''} (tables {tables_time:.2f}s, search {elapsed - tables_time:.2f}s)")
+    if not ranked:
+        print(f"\033[1;31mNo set reaches the range; try more --domains\033[0m")
+        sys.exit(1)
+
+    print(f"Rank\t| Moduli\t\t| Forms\t\t\t| Reduce cost\t| CRT bits\t| M")
+    for idx, (moduli, cost, crt_bits, big_m) in enumerate(ranked):
+        print(f"{idx + 1}\t| {', '.join(map(str, moduli))}\t\t| {', '.join(get_form(mod) for mod in moduli)}\t\t| {cost}\t\t| {crt_bits}\t\t| {big_m}")
+
+    if pick > len(ranked):
+        print(f"\033[1;31mError: --pick {pick}, but only {len(ranked)} sets were found\033[0m")
+        sys.exit(1)
+    lines, notes = get_params(ranked[pick - 1][0], tables)
+    print(f"\n\033[1;32mSet {pick}:\033[0m")
+    print('\n'.join(lines))
+    for note in notes:
+        print(f"\033[1;33mNote: {note}\033[0m")
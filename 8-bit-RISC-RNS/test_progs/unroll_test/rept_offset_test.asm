@@ -0,0 +1,15 @@
+#.rept iteration variable in operand expressions: stores i*3+1 to data memory BASE+i for i = 0..COUNT-1.
+#Each iteration gets its immediates from \i at assembly time, so the unrolled block needs no address counter.
+.equ BASE, 0x10
+.equ COUNT, 8
+
+NOP
+LDI x6, 0x00 #mem addr [15:8]
+.rept COUNT, i
+LDI x2, \i * 3 + 1
+LDI x7, BASE + \i
+RSTORE x2, x6, x7
+.endr
+NOP
+NOP
+NOP
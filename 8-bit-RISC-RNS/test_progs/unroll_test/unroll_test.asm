@@ -0,0 +1,32 @@
+#Unrolled RNS kernel: UNRLL of m2*m2 for m2 = 1..COUNT, stored to data memory 0x0001..COUNT.
+#Written with the ASMMacro.py directives; each pass of LOOP stores UNROLL squares, so the
+#COMPARE / JMPLT and its NOPs are paid once per UNROLL elements. COUNT must be a multiple of UNROLL.
+.equ COUNT, 0xF0
+.equ UNROLL, 4
+
+#square m2 into m0, step m2, store the low byte at the next address
+.macro SQUARE_STORE
+MULM m0, m2, m2 #m2*m2
+ADDM m2, m2, x1 #m2++
+ADD x7, x7, x1 #increment mem addr
+UNRLL x3, m0
+RSTORE x3, x6, x7
+.endm
+
+LDI x0, 0x00
+LDI x1, 0x01
+ADDM m2, x0, x1 #set m2 to 1
+LDI x5, COUNT
+LDI x6, 0x00 #mem addr [15:8]
+LDI x7, 0x00 #mem addr [7:0]
+
+LOOP:
+NOP
+.rept UNROLL
+SQUARE_STORE
+.endr
+COMPARE x7, x5 #stop once COUNT squares are stored
+JMPLT LOOP
+NOP
+NOP
+NOP
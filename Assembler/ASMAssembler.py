@@ -0,0 +1,192 @@
+"""
+In-memory assembler API, for test runners, editors and ASMBatch.py --watch.
+
+ASMtoBin wants a file object and does everything in its constructor, and ASMtoV.py's __main__ writes every
+artifact to disk. ASMAssembler holds the options once and assembles source text (a string or an iterable of lines)
+without touching the filesystem:
+
+    asm = ASMAssembler({"schedule": True})
+    result = asm.assemble(open("call_ret.asm").read(), "call_ret.asm")
+    result.words, result.symbols, result.get_listing(), result.get_artifact_lines()
+
+The source passes (.equ / .macro / .rept expansion -> inline -> optimize -> layout -> schedule) run in the same order as ASMtoV.py, followed by the
+call-depth check. Errors raise ValueError, as ASMtoBin does.
+
+An ASMAssembler is meant to be kept warm. Assembling the same text under the same name again returns the previous
+result, and encodings of non-jump instruction lines are memoized across calls. After an edit, only the changed
+lines are encoded again; jumps are always re-encoded, since label addresses move. The whole-program passes
+re-run on every change. ASMResult.changed gives the source line ranges that changed since the last assembly of
+that name, and changed_words gives the instruction addresses whose words changed.
+"""
+import io
+import hashlib
+import difflib
+from typing import Iterable, Union
+
+from ASMtoV import ASMtoBin, BinToV, J_type_opcodes, split_inst
+from ASMInline import check_call_depth
+from ASMMacro import ASMMacro, has_directives
+
+DEFAULT_OPTS = {
+    "pc_wid": 10,
+    "inline": False,
+    "optimize": False,
+    "layout": False,
+    "schedule": False,
+    "mem": False,
+    "coe": False,
+}
+
+
+class _MemoASMtoBin(ASMtoBin):
+    def get_inst_bin(self, instruction: str, inst_line: int) -> str:
+        hit = self.memo.get(instruction)
+        if hit is not None:
+            return hit
+        bin_inst = super().get_inst_bin(instruction, inst_line)
+        if split_inst(instruction)[0].upper() not in J_type_opcodes: # jumps depend on the label addresses
+            self.memo[instruction] = bin_inst
+        return bin_inst
+
+
+    def __init__(self, fileobj, memo: dict):
+        '''
+        ASMtoBin that looks encodings of non-jump lines up in memo (shared between runs) before encoding them.
+        '''
+        self.memo = memo
+        super().__init__(fileobj)
+
+
+
+class ASMResult:
+    def get_listing(self) -> list:
+        """
+        Listing lines: label lines, then '<addr> | <hex> | <source>' per instruction.
+        """
+        listing = []
+        for addr, (hex_inst, text_inst, _) in self.prog.items():
+            listing.extend(f"{label}:" for label in self.symbols.get_labels(addr))
+            listing.append(f"10'h{addr:03X} | {hex_inst} | {text_inst}")
+        # labels at the end of the program
+        listing.extend(f"{label}:" for label in self.symbols.get_labels(len(self.prog)))
+        return listing
+
+
+    def get_artifact_lines(self, mem_name: str = None) -> dict:
+        """
+        The lines of each output file ASMBatch.py writes: {'v', 'hex', 'bin'} plus 'mem' / 'coe' if enabled.
+        With opts["mem"], the Instr_Mem wrapper loads mem_name (default: <name>.mem).
+        """
+        bin_to_v = BinToV(self.name, self.prog, self.label_addresses, prog_ctr_wid=self.opts["pc_wid"])
+        out_lines = {
+            "hex": [self.prog[idx][0] for idx in self.prog.keys()],
+            "bin": list(self.bin_prog),
+        }
+        if self.opts["mem"]:
+            mem_name = mem_name or f"{self.name.rsplit('.', 1)[0]}.mem"
+            out_lines["mem"] = bin_to_v.getMemLines()
+            out_lines["v"] = bin_to_v.getReadmemhVerilogLines(mem_name)
+        else:
+            out_lines["v"] = bin_to_v.getVerilogLines()
+        if self.opts["coe"]:
+            out_lines["coe"] = bin_to_v.getCoeLines()
+        return out_lines
+
+
+    def __init__(self, name: str, opts: dict, src_lines: list, asm_to_bin: ASMtoBin, call_depth: int, messages: list):
+        '''
+        Everything one assembly produced:
+            words / bin_prog        the program as integers / 16-char binary strings
+            prog                    {addr: [hex, source text, label]} as ASMtoBin.getProg()
+            symbols                 SymbolTable (label <-> address)
+            label_addresses         as ASMtoBin.label_addresses
+            src_lines               the source after the enabled passes
+            call_depth              deepest CALL chain (ASMInline.check_call_depth)
+            messages                one summary line per pass that ran
+            changed / changed_words set by ASMAssembler.assemble() against the previous result of the same name
+        '''
+        self.name = name
+        self.opts = opts
+        self.src_lines = src_lines
+        self.bin_prog = asm_to_bin.getBinProg()
+        self.words = [int(inst, 2) for inst in self.bin_prog]
+        self.prog = asm_to_bin.getProg()
+        self.symbols = asm_to_bin.symbols
+        self.label_addresses = asm_to_bin.label_addresses
+        self.call_depth = call_depth
+        self.messages = messages
+        self.changed = []
+        self.changed_words = []
+
+
+
+class ASMAssembler:
+    def run_passes(self, lines: list) -> tuple:
+        """
+        Run the enabled source passes. Returns (lines, summary messages).
+        """
+        messages = []
+        if has_directives(lines):
+            macro = ASMMacro(lines)
+            lines = macro.getLines()
+            messages.append(f"Expanded: {macro.num_macro_calls} macro calls, {macro.num_repts} .rept iterations, {len(macro.equs)} constants")
+        if self.opts["inline"]:
+            from ASMInline import ASMInline
+            inl = ASMInline(lines)
+            lines = inl.getLines()
+            messages.append(f"Inlined: {sum(inl.inlined.values())} CALL sites of {len(inl.inlined)} subroutines")
+        if self.opts["optimize"]:
+            from ASMPeep import ASMPeep
+            peep = ASMPeep(lines)
+            lines = peep.getLines()
+            messages.append(f"Optimized: {peep.slots_removed} instruction slots saved")
+        if self.opts["layout"]:
+            from ASMLayout import ASMLayout
+            lay = ASMLayout(lines)
+            lines = lay.getLines()
+            messages.append(f"Layout: {lay.branches_inverted} branches inverted, {lay.jumps_removed} JMPs removed")
+        if self.opts["schedule"]:
+            from ASMSched import ASMSched
+            sched = ASMSched(lines)
+            lines = sched.getLines()
+            messages.append(f"Scheduled: {sched.nops_removed} NOPs removed, {sched.nops_inserted} inserted")
+            messages.extend(f"Warning: {warning}" for warning in sched.warnings)
+        return lines, messages
+
+
+    def assemble(self, source: Union[str, Iterable[str]], name: str = "<source>") -> ASMResult:
+        """
+        Assemble source text (one string, or an iterable of lines) under the current options.
+        """
+        lines = source.splitlines() if isinstance(source, str) else [line.rstrip('\n') for line in source]
+        src_hash = hashlib.sha256('\n'.join(lines).encode()).hexdigest()
+        prev_hash, prev_lines, prev = self.last.get(name, (None, None, None))
+        if prev is not None and prev_hash == src_hash:
+            prev.changed, prev.changed_words = [], []
+            return prev
+
+        out_lines, messages = self.run_passes(lines)
+        call_depth = check_call_depth(out_lines)
+        asm_to_bin = _MemoASMtoBin(io.StringIO('\n'.join(line.rstrip('\n') for line in out_lines)), self.memo)
+        result = ASMResult(name, self.opts, out_lines, asm_to_bin, call_depth, messages)
+
+        if prev is not None:
+            matcher = difflib.SequenceMatcher(None, prev_lines, lines, autojunk=False)
+            result.changed = [(j1 + 1, max(j2, j1 + 1)) for tag, _, _, j1, j2 in matcher.get_opcodes() if tag != 'equal']
+            old_words = prev.words
+            result.changed_words = [
+                addr for addr in range(max(len(old_words), len(result.words)))
+                if addr >= len(old_words) or addr >= len(result.words) or old_words[addr] != result.words[addr]
+            ]
+        self.last[name] = (src_hash, lines, result)
+        return result
+
+
+    def __init__(self, opts: dict = None):
+        '''
+        Taking the options that change the output (see DEFAULT_OPTS; missing keys take the defaults),
+        build a reusable assembler. Call ASMAssembler.assemble() for each source.
+        '''
+        self.opts = dict(DEFAULT_OPTS, **(opts or {}))
+        self.memo = {} # instruction text -> (16-char binary, type) for non-jump lines
+        self.last = {} # name -> (source hash, source lines, ASMResult)
@@ -0,0 +1,312 @@
+"""
+Batch front end for ASMtoV.py.
+
+Assembles every .asm under a directory (or matching a glob) in parallel. It writes the same artifacts that
+ASMtoV.py's __main__ writes for a single file: an Instr_Mem .v plus .hex and .bin listings, and optionally
+.mem/.coe. A source is skipped when its cache key matches the one stored from its last build and all of its
+artifacts still exist. The key is a SHA-256 over:
+    - the source bytes
+    - the options that change the output
+    - the modules in TOOL_FILES: the assembler passes, ASMAssembler.py, this file, and ISASim.py (for the
+      call-stack depth the build checks against)
+The assembler has no include directive (ASMMacro.py only expands what is in the source), so nothing else can
+change a program's output.
+
+With --watch, the process stays up after the first build and polls the sources. A changed source is
+re-assembled in-process by one warm ASMAssembler (see ASMAssembler.py), and only artifacts whose contents
+changed are rewritten.
+"""
+import sys
+import os
+import glob
+import json
+import hashlib
+from time import perf_counter, sleep
+from concurrent.futures import ProcessPoolExecutor
+
+from ASMAssembler import ASMAssembler
+
+CACHE_FILE_NAME = ".asm_batch_cache.json"
+TOOL_FILES = ("ASMtoV.py", "ASMSched.py", "ASMPeep.py", "ASMLayout.py", "ASMInline.py", "ASMMacro.py", "ASMAssembler.py", "ASMBatch.py", "ISASim.py")
+
+
+def get_tool_hash() -> str:
+    """
+    Hash of the assembler modules, so a change to the assembler invalidates every cached build.
+    """
+    tool_hash = hashlib.sha256()
+    tool_dir = os.path.dirname(os.path.abspath(__file__))
+    for fname in TOOL_FILES:
+        path = os.path.join(tool_dir, fname)
+        if os.path.exists(path):
+            with open(path, 'rb') as fileobj:
+                tool_hash.update(fileobj.read())
+    return tool_hash.hexdigest()
+
+
+def get_source_hash(src_bytes: bytes, opts: dict, tool_hash: str) -> str:
+    src_hash = hashlib.sha256(src_bytes)
+    src_hash.update(json.dumps(opts, sort_keys=True).encode())
+    src_hash.update(tool_hash.encode())
+    return src_hash.hexdigest()
+
+
+def find_sources(target: str) -> tuple:
+    """
+    A directory is searched recursively for .asm files, anything else is used as a glob.
+    Returns (sorted source paths, base directory artifact paths are made relative to).
+    """
+    if os.path.isdir(target):
+        sources = glob.glob(os.path.join(target, "**", "*.asm"), recursive=True)
+        base = target
+    else:
+        sources = glob.glob(target, recursive=True)
+        base = os.path.commonpath([os.path.dirname(os.path.abspath(src)) for src in sources]) if sources else '.'
+    return sorted(os.path.abspath(src) for src in sources), os.path.abspath(base)
+
+
+def get_artifact_paths(src_path: str, base: str, out_dir: str, opts: dict) -> dict:
+    stem = os.path.splitext(os.path.relpath(src_path, base))[0]
+    exts = ["v", "hex", "bin"]
+    if opts["mem"]:
+        exts.append("mem")
+    if opts["coe"]:
+        exts.append("coe")
+    return {ext: os.path.join(out_dir, f"{stem}.{ext}") for ext in exts}
+
+
+def write_artifacts(result, artifacts: dict, written: dict = None) -> int:
+    """
+    Write a result's artifacts. With written ({path: lines} of what is on disk), unchanged files are skipped
+    and written is updated. Returns the number of files written.
+    """
+    out_lines = result.get_artifact_lines(os.path.basename(artifacts["mem"]) if "mem" in artifacts else None)
+    num_written = 0
+    for ext, path in artifacts.items():
+        if written is not None and written.get(path) == out_lines[ext]:
+            continue
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'w') as fileobj:
+            fileobj.writelines([line + '\n' for line in out_lines[ext]])
+        if written is not None:
+            written[path] = out_lines[ext]
+        num_written += 1
+    return num_written
+
+
+def assemble_file(src_path: str, artifacts: dict, opts: dict) -> tuple:
+    """
+    Worker: assemble one source and write its artifacts.
+    Returns (src_path, number of instructions, seconds, error string or None).
+    """
+    start = perf_counter()
+    try:
+        with open(src_path, 'r') as fileobj:
+            result = ASMAssembler(opts).assemble(fileobj.read(), os.path.basename(src_path))
+        write_artifacts(result, artifacts)
+        return src_path, len(result.prog), perf_counter() - start, None
+    except Exception as e:
+        return src_path, 0, perf_counter() - start, f"{type(e).__name__}: {e}"
+
+
+class ASMBatch:
+    def load_cache(self):
+        try:
+            with open(self.cache_path, 'r') as fileobj:
+                self.cache = json.load(fileobj)
+        except (OSError, ValueError):
+            self.cache = {}
+
+
+    def save_cache(self):
+        os.makedirs(self.out_dir, exist_ok=True)
+        with open(self.cache_path, 'w') as fileobj:
+            json.dump(self.cache, fileobj, indent=1, sort_keys=True)
+
+
+    def run(self) -> list:
+        """
+        Assemble everything that changed. Returns rows of (source, status, instructions, seconds, error).
+        """
+        tool_hash = get_tool_hash()
+        todo = []
+        self.results = []
+        for src_path in self.sources:
+            with open(src_path, 'rb') as fileobj:
+                src_hash = get_source_hash(fileobj.read(), self.opts, tool_hash)
+            artifacts = get_artifact_paths(src_path, self.base, self.out_dir, self.opts)
+            cached = self.cache.get(src_path)
+            if not self.force and cached and cached["hash"] == src_hash and all(os.path.exists(path) for path in artifacts.values()):
+                self.results.append((src_path, "cached", cached["num_insts"], 0.0, None))
+            else:
+                todo.append((src_path, artifacts, src_hash))
+
+        if todo:
+            with ProcessPoolExecutor(max_workers=self.jobs) as pool:
+                futures = [pool.submit(assemble_file, src_path, artifacts, self.opts) for src_path, artifacts, _ in todo]
+                for (src_path, _, src_hash), future in zip(todo, futures):
+                    _, num_insts, elapsed, error = future.result()
+                    if error:
+                        self.cache.pop(src_path, None)
+                        self.results.append((src_path, "error", num_insts, elapsed, error))
+                    else:
+                        self.cache[src_path] = {"hash": src_hash, "num_insts": num_insts}
+                        self.results.append((src_path, "built", num_insts, elapsed, None))
+        self.save_cache()
+
+        self.results.sort()
+        return self.results
+
+
+    def watch(self, interval: float = 0.25, on_build=None):
+        """
+        Poll the sources (new files under the target included) every interval seconds and re-assemble the ones whose
+        mtime changed, in this process. on_build(src_path, status, result or error, seconds, files written) is called
+        per rebuild. Runs until interrupted.
+        """
+        assembler = ASMAssembler(self.opts)
+        written = {}
+        mtimes = {}
+        # warm up on what run() just built, so the first save already only re-encodes / rewrites what changed
+        for src_path in self.sources:
+            try:
+                mtime = os.stat(src_path).st_mtime_ns
+                with open(src_path, 'r') as fileobj:
+                    result = assembler.assemble(fileobj.read(), os.path.basename(src_path))
+            except Exception:
+                continue # left out of mtimes, so the next poll builds it and reports the error
+            mtimes[src_path] = mtime
+            artifacts = get_artifact_paths(src_path, self.base, self.out_dir, self.opts)
+            out_lines = result.get_artifact_lines(os.path.basename(artifacts["mem"]) if "mem" in artifacts else None)
+            written.update((path, out_lines[ext]) for ext, path in artifacts.items())
+        tool_hash = get_tool_hash()
+        while True:
+            sleep(interval)
+            self.sources, _ = find_sources(self.target)
+            for src_path in self.sources:
+                try:
+                    mtime = os.stat(src_path).st_mtime_ns
+                    if mtimes.get(src_path) == mtime:
+                        continue
+                    mtimes[src_path] = mtime
+                    with open(src_path, 'rb') as fileobj:
+                        src_bytes = fileobj.read()
+                except OSError:
+                    continue # removed / being replaced by the editor; picked up on the next poll
+                start = perf_counter()
+                artifacts = get_artifact_paths(src_path, self.base, self.out_dir, self.opts)
+                try:
+                    result = assembler.assemble(src_bytes.decode(), os.path.basename(src_path))
+                    num_written = write_artifacts(result, artifacts, written)
+                except Exception as e:
+                    self.cache.pop(src_path, None)
+                    on_build and on_build(src_path, "error", f"{type(e).__name__}: {e}", perf_counter() - start, 0)
+                    continue
+                self.cache[src_path] = {"hash": get_source_hash(src_bytes, self.opts, tool_hash), "num_insts": len(result.prog)}
+                self.save_cache()
+                on_build and on_build(src_path, "built", result, perf_counter() - start, num_written)
+
+
+    def __init__(self, target: str, out_dir: str, opts: dict, jobs: int = None, force: bool = False):
+        '''
+        Taking a directory or glob of .asm sources and an output directory, assemble every source whose cache key changed
+        across a process pool. opts holds the output-affecting options: pc_wid, inline, optimize, layout, schedule, mem, coe.
+        '''
+        self.target = target
+        self.sources, self.base = find_sources(target)
+        self.out_dir = os.path.abspath(out_dir)
+        self.opts = opts
+        self.jobs = jobs
+        self.force = force
+        self.cache_path = os.path.join(self.out_dir, CACHE_FILE_NAME)
+        self.results = []
+        self.load_cache()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        print("""\033[1;31mUsage: \033[22mpython ASMBatch.py <source_dir || 'glob/**/*.asm'> <output_dir>\033[0m\n
+        \033[1;32mAdditional optional arguments:\033[0m\n
+        \033[32m--pc_wid <prog_ctr_width>\033[0m\n
+        \tSpecify a program counter width (default: 10)
+        \033[32m--jobs <n>\033[0m\n
+        \tNumber of worker processes (default: one per core)
+        \033[32m--inline\033[0m\n
+        \tInline small leaf subroutines (ASMtoV.py --inline) in every source
+        \033[32m--optimize\033[0m\n
+        \tRun the peephole pass (ASMtoV.py --optimize) on every source
+        \033[32m--layout\033[0m\n
+        \tRun the block layout pass (ASMtoV.py --layout, static heuristics) on every source
+        \033[32m--schedule\033[0m\n
+        \tRun the NOP scheduling pass (ASMtoV.py --schedule) on every source
+        \033[32m--mem\033[0m\n
+        \tAlso write .mem files, and readmemh Instr_Mem wrappers in place of the case statements
+        \033[32m--coe\033[0m\n
+        \tAlso write .coe files
+        \033[32m--force\033[0m\n
+        \tIgnore the cache and rebuild everything
+        \033[32m--watch\033[0m\n
+        \tAfter the build, keep running and re-assemble sources as they are saved (Ctrl+C to stop)
+        \033[32m--interval <seconds>\033[0m\n
+        \tHow often --watch checks the sources (default: 0.25)
+        """)
+        sys.exit(1)
+
+    opts = {
+        "pc_wid": 10,
+        "inline": "--inline" in sys.argv,
+        "optimize": "--optimize" in sys.argv,
+        "layout": "--layout" in sys.argv,
+        "schedule": "--schedule" in sys.argv,
+        "mem": "--mem" in sys.argv,
+        "coe": "--coe" in sys.argv,
+    }
+    jobs = None
+    if "--pc_wid" in sys.argv:
+        opts["pc_wid"] = int(sys.argv[sys.argv.index("--pc_wid") + 1])
+    if "--jobs" in sys.argv:
+        jobs = int(sys.argv[sys.argv.index("--jobs") + 1])
+
+    start = perf_counter()
+    batch = ASMBatch(sys.argv[1], sys.argv[2], opts, jobs, "--force" in sys.argv)
+    if not batch.sources:
+        print(f"\033[1;31mError: no .asm sources found for {sys.argv[1]}\033[0m")
+        sys.exit(1)
+    results = batch.run()
+    elapsed = perf_counter() - start
+
+    print(f"\n\033[1;32mSource{' ' * 34}| Status | Insts | Time (ms)\033[0m")
+    for src_path, status, num_insts, src_elapsed, error in results:
+        rel_path = os.path.relpath(src_path, batch.base)
+        color = "\033[1;31m" if status == "error" else ("\033[32m" if status == "built" else "")
+        print(f"{rel_path + (40 - len(rel_path)) * ' '}| {color}{status}\033[0m{(7 - len(status)) * ' '}| {num_insts}\t| {src_elapsed * 1000:.1f}")
+        if error:
+            print(f"\t\033[31m{error}\033[0m")
+
+    num_built = sum(1 for row in results if row[1] == "built")
+    num_errors = sum(1 for row in results if row[1] == "error")
+    print(f"\n{len(results)} sources: {num_built} built, {len(results) - num_built - num_errors} cached, {num_errors} failed in {elapsed:.2f}s")
+
+    if "--watch" in sys.argv:
+        def print_build(src_path, status, result, src_elapsed, num_written):
+            rel_path = os.path.relpath(src_path, batch.base)
+            if status == "error":
+                print(f"\033[1;31m{rel_path}: {result}\033[0m")
+                return
+            regions = ', '.join(f"{first}-{last}" if last > first else f"{first}" for first, last in result.changed)
+            print(f"\033[32m{rel_path}\033[0m: {len(result.prog)} insts, " + (f"lines {regions} changed, " if regions else "source unchanged, ") +
+                  f"{len(result.changed_words)} words changed, {num_written} files written, {src_elapsed * 1000:.1f} ms")
+            for message in result.messages:
+                if message.startswith("Warning"):
+                    print(f"\t\033[1;33m{message}\033[0m")
+
+        interval = 0.25
+        if "--interval" in sys.argv:
+            interval = float(sys.argv[sys.argv.index("--interval") + 1])
+        print(f"\033[1;32mWatching {sys.argv[1]} (Ctrl+C to stop)\033[0m")
+        try:
+            batch.watch(interval, print_build)
+        except KeyboardInterrupt:
+            pass
+        sys.exit(0)
+    sys.exit(1 if num_errors else 0)
@@ -0,0 +1,384 @@
+"""
+Benchmark suite for the toolchain and the reference workloads.
+
+Each workload is timed over --repeat runs (best and median wall time), then run once more under tracemalloc for its
+peak Python memory. Where a software model exists, the simulated cycles are recorded too. Workloads:
+    synth/*         a synthetic program filling instruction memory (PROG_MEM_DEPTH words, a jump every JUMP_EVERY
+                    words, so a few hundred labels), written as assembly by ASMDisasm: assembled with ASMtoBin,
+                    turned into Instr_Mem.v by BinToV, and disassembled back from it
+    uart_log/*      a synthetic UART capture in the serial_log.hex format (residue pairs of k+k, ENDADD, residue pairs
+                    of k*k, ENDMUL), --log_mb long, checked by console_verify.py the way its default mode does
+                    (split_list / get_rns_pairs) and the way --stream does, clean and with a corrupted byte every
+                    LOG_ERROR_EVERY bytes
+    test_progs/*    every program under 8-bit-RISC-RNS/test_progs (.asm sources and hex listings), run on PipelineSim
+                    up to --max_cycles (functional_test / norm_test never halt on their own)
+    expr/*          every .expr source under test_progs, compiled by ASMExpr (cycles are its prediction)
+
+Setup (generating inputs, assembling test programs) is not timed. The results are written as JSON:
+    {"meta": {...}, "results": {workload: {"wall_s", "wall_s_median", "peak_kib", ["cycles"], ...}}}
+and 'compare' lists every metric that got worse than the baseline by more than --threshold percent (wall time,
+peak memory) or at all (cycles, which don't depend on the machine). Time changes under MIN_TIME_DELTA_S are noise.
+"""
+import sys
+import os
+import io
+import json
+import glob
+import random
+import platform
+import statistics
+import subprocess
+import tracemalloc
+import importlib.util
+from time import perf_counter
+from datetime import datetime
+
+from ASMtoV import ASMtoBin, BinToV, J_type_opcodes
+from ASMDisasm import ASMDisasm, OPCODE_TABLE, decode_word, read_listing
+from ISASim import PROG_MEM_DEPTH, load_program
+from PipelineSim import PipelineSim
+
+TEST_PROGS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "8-bit-RISC-RNS", "test_progs")
+JUMP_EVERY = 4
+LOG_ERROR_EVERY = 4096
+DEFAULT_REPEAT = 3
+DEFAULT_LOG_MB = 4
+DEFAULT_MAX_CYCLES = 200_000
+DEFAULT_THRESHOLD = 10.0 # percent
+MIN_TIME_DELTA_S = 0.001
+COMPARED_METRICS = ("wall_s", "peak_kib", "cycles")
+
+
+def load_console_verify():
+    """
+    console_verify.py lives with the test programs, not on the import path. It imports rns_golden from there.
+    """
+    if TEST_PROGS_DIR not in sys.path:
+        sys.path.append(TEST_PROGS_DIR)
+    spec = importlib.util.spec_from_file_location("console_verify", os.path.join(TEST_PROGS_DIR, "console_verify.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def gen_program_words(num_words: int = PROG_MEM_DEPTH, jump_every: int = JUMP_EVERY, seed: int = 0) -> list:
+    """
+    num_words random words that all have an assembly form. About one in jump_every is a jump / CALL to a random
+    address, so ASMDisasm gives the program a label for most of them.
+    """
+    rng = random.Random(seed)
+    jump_ops = [int(opcode, 2) for mnemonic, opcode in J_type_opcodes.items() if mnemonic != "JR"]
+    words = []
+    while len(words) < num_words:
+        if rng.randrange(jump_every) == 0:
+            words.append((rng.choice(jump_ops) << 11) | rng.randrange(num_words))
+            continue
+        word = rng.randrange(1 << 16)
+        entry = OPCODE_TABLE[word >> 11]
+        if entry is not None and entry[1] != 'J' and decode_word(word)[3] is None:
+            words.append(word)
+    return words
+
+
+def gen_uart_log(num_bytes: int, error_every: int = 0) -> tuple:
+    """
+    A capture in the serial_log.hex format, about num_bytes long: the add section, ENDADD, the mul section, ENDMUL.
+    With error_every, every error_every-th residue byte of each section is flipped. Returns (log bytes, residue pairs
+    in both sections, flipped bytes).
+    """
+    cv = load_console_verify()
+    pairs = max(1, (num_bytes - len("ENDADDENDMUL")) // 4) # per section
+    log = bytearray()
+    for marker, op in cv.DEFAULT_SECTIONS:
+        period = cv.get_expected_period(op)
+        section = bytearray(period * (2 * pairs // len(period) + 1))[:2 * pairs]
+        if error_every:
+            for pos in range(error_every - 1, len(section), error_every):
+                section[pos] ^= 0xFF
+        log += section + marker.encode()
+    num_errors = 2 * (len(range(error_every - 1, 2 * pairs, error_every)) if error_every else 0)
+    return bytes(log), 2 * pairs, num_errors
+
+
+def get_git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True, text=True, timeout=10
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+class ASMBench:
+    def add(self, name: str, setup, run):
+        """
+        Register a workload: setup() -> state is not timed, run(state) -> {metric: value} is.
+        """
+        if not self.only or any(pattern in name for pattern in self.only):
+            self.workloads.append((name, setup, run))
+
+
+    def add_synth(self):
+        def setup_source():
+            lines = ASMDisasm(gen_program_words()).getLines()
+            return '\n'.join(lines)
+
+        def run_asm(source):
+            asm_to_bin = ASMtoBin(io.StringIO(source))
+            return {"words": len(asm_to_bin.getBinProg()), "labels": len(asm_to_bin.label_addresses)}
+
+        def setup_bin():
+            asm_to_bin = ASMtoBin(io.StringIO(setup_source()))
+            return asm_to_bin.getProg(), asm_to_bin.label_addresses
+
+        def run_bin_to_v(state):
+            prog, label_addresses = state
+            return {"lines": len(BinToV("synth.asm", prog, label_addresses).getVerilogLines())}
+
+        def setup_verilog():
+            return '\n'.join(BinToV("synth.asm", *setup_bin()).getVerilogLines())
+
+        def run_disasm(verilog):
+            words, labels = read_listing(io.StringIO(verilog), 'v')
+            return {"words": len(words), "lines": len(ASMDisasm(words, labels).getLines())}
+
+        self.add("synth/ASMtoBin", setup_source, run_asm)
+        self.add("synth/BinToV", setup_bin, run_bin_to_v)
+        self.add("synth/disasm", setup_verilog, run_disasm)
+
+
+    def add_uart_log(self):
+        num_bytes = int(self.log_mb * (1 << 20))
+
+        def run_split(state):
+            log, pairs, _, cv = state
+            rns_pairs = cv.get_rns_pairs(cv.split_list(cv.get_file_bytes(io.BytesIO(log))))
+            num_split = sum(len(section) for section in rns_pairs)
+            if num_split != pairs:
+                raise ValueError(f"console_verify split {num_split} residue pairs out of {pairs}")
+            return {"bytes": len(log), "mb_per_s": None}
+
+        def run_stream(state):
+            log, pairs, num_errors, cv = state
+            verifier = cv.stream_verify(io.BytesIO(log), cv.StreamVerifier())
+            if verifier.num_pairs != pairs or verifier.num_mismatches != num_errors:
+                raise ValueError(
+                    f"console_verify --stream checked {verifier.num_pairs} residue pairs with {verifier.num_mismatches} "
+                    f"mismatches, expected {pairs} with {num_errors}"
+                )
+            return {"bytes": len(log), "mb_per_s": None}
+
+        self.add("uart_log/split", lambda: gen_uart_log(num_bytes) + (load_console_verify(),), run_split)
+        self.add("uart_log/stream", lambda: gen_uart_log(num_bytes) + (load_console_verify(),), run_stream)
+        self.add("uart_log/stream_errors", lambda: gen_uart_log(num_bytes, LOG_ERROR_EVERY) + (load_console_verify(),), run_stream)
+
+
+    def add_test_progs(self):
+        paths = sorted(
+            glob.glob(os.path.join(TEST_PROGS_DIR, "**", "*.asm"), recursive=True)
+            + glob.glob(os.path.join(TEST_PROGS_DIR, "**", "*.txt"), recursive=True)
+        )
+        for path in paths:
+            def run_sim(words):
+                sim = PipelineSim(words)
+                halt = sim.run(self.max_cycles)
+                return {"cycles": sim.cycles, "retired": sim.retired_total, "halt": halt}
+
+            name = os.path.relpath(path, TEST_PROGS_DIR).replace(os.sep, '/')
+            self.add(f"test_progs/{name}", lambda path=path: load_program(path), run_sim)
+
+        for path in sorted(glob.glob(os.path.join(TEST_PROGS_DIR, "**", "*.expr"), recursive=True)):
+            def setup_expr(path=path):
+                with open(path, 'r') as fileobj:
+                    return fileobj.read().splitlines(), os.path.basename(path)
+
+            def run_expr(state):
+                from ASMExpr import ASMExpr
+                expr = ASMExpr(*state)
+                return {"cycles": expr.gen.cycles, "lines": len(expr.getLines())}
+
+            self.add(f"expr/{os.path.relpath(path, TEST_PROGS_DIR).replace(os.sep, '/')}", setup_expr, run_expr)
+
+
+    def run_workload(self, setup, run) -> dict:
+        state = setup()
+        times = []
+        for _ in range(self.repeat):
+            start = perf_counter()
+            metrics = run(state)
+            times.append(perf_counter() - start)
+
+        tracemalloc.start()
+        try:
+            run(state)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+        result = {"wall_s": min(times), "wall_s_median": statistics.median(times), "peak_kib": peak / 1024}
+        result.update(metrics)
+        if "mb_per_s" in result:
+            result["mb_per_s"] = result["bytes"] / (1 << 20) / result["wall_s"]
+        return result
+
+
+    def run(self, on_result=None) -> dict:
+        """
+        Run every workload. on_result(name, result) is called as each one finishes.
+        """
+        for name, setup, run in self.workloads:
+            self.results[name] = self.run_workload(setup, run)
+            if on_result:
+                on_result(name, self.results[name])
+        return self.results
+
+
+    def getJSON(self) -> dict:
+        return {"meta": self.meta, "results": self.results}
+
+
+    def __init__(self, repeat: int = DEFAULT_REPEAT, log_mb: float = DEFAULT_LOG_MB, max_cycles: int = DEFAULT_MAX_CYCLES, only: list = None):
+        '''
+        Collect the workloads (only: names must contain one of these substrings). ASMBench.run() runs them, and
+        ASMBench.getJSON() gives the results with the settings and machine they were taken on.
+        '''
+        self.repeat = repeat
+        self.log_mb = log_mb
+        self.max_cycles = max_cycles
+        self.only = only
+        self.workloads = [] # (name, setup, run)
+        self.results = {}
+        self.meta = {
+            "date": datetime.now().isoformat(timespec='seconds'),
+            "commit": get_git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "repeat": repeat,
+            "log_mb": log_mb,
+            "max_cycles": max_cycles,
+        }
+        self.add_synth()
+        self.add_uart_log()
+        self.add_test_progs()
+
+
+def compare_results(base: dict, new: dict, threshold: float = DEFAULT_THRESHOLD) -> tuple:
+    """
+    Compare two result files. Returns (rows, regressions, notes): rows are (workload, metric, base, new, change %,
+    verdict) with verdict 'regression', 'improvement' or '' for every metric both have.
+    """
+    rows = []
+    regressions = 0
+    notes = []
+    for key in ("log_mb", "max_cycles"):
+        if base["meta"].get(key) != new["meta"].get(key):
+            notes.append(f"{key} differs ({base['meta'].get(key)} vs {new['meta'].get(key)}); the affected workloads aren't comparable")
+    for name in base["results"].keys() - new["results"].keys():
+        notes.append(f"{name} is only in the baseline")
+    for name in new["results"].keys() - base["results"].keys():
+        notes.append(f"{name} is new")
+
+    for name in sorted(base["results"].keys() & new["results"].keys()):
+        old_res, new_res = base["results"][name], new["results"][name]
+        for metric in COMPARED_METRICS:
+            if metric not in old_res or metric not in new_res:
+                continue
+            old, cur = old_res[metric], new_res[metric]
+            change = (cur - old) / old * 100 if old else (0.0 if cur == old else float('inf'))
+            if metric == "cycles":
+                worse, better = cur > old, cur < old
+            else:
+                noise = metric == "wall_s" and abs(cur - old) < MIN_TIME_DELTA_S
+                worse, better = change > threshold and not noise, change < -threshold and not noise
+            regressions += worse
+            rows.append((name, metric, old, cur, change, "regression" if worse else "improvement" if better else ""))
+    return rows, regressions, notes
+
+
+def get_value_str(metric: str, value) -> str:
+    if metric == "wall_s":
+        return f"{value * 1000:.2f} ms"
+    if metric == "peak_kib":
+        return f"{value:.0f} KiB"
+    return str(value)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3 or sys.argv[1] not in ("run", "compare"):
+        print("""\033[1;31mUsage: \033[22mpython ASMBench.py run <results.json>\033[0m
+        \033[1;31m       python ASMBench.py compare <baseline.json> <results.json>\033[0m\n
+        run: time every workload and write the results. compare: list the metrics that regressed (exit 1 if any).\n
+        \033[1;32mAdditional optional arguments:\033[0m\n
+        \033[32m--only <substring,...>\033[0m\n
+        \trun: only the workloads whose name contains one of these (e.g. synth,uart_log)
+        \033[32m--repeat <n>\033[0m\n
+        \trun: timed runs per workload; the best is compared (default: 3)
+        \033[32m--log_mb <n>\033[0m\n
+        \trun: size of the synthetic UART logs in MiB (default: 4)
+        \033[32m--max_cycles <n>\033[0m\n
+        \trun: PipelineSim cycle limit for the test programs (default: 200000)
+        \033[32m--threshold <percent>\033[0m\n
+        \tcompare: how much worse wall time / peak memory may get before it counts as a regression (default: 10).
+        \tAny increase in simulated cycles is a regression.
+        \033[32m--all\033[0m\n
+        \tcompare: list every metric, not just the ones that changed by more than the threshold
+        """)
+        sys.exit(1)
+
+    if sys.argv[1] == "compare":
+        if len(sys.argv) < 4:
+            print("\033[1;31mError: compare needs <baseline.json> <results.json>\033[0m")
+            sys.exit(1)
+        threshold = DEFAULT_THRESHOLD
+        if "--threshold" in sys.argv:
+            threshold = float(sys.argv[sys.argv.index("--threshold") + 1])
+        try:
+            with open(sys.argv[2], 'r') as base_file, open(sys.argv[3], 'r') as new_file:
+                base, new = json.load(base_file), json.load(new_file)
+        except (OSError, ValueError) as e:
+            print(f"\033[1;31mError: {e}\033[0m")
+            sys.exit(1)
+
+        rows, regressions, notes = compare_results(base, new, threshold)
+        print(f"Baseline: {base['meta'].get('commit')} ({base['meta'].get('date')}), results: {new['meta'].get('commit')} ({new['meta'].get('date')})")
+        print(f"\033[1;32mWorkload\t\t\t\t\t\t| Metric\t| Baseline\t| Results\t| Change\033[0m")
+        for name, metric, old, cur, change, verdict in rows:
+            if not verdict and "--all" not in sys.argv:
+                continue
+            color = "\033[1;31m" if verdict == "regression" else "\033[32m" if verdict == "improvement" else ""
+            print(f"{color}{name:<48}| {metric}\t| {get_value_str(metric, old)}\t| {get_value_str(metric, cur)}\t| {change:+.1f}% {verdict}\033[0m")
+        for note in notes:
+            print(f"Note: {note}")
+        if regressions:
+            print(f"\033[1;31m{regressions} regressions (threshold {threshold}%, any cycle increase)\033[0m")
+        else:
+            print(f"\033[1;32mNo regressions beyond {threshold}% in {len(rows)} metrics\033[0m")
+        sys.exit(1 if regressions else 0)
+
+    repeat, log_mb, max_cycles, only = DEFAULT_REPEAT, DEFAULT_LOG_MB, DEFAULT_MAX_CYCLES, None
+    if "--repeat" in sys.argv:
+        repeat = int(sys.argv[sys.argv.index("--repeat") + 1])
+    if "--log_mb" in sys.argv:
+        log_mb = float(sys.argv[sys.argv.index("--log_mb") + 1])
+    if "--max_cycles" in sys.argv:
+        max_cycles = int(sys.argv[sys.argv.index("--max_cycles") + 1])
+    if "--only" in sys.argv:
+        only = sys.argv[sys.argv.index("--only") + 1].split(',')
+
+    def print_result(name, result):
+        extra = f", {result['cycles']} cycles" if "cycles" in result else ""
+        extra += f", {result['mb_per_s']:.1f} MiB/s" if "mb_per_s" in result else ""
+        print(f"{name:<48}| {get_value_str('wall_s', result['wall_s'])} (median {get_value_str('wall_s', result['wall_s_median'])}), "
+              f"peak {get_value_str('peak_kib', result['peak_kib'])}{extra}")
+
+    bench = ASMBench(repeat, log_mb, max_cycles, only)
+    start = perf_counter()
+    try:
+        bench.run(print_result)
+    except ValueError as e:
+        print(f"\033[1;31mError: {e}\033[0m")
+        sys.exit(1)
+    with open(sys.argv[2], 'w') as json_fout:
+        json.dump(bench.getJSON(), json_fout, indent=2)
+    print(f"\033[1;32m{len(bench.results)} workloads in {perf_counter() - start:.1f} s, results written to {sys.argv[2]}\033[0m")
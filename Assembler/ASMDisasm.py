@@ -0,0 +1,254 @@
+"""
+Disassembler for RISC-RNS programs (Instr_Mem.v case statements, hex listings / .mem files, instruction .coe files).
+
+Decoding goes through OPCODE_TABLE, a 32-entry list indexed by the 5-bit opcode, built once by inverting the
+opcode dicts in ASMtoV.py, so a word is disassembled with a table lookup and a few shifts. The output is
+assembly in the style of the test programs, and ASMtoBin assembles it back to the same words:
+    - Labels named in BinToV's '- Jump target for label: X' comments are kept; other jump targets get L_<addr>.
+      A jump past the end of the program gets NOP padding up to its target (what instruction memory holds there).
+    - Immediates / ports are written as 0x.., source operands as x / m by their domain bit, destinations by opcode.
+Words no assembly line can produce (unused opcodes, bits set outside an instruction's fields) are listed in
+ASMDisasm.bad_words and written as a NOP with the word in a comment; --check fails on them.
+
+The listing is parsed a line at a time; a 1024-word Instr_Mem.v disassembles and re-assembles in a few ms,
+so --check can run as a pre-commit hook over the checked-in Instr_Mem.v files.
+"""
+import sys
+import io
+import re
+from time import perf_counter
+from typing import Iterable, TextIO
+
+from ASMtoV import ASMtoBin, J_type_opcodes, R_type_opcodes, I_type_opcodes, RNS_dest_insts
+from ISASim import PROG_MEM_DEPTH, words_from_bin_prog
+
+# OPCODE_TABLE[opcode] = (mnemonic, type) with type 'N', 'R', 'I' or 'J'; None for opcodes the ISA doesn't use
+OPCODE_TABLE = [None] * 32
+OPCODE_TABLE[0] = ("NOP", 'N')
+for opcodes, op_type in ((R_type_opcodes, 'R'), (I_type_opcodes, 'I'), (J_type_opcodes, 'J')):
+    for mnemonic, opcode in opcodes.items():
+        OPCODE_TABLE[int(opcode, 2)] = (mnemonic, op_type)
+
+CASE_LINE = re.compile(r"(\d+)'h([0-9A-Fa-f]+)\s*:\s*instr_mem_out\s*<=\s*\d+'h([0-9A-Fa-f]+)")
+LABEL_COMMENT = re.compile(r"Jump target for label:\s*(\S+)")
+
+
+def read_listing(fileobj: TextIO, fmt: str = None) -> tuple:
+    """
+    Stream-parse a program listing. Returns (words, {addr: label}) with the labels BinToV left in comments.
+    fmt is 'v' (case statement), 'coe' or 'hex' (hex listing / .mem); by default it comes from the file name.
+    A case statement's trailing 16'h0000 padding is dropped, like ISASim.read_instr_mem_v does.
+    """
+    name = getattr(fileobj, 'name', '')
+    fmt = fmt or ('v' if name.lower().endswith('.v') else 'coe' if name.lower().endswith('.coe') else 'hex')
+    words = {}
+    labels = {}
+    if fmt == 'v':
+        for line in fileobj:
+            match = CASE_LINE.search(line)
+            if match:
+                addr = int(match.group(2), 16)
+                words[addr] = int(match.group(3), 16)
+                label = LABEL_COMMENT.search(line)
+                if label:
+                    labels[addr] = label.group(1).upper()
+        last = max((addr for addr, word in words.items() if word), default=-1)
+        return [words.get(addr, 0) for addr in range(last + 1)], labels
+
+    prog = []
+    in_vector = fmt != 'coe'
+    for line in fileobj:
+        if fmt == 'coe':
+            line = line.split(';', 1)[0] if line.lstrip().startswith(';') else line
+            if not in_vector:
+                if "memory_initialization_vector" in line:
+                    in_vector = True
+                    line = line.split('=', 1)[1]
+                else:
+                    continue
+            prog.extend(int(tok, 16) for tok in line.replace(',', ' ').replace(';', ' ').split())
+            continue
+        code, _, comment = line.partition('//')
+        label = LABEL_COMMENT.search(comment)
+        if label:
+            labels[len(prog)] = label.group(1).upper()
+        prog.extend(int(tok, 16) for tok in code.split())
+    return prog, labels
+
+
+def get_reg(field: int) -> str:
+    """
+    4-bit source field {domain, addr} -> 'x3' / 'm3'.
+    """
+    return f"{'m' if field & 0x8 else 'x'}{field & 0x7}"
+
+
+def decode_word(word: int) -> tuple:
+    """
+    (mnemonic, operands, jump target or None, reason the word can't be written as assembly or None).
+    """
+    entry = OPCODE_TABLE[word >> 11]
+    if entry is None:
+        return "NOP", [], None, f"opcode {word >> 11:05b} is not in the ISA"
+    mnemonic, op_type = entry
+    rd, rs2, rs1 = (word >> 8) & 0x7, (word >> 4) & 0xF, word & 0xF
+    if op_type == 'N':
+        return "NOP", [], None, (f"NOP with bits {word & 0x7FF:011b} set" if word else None)
+    if op_type == 'I':
+        return mnemonic, [f"x{rd}", f"0x{word & 0xFF:02X}"], None, None
+    if op_type == 'J':
+        if word & 0x400:
+            return mnemonic, [], None, "bit 10 of a J-type word is set"
+        if mnemonic == "JR":
+            return "JR", ["RA"], None, (f"JR with address field {word & 0x3FF:03X}" if word & 0x3FF else None)
+        return mnemonic, [], word & 0x3FF, None
+    if mnemonic == "COMPARE":
+        return mnemonic, [get_reg(rs1), get_reg(rs2)], None, (f"COMPARE with rd = {rd}" if rd else None)
+    if mnemonic in ("UNRLL", "UNRLU"):
+        return mnemonic, [f"x{rd}", get_reg(rs1)], None, (f"{mnemonic} with rs2 = {rs2:04b}" if rs2 else None)
+    dest = f"{'m' if mnemonic in RNS_dest_insts else 'x'}{rd}"
+    return mnemonic, [dest, get_reg(rs1), get_reg(rs2)], None, None
+
+
+class ASMDisasm:
+    def get_label(self, addr: int) -> str:
+        if addr not in self.labels:
+            self.labels[addr] = f"L_{addr:03X}"
+        return self.labels[addr]
+
+
+    def disassemble(self):
+        decoded = [decode_word(word) for word in self.words]
+        for addr, (_, _, targ, bad) in enumerate(decoded):
+            if targ is not None:
+                self.get_label(targ)
+            if bad:
+                self.bad_words.append((addr, self.words[addr], bad))
+
+        for addr, (mnemonic, operands, targ, bad) in enumerate(decoded):
+            if addr in self.labels:
+                self.lines.append(f"{self.labels[addr]}:")
+            if targ is not None:
+                operands = [self.labels[targ]]
+            line = f"{mnemonic} {', '.join(operands)}" if operands else mnemonic
+            if bad:
+                line = f"NOP # 16'h{self.words[addr]:04X}: {bad}" + (f" ({line})" if mnemonic != "NOP" else "")
+            self.lines.append(line)
+
+        # labels past the last word: pad with the NOPs instruction memory holds there
+        for addr in range(len(self.words), max(self.labels, default=-1) + 1):
+            if addr in self.labels:
+                self.lines.append(f"{self.labels[addr]}:")
+            if addr < max(self.labels):
+                self.lines.append("NOP")
+                self.padding += 1
+
+
+    def getLines(self) -> list:
+        return self.lines
+
+
+    def __init__(self, words: Iterable[int], labels: dict = None):
+        '''
+        Taking a program as integer words (and optionally {addr: label name}), disassemble it to ASM.
+        The source can be obtained with ASMDisasm.getLines().
+        '''
+        self.words = list(words)
+        if len(self.words) > PROG_MEM_DEPTH:
+            raise ValueError(f"Program is {len(self.words)} words long; instruction memory holds {PROG_MEM_DEPTH}")
+        self.labels = dict(labels or {})
+        self.lines = []
+        self.bad_words = [] # (addr, word, reason)
+        self.padding = 0 # NOPs added after the program to reach jump targets past its end
+        self.disassemble()
+
+
+def check_round_trip(disasm: ASMDisasm) -> list:
+    """
+    Re-assemble the disassembly. Returns [(addr, expected word, re-assembled word)] for every word that differs.
+    """
+    words = words_from_bin_prog(ASMtoBin(io.StringIO('\n'.join(disasm.getLines()))).getBinProg())
+    expected = disasm.words + [0] * disasm.padding
+    bad = {addr for addr, _, _ in disasm.bad_words}
+    diffs = [(addr, exp, got) for addr, (exp, got) in enumerate(zip(expected, words)) if exp != got or addr in bad]
+    if len(words) != len(expected):
+        diffs.append((min(len(words), len(expected)), len(expected), len(words)))
+    return diffs
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("""\033[1;31mUsage: \033[22mpython ASMDisasm.py <program (Instr_Mem.v | hex listing | .mem | .coe)> [more programs]\033[0m\n
+        \033[1;32mAdditional optional arguments:\033[0m\n
+        \033[32m--asm_out <file.asm>\033[0m\n
+        \tWrite the disassembly to a file instead of printing it (single program only)\n
+        \033[32m--check\033[0m\n
+        \tDon't print the disassembly; re-assemble it and fail (exit 1) unless every word comes back identical.
+        \tWith several programs, e.g. all checked-in Instr_Mem.v files, this works as a pre-commit check.\n
+        \033[32m--source <file.asm>\033[0m\n
+        \tAlso check that <file.asm> assembles to the same words as the program (single program only),
+        \ti.e. that a generated Instr_Mem.v isn't stale
+        """)
+        sys.exit(1)
+
+    paths = []
+    idx = 1
+    while idx < len(sys.argv):
+        if sys.argv[idx] in ("--asm_out", "--source"):
+            idx += 2
+            continue
+        if not sys.argv[idx].startswith("--"):
+            paths.append(sys.argv[idx])
+        idx += 1
+
+    failed = False
+    for path in paths:
+        start = perf_counter()
+        try:
+            with open(path, 'r') as fileobj:
+                words, labels = read_listing(fileobj)
+            disasm = ASMDisasm(words, labels)
+        except OSError:
+            print(f"\033[1;31mError: Could not open program {path}\033[0m")
+            sys.exit(1)
+        except ValueError as e:
+            print(f"\033[1;31mError: {path}: {e}\033[0m")
+            sys.exit(1)
+
+        if "--check" in sys.argv:
+            diffs = check_round_trip(disasm)
+            elapsed = perf_counter() - start
+            for addr, word, reason in disasm.bad_words:
+                print(f"\033[1;31m{path}: 10'h{addr:03X} 16'h{word:04X} has no assembly form ({reason})\033[0m")
+            for addr, exp, got in diffs:
+                if addr not in {bad[0] for bad in disasm.bad_words}:
+                    print(f"\033[1;31m{path}: 10'h{addr:03X} re-assembles to 16'h{got:04X}, expected 16'h{exp:04X}\033[0m")
+            if diffs:
+                failed = True
+            else:
+                print(f"\033[1;32m{path}: {len(words)} words round-trip, {elapsed * 1000:.1f} ms\033[0m")
+        elif "--asm_out" in sys.argv:
+            with open(sys.argv[sys.argv.index("--asm_out") + 1], 'w') as asm_fout:
+                asm_fout.writelines(line + '\n' for line in disasm.getLines())
+        else:
+            print('\n'.join(disasm.getLines()))
+
+        if "--source" in sys.argv:
+            src_path = sys.argv[sys.argv.index("--source") + 1]
+            try:
+                src_words = words_from_bin_prog(ASMtoBin(open(src_path, 'r')).getBinProg())
+            except OSError:
+                print(f"\033[1;31mError: Could not open source file {src_path}\033[0m")
+                sys.exit(1)
+            # a case statement doesn't keep trailing NOPs
+            while src_words and not src_words[-1] and len(src_words) > len(words):
+                src_words.pop()
+            first = next((addr for addr, (a, b) in enumerate(zip(src_words, words)) if a != b), None)
+            if first is None and len(src_words) == len(words):
+                print(f"\033[1;32m{src_path} assembles to {path}\033[0m")
+            else:
+                failed = True
+                first = min(len(src_words), len(words)) if first is None else first
+                print(f"\033[1;31m{path} is stale: it differs from {src_path} from address 10'h{first:03X}\033[0m")
+
+    sys.exit(1 if failed else 0)
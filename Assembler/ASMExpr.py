@@ -0,0 +1,873 @@
+"""
+Expression compiler for RISC-RNS: straight-line arithmetic and counted loops over 8- and 16-bit variables,
+compiled to assembly for ASMtoBin.
+
+    u8 a = 7                    # declarations: u8 / u16 <name> = <expr>
+    u8 b = 0x21
+    u16 acc = 0
+    repeat 16 {                 # counted loop, 1..255 iterations; loops nest
+        acc += a * b            # assignments: = += -= *= <<= &= |=
+        a = a + 3
+    }
+    store 0x0100, acc           # RSTORE to a constant address; a u16 is stored low byte first
+
+Expressions use + - * << & | and parentheses over variables and constants (decimal or 0x..). An operation is as
+wide as its widest operand, and a constant over 0xFF is 16-bit. So u8 * u8 wraps at 256, and a u8 operand of a
+16-bit operation is zero-extended. Shift counts are constants. Constant subexpressions are folded.
+
+Domains. The mod-256 lane of an RNS register (bits [15:8], read with UNRLU) wraps exactly like an 8-bit integer
+under ADDM / SUBM / MULM. RNS ops also take x registers as sources directly, so an 8-bit +, - * or << can run in
+either domain: as integer ops on x registers (a multiply becomes a shift-and-add sequence, INT_MUL_INSTS
+instructions for two variables) or as RNS ops on m registers, with an UNRLU to come back. For each expression node,
+the cost model (instructions, weighted by the trip counts of the loops around them) picks the cheaper domain, and
+converts only where that pays for itself. 16-bit values stay in the integer domain: 129 * 256 = 33024 doesn't
+cover 16 bits, and the ISA has no reverse converter. A 16-bit +/- gets its carry / borrow from the sign bits
+without a branch, so all code is straight-line and the predicted cycle count doesn't depend on the data.
+
+Registers. Every variable has one home for the whole program: an x register (a pair for u16) or an m register
+(u8: its mod-256 lane; u16: packed with RLLM, read back with UNRLL / UNRLU). The rest of each file holds
+temporaries and loop counters. Homes are chosen by hill climbing on the predicted cycle count, over the
+assignments whose temporaries fit.
+
+The output needs no scheduling (see ASMSched.py). It starts with an LDI, it has no RLOAD / CALL, and each loop's
+JMPGT reads the COMPARE two slots ahead of it. --check runs the program on ISASim against the reference semantics,
+and on PipelineSim to measure its cycles.
+"""
+import sys
+import io
+import ast
+import re
+from typing import Iterable
+
+from ASMtoV import ASMtoBin, BinToV
+from ASMProfile import JUMP_PENALTY
+from ISASim import NUM_REGS
+
+INF = float('inf')
+MODES = ("auto", "int", "rns")
+INT_MUL_INSTS = 56 # emit_int_mul: u8 * u8, both variables
+PIPELINE_DRAIN = 3 # cycles PipelineSim runs past the last instruction before it halts
+BIN_OPS = {ast.Add: '+', ast.Sub: '-', ast.Mult: '*', ast.LShift: '<<', ast.BitAnd: '&', ast.BitOr: '|'}
+COMMUTATIVE_OPS = ('+', '*', '&', '|')
+INT_OPS = {'+': "ADD", '-': "SUB", '&': "ANDBIT", '|': "ORBIT"}
+RNS_OPS = {'+': "ADDM", '-': "SUBM", '*': "MULM"}
+
+DECL_LINE = re.compile(r"^(u8|u16)\s+([A-Za-z_]\w*)\s*=\s*(.+)$")
+ASSIGN_LINE = re.compile(r"^([A-Za-z_]\w*)\s*(\+|-|\*|<<|&|\|)?=\s*(.+)$")
+REPEAT_LINE = re.compile(r"^repeat\s+(.+?)\s*\{$")
+STORE_LINE = re.compile(r"^store\s+([^,]+),(.+)$")
+KEYWORDS = ("u8", "u16", "repeat", "store")
+
+
+def get_width(node: tuple) -> int:
+    if node[0] == 'const':
+        return 16 if node[1] > 0xFF else 8
+    return node[2] if node[0] == 'var' else node[4]
+
+
+def eval_op(sym: str, a: int, b: int, width: int) -> int:
+    """
+    One operation as the generated code computes it, wrapped to width bits.
+    """
+    if sym == '+':
+        res = a + b
+    elif sym == '-':
+        res = a - b
+    elif sym == '*':
+        res = a * b
+    elif sym == '<<':
+        res = a << b
+    elif sym == '&':
+        res = a & b
+    else:
+        res = a | b
+    return res & ((1 << width) - 1)
+
+
+def make_op(sym: str, a: tuple, b: tuple, line: int) -> tuple:
+    """
+    Expression node ('op', sym, a, b, width), folded where an operand is constant.
+    """
+    if sym == '<<' and (b[0] != 'const' or b[1] > 15):
+        raise ValueError(f"Line {line + 1}: shift count must be a constant 0..15")
+    if a[0] == 'const' and b[0] == 'const':
+        return ('const', eval_op(sym, a[1], b[1], 16))
+    if sym in COMMUTATIVE_OPS and a[0] == 'const':
+        a, b = b, a
+    if b[0] == 'const' and b[1] == 0:
+        if sym in ('+', '-', '<<', '|'):
+            return a
+        if sym in ('*', '&'):
+            return ('const', 0)
+    if sym == '*' and b == ('const', 1):
+        return a
+    width = max(get_width(a), get_width(b)) if sym != '<<' else get_width(a)
+    return ('op', sym, a, b, width)
+
+
+class _OutOfRegs(ValueError):
+    pass
+
+
+
+class _Val:
+    """
+    A value in registers: kind 'x' / 'm' (u8) or 'xx' ([lo, hi], u16), and which of its registers are temporaries.
+    """
+    __slots__ = ("kind", "regs", "temps")
+
+    def __init__(self, kind: str, regs: list, temps: list = ()):
+        self.kind = kind
+        self.regs = regs
+        self.temps = list(temps)
+
+
+
+class _ExprGen:
+    def alloc(self, dom: str) -> str:
+        if not self.free[dom]:
+            raise _OutOfRegs(f"more than {NUM_REGS} {dom} registers needed")
+        num = min(self.free[dom])
+        self.free[dom].remove(num)
+        return f"{dom}{num}"
+
+
+    def release(self, val: _Val):
+        for reg in val.temps:
+            self.free[reg[0]].append(int(reg[1:]))
+        val.temps = []
+
+
+    def emit(self, inst: str):
+        self.lines.append(inst)
+        self.cycles += self.weight
+        self.num_insts += 1
+        op = inst.split()[0]
+        if op in RNS_OPS.values():
+            self.num_rns_ops += 1
+        elif op in ("UNRLU", "UNRLL", "RLLM"):
+            self.num_conversions += 1
+
+
+    def get_costs(self, node: tuple) -> tuple:
+        """
+        (cost in an x register, cost in an m register, cost as integer ops, cost as RNS ops) of a u8 node,
+        in instructions. RNS ops read x registers directly; m -> x costs an UNRLU, x -> m an RLLM.
+        """
+        key = id(node)
+        if key in self.costs:
+            return self.costs[key]
+        if node[0] == 'const':
+            int_cost, rns_cost = 1, INF # LDI
+        elif node[0] == 'var':
+            int_cost, rns_cost = (0, INF) if self.home[node[1]][0] == 'x' else (INF, 0)
+        else:
+            sym, a, b = node[1:4]
+            a_costs = self.get_costs(a)
+            b_costs = self.get_costs(b) if sym != '<<' else (0, 0)
+            a_rns, b_rns = min(a_costs[:2]), min(b_costs[:2])
+            if sym in ('+', '-'):
+                int_cost = 1 + a_costs[0] + b_costs[0]
+                rns_cost = 1 + a_rns + b_rns
+            elif sym in ('&', '|'):
+                int_cost = 1 + a_costs[0] + b_costs[0]
+                rns_cost = INF
+            elif sym == '<<':
+                shift = b[1]
+                int_cost = shift + a_costs[0] if shift < 8 else 1
+                rns_cost = 2 + a_rns if shift < 8 else INF # LDI 2**shift, MULM
+            elif b[0] == 'const':
+                int_cost = get_shift_add_len(b[1]) + a_costs[0]
+                rns_cost = 1 + a_rns + b_rns
+            else:
+                int_cost = INT_MUL_INSTS + a_costs[0] + b_costs[0]
+                rns_cost = 1 + a_rns + b_rns
+            if self.mode == "int":
+                rns_cost = INF
+            elif self.mode == "rns" and rns_cost < INF:
+                int_cost = INF
+        costs = (min(int_cost, rns_cost + 1), min(rns_cost, int_cost + 1), int_cost, rns_cost)
+        self.costs[key] = costs
+        return costs
+
+
+    def emit8(self, node: tuple, dom: str, dest: str = None) -> _Val:
+        """
+        Emit a u8 node so its value ends up in an x or m register (dest, if given).
+        """
+        _, _, int_cost, rns_cost = self.get_costs(node)
+        native = 'x' if int_cost + (dom != 'x') <= rns_cost + (dom != 'm') else 'm'
+        if native == dom:
+            return self.compute8(node, dom, dest)
+        val = self.compute8(node, native)
+        self.release(val)
+        out = dest or self.alloc(dom)
+        if dom == 'x':
+            self.emit(f"UNRLU {out}, {val.regs[0]}")
+        else:
+            self.emit(f"RLLM {out}, {val.regs[0]}, {val.regs[0]}")
+        return _Val(dom, [out], [] if dest else [out])
+
+
+    def emit_both(self, a: tuple, b: tuple, emit_fn) -> tuple:
+        """
+        Emit both operands of a node, an operation before a leaf, so fewer registers are live while it runs.
+        """
+        if a[0] != 'op' and b[0] == 'op':
+            val_b = emit_fn(b)
+            return emit_fn(a), val_b
+        val_a = emit_fn(a)
+        return val_a, emit_fn(b)
+
+
+    def get_operand(self, node: tuple) -> _Val:
+        """
+        Operand of an RNS op, from whichever file it is cheaper in.
+        """
+        costs = self.get_costs(node)
+        return self.emit8(node, 'x' if costs[0] <= costs[1] else 'm')
+
+
+    def compute8(self, node: tuple, dom: str, dest: str = None) -> _Val:
+        """
+        Emit a u8 node as ops of its own domain.
+        """
+        if node[0] == 'const':
+            reg = dest or self.alloc('x')
+            self.emit(f"LDI {reg}, 0x{node[1]:02X}")
+            return _Val('x', [reg], [] if dest else [reg])
+        if node[0] == 'var':
+            home = self.home[node[1]][1][0]
+            if dest is None or dest == home:
+                return _Val(dom, [home])
+            if dom == 'x':
+                self.emit(f"ORBIT {dest}, {home}, {home}")
+            else:
+                val = self.emit8(node, 'x')
+                self.release(val)
+                self.emit(f"RLLM {dest}, {val.regs[0]}, {val.regs[0]}")
+            return _Val(dom, [dest])
+
+        sym, a, b = node[1:4]
+        if dom == 'm':
+            if sym == '<<':
+                val_a = self.get_operand(a)
+                val_b = self.emit8(('const', 1 << b[1]), 'x')
+                sym = '*'
+            else:
+                val_a, val_b = self.emit_both(a, b, self.get_operand)
+            self.release(val_a)
+            self.release(val_b)
+            reg = dest or self.alloc('m')
+            self.emit(f"{RNS_OPS[sym]} {reg}, {val_a.regs[0]}, {val_b.regs[0]}")
+            return _Val('m', [reg], [] if dest else [reg])
+
+        if sym == '<<' and b[1] >= 8:
+            return self.compute8(('const', 0), 'x', dest)
+        if sym == '*' and b[0] != 'const':
+            return self.emit_int_mul(a, b, dest)
+        if sym in INT_OPS:
+            val_a, val_b = self.emit_both(a, b, lambda node: self.emit8(node, 'x'))
+            self.release(val_a)
+            self.release(val_b)
+            reg = dest or self.alloc('x')
+            self.emit(f"{INT_OPS[sym]} {reg}, {val_a.regs[0]}, {val_b.regs[0]}")
+            return _Val('x', [reg], [] if dest else [reg])
+
+        # SHL chain / shift-and-add (Horner over the constant's bits); the last instruction writes dest
+        val_a = self.emit8(a, 'x')
+        src = val_a.regs[0]
+        steps = ['shl'] * b[1] if sym == '<<' else [
+            step for bit in bin(b[1])[3:] for step in (('shl', 'add') if bit == '1' else ('shl',))
+        ]
+        tmp = self.alloc('x')
+        cur = src
+        for idx, step in enumerate(steps):
+            out = dest if dest and idx == len(steps) - 1 else tmp
+            if step == 'shl':
+                self.emit(f"SHL {out}, {cur}, {cur}")
+            else:
+                self.emit(f"ADD {out}, {cur}, {src}")
+            cur = out
+        self.release(val_a)
+        if dest:
+            self.free['x'].append(int(tmp[1:]))
+            return _Val('x', [dest])
+        return _Val('x', [tmp], [tmp])
+
+
+    def emit_int_mul(self, a: tuple, b: tuple, dest: str = None) -> _Val:
+        """
+        u8 * u8 in the integer domain, without branches: for each bit of b from the top, acc = acc * 2 + (a & mask),
+        where mask is 0xFF or 0x00 by the bit (NOT of the bit, minus 1).
+        """
+        val_a, val_b = self.emit_both(a, b, lambda node: self.emit8(node, 'x'))
+        src_a, src_b = val_a.regs[0], val_b.regs[0]
+        bit, one, b_sh, tmp, acc = (self.alloc('x') for _ in range(5))
+        self.emit(f"LDI {bit}, 0x80")
+        self.emit(f"LDI {one}, 0x01")
+        self.emit(f"ORBIT {b_sh}, {src_b}, {src_b}")
+        for idx in range(8):
+            if idx:
+                self.emit(f"SHL {acc}, {acc}, {acc}")
+            self.emit(f"ANDBIT {tmp}, {b_sh}, {bit}")
+            self.emit(f"NOT {tmp}, {tmp}, {tmp}")
+            self.emit(f"SUB {tmp}, {tmp}, {one}")
+            out = dest if dest and idx == 7 else acc
+            if idx:
+                self.emit(f"ANDBIT {tmp}, {tmp}, {src_a}")
+                self.emit(f"ADD {out}, {acc}, {tmp}")
+            else:
+                self.emit(f"ANDBIT {out}, {tmp}, {src_a}")
+            if idx < 7:
+                self.emit(f"SHL {b_sh}, {b_sh}, {b_sh}")
+        self.release(val_a)
+        self.release(val_b)
+        self.release(_Val('x', [], [bit, one, b_sh, tmp] + ([acc] if dest else [])))
+        return _Val('x', [dest], []) if dest else _Val('x', [acc], [acc])
+
+
+    def get_pair(self, vals: list, dest: list = None) -> _Val:
+        """
+        Registers for a u16 result: dest, or those of the first temporary operand (in place), or a new pair.
+        """
+        if dest:
+            return _Val('xx', list(dest))
+        for val in vals:
+            if len(val.temps) == 2:
+                regs = val.regs
+                val.temps = []
+                return _Val('xx', regs, regs)
+        regs = [self.alloc('x'), self.alloc('x')]
+        return _Val('xx', regs, regs)
+
+
+    def fill_hi(self, val: _Val):
+        """
+        Give a zero-extended u8 (high register None) a register holding its 0 high byte.
+        """
+        if val.regs[1] is None:
+            reg = self.alloc('x')
+            self.emit(f"LDI {reg}, 0x00")
+            val.regs = [val.regs[0], reg]
+            val.temps.append(reg)
+
+
+    def add16(self, sym: str, val_a: _Val, val_b: _Val, dest: list = None, const: int = None) -> _Val:
+        """
+        16-bit + / -. The carry out of the low byte is maj(a7, b7, !r7), the borrow maj(!a7, b7, r7), from bit 7
+        of the operands and of the low-byte result r, with logical AND / OR / NOT. If b is the constant const, b7 is
+        known and the majority is an AND (b7 = 0) or an OR (b7 = 1). A zero high byte (None) skips the high-byte op.
+        """
+        if sym == '+' and val_a.regs[1] is None and const is None:
+            val_a, val_b = val_b, val_a
+        self.fill_hi(val_a)
+        (a_lo, a_hi), (b_lo, b_hi) = val_a.regs, val_b.regs
+        mask, a_7 = self.alloc('x'), self.alloc('x')
+        b_7 = self.alloc('x') if const is None else None
+        self.emit(f"LDI {mask}, 0x80")
+        self.emit(f"ANDBIT {a_7}, {a_lo}, {mask}")
+        if b_7:
+            self.emit(f"ANDBIT {b_7}, {b_lo}, {mask}")
+        res = self.get_pair([val_a, val_b] if sym == '+' else [val_a], dest)
+        op = INT_OPS[sym]
+        self.emit(f"{op} {res.regs[0]}, {a_lo}, {b_lo}")
+        # a temporary operand's low byte is free from here on; it holds the carry
+        spare = [val for val in (val_a, val_b) if val.regs[0] in val.temps and val.regs[0] not in res.regs]
+        if spare:
+            carry = spare[0].regs[0]
+            spare[0].temps.remove(carry)
+        else:
+            carry = self.alloc('x')
+        flip = mask if sym == '+' else a_7
+        self.emit(f"ANDBIT {mask}, {res.regs[0]}, {mask}")
+        self.emit(f"NOT {flip}, {flip}, {flip}")
+        if b_7:
+            self.emit(f"OR {carry}, {a_7}, {b_7}")
+            self.emit(f"AND {carry}, {carry}, {mask}")
+            self.emit(f"AND {a_7}, {a_7}, {b_7}")
+            self.emit(f"OR {carry}, {carry}, {a_7}")
+        else:
+            self.emit(f"{'OR' if const & 0x80 else 'AND'} {carry}, {a_7}, {mask}")
+        if b_hi is None:
+            self.emit(f"{op} {res.regs[1]}, {a_hi}, {carry}")
+        else:
+            self.emit(f"{op} {res.regs[1]}, {a_hi}, {b_hi}")
+            self.emit(f"{op} {res.regs[1]}, {res.regs[1]}, {carry}")
+        self.release(_Val('xx', [], [mask, a_7, carry] + ([b_7] if b_7 else [])))
+        self.release(val_a)
+        self.release(val_b)
+        return res
+
+
+    def shl16(self, val_a: _Val, shift: int, dest: list = None) -> _Val:
+        """
+        16-bit << constant: per bit, hi = hi << 1 | (lo has bit 7 set), lo = lo << 1.
+        """
+        self.fill_hi(val_a)
+        res = self.get_pair([val_a], dest)
+        (a_lo, a_hi), (lo, hi) = val_a.regs, res.regs
+        if shift >= 8:
+            if shift >= 16:
+                self.emit(f"LDI {hi}, 0x00")
+            else:
+                cur = a_lo
+                for _ in range(shift - 8):
+                    self.emit(f"SHL {hi}, {cur}, {cur}")
+                    cur = hi
+                if cur != hi:
+                    self.emit(f"ORBIT {hi}, {cur}, {cur}")
+            self.emit(f"LDI {lo}, 0x00")
+        else:
+            mask, bit = self.alloc('x'), self.alloc('x')
+            self.emit(f"LDI {mask}, 0x80")
+            for _ in range(shift):
+                self.emit(f"ANDBIT {bit}, {a_lo}, {mask}")
+                self.emit(f"AND {bit}, {bit}, {bit}")
+                self.emit(f"SHL {hi}, {a_hi}, {a_hi}")
+                self.emit(f"ORBIT {hi}, {hi}, {bit}")
+                self.emit(f"SHL {lo}, {a_lo}, {a_lo}")
+                a_lo, a_hi = lo, hi
+            self.release(_Val('xx', [], [mask, bit]))
+        self.release(val_a)
+        return res
+
+
+    def emit16(self, node: tuple, dest: list = None, line: int = 0) -> _Val:
+        """
+        Emit a node as a u16 in an x register pair ([lo, hi], or dest).
+        """
+        if node[0] == 'const':
+            if not dest and node[1] <= 0xFF:
+                reg = self.alloc('x')
+                self.emit(f"LDI {reg}, 0x{node[1]:02X}")
+                return _Val('xx', [reg, None], [reg])
+            res = self.get_pair([], dest)
+            self.emit(f"LDI {res.regs[0]}, 0x{node[1] & 0xFF:02X}")
+            self.emit(f"LDI {res.regs[1]}, 0x{node[1] >> 8:02X}")
+            return res
+        if get_width(node) == 8:
+            lo = self.emit8(node, 'x', dest[0] if dest else None)
+            if not dest:
+                return _Val('xx', [lo.regs[0], None], lo.temps) # zero-extended, see fill_hi
+            self.emit(f"LDI {dest[1]}, 0x00")
+            return _Val('xx', list(dest))
+        if node[0] == 'var':
+            dom, regs = self.home[node[1]]
+            if dom == 'm':
+                res = self.get_pair([], dest)
+                self.emit(f"UNRLL {res.regs[0]}, {regs[0]}")
+                self.emit(f"UNRLU {res.regs[1]}, {regs[0]}")
+                return res
+            if not dest or list(dest) == list(regs):
+                return _Val('xx', list(regs))
+            self.emit(f"ORBIT {dest[0]}, {regs[0]}, {regs[0]}")
+            self.emit(f"ORBIT {dest[1]}, {regs[1]}, {regs[1]}")
+            return _Val('xx', list(dest))
+
+        sym, a, b = node[1:4]
+        if sym == '<<':
+            return self.shl16(self.emit16(a, line=line), b[1], dest)
+        if sym in ('&', '|'):
+            val_a, val_b = self.emit_both(a, b, lambda node: self.emit16(node, line=line))
+            self.fill_hi(val_a)
+            self.fill_hi(val_b)
+            res = self.get_pair([val_a, val_b], dest)
+            for half in range(2):
+                self.emit(f"{INT_OPS[sym]} {res.regs[half]}, {val_a.regs[half]}, {val_b.regs[half]}")
+            self.release(val_a)
+            self.release(val_b)
+            return res
+        if sym in ('+', '-'):
+            val_a, val_b = self.emit_both(a, b, lambda node: self.emit16(node, line=line))
+            return self.add16(sym, val_a, val_b, dest, b[1] if b[0] == 'const' else None)
+
+        if b[0] != 'const':
+            raise ValueError(f"Line {line + 1}: a 16-bit multiply needs a constant operand")
+        # shift-and-add over the constant's bits; a stays live until the last add
+        val_a = self.emit16(a, line=line)
+        held, val_a.temps = val_a.temps, []
+        steps = [step for bit in bin(b[1])[3:] for step in (('shl', 'add') if bit == '1' else ('shl',))]
+        # the first shift works on a copy: if a is a zero-extended u8, the high byte shl16 fills in is its own
+        # temporary, and a keeps no high register for the adds below
+        cur = _Val(val_a.kind, list(val_a.regs))
+        for idx, step in enumerate(steps):
+            out = dest if idx == len(steps) - 1 else None
+            if step == 'shl':
+                cur = self.shl16(cur, 1, out)
+            else:
+                cur = self.add16('+', cur, val_a, out)
+        val_a.temps = held
+        self.release(val_a)
+        return cur
+
+
+    def gen_assign(self, name: str, expr: tuple, line: int):
+        dom, regs = self.home[name]
+        width = get_width(expr)
+        if self.widths[name] == 8:
+            if width == 8:
+                self.emit8(expr, dom, regs[0])
+                return
+            val = self.emit16(expr, line=line)
+            self.release(val)
+            if dom == 'x':
+                self.emit(f"ORBIT {regs[0]}, {val.regs[0]}, {val.regs[0]}")
+            else:
+                self.emit(f"RLLM {regs[0]}, {val.regs[0]}, {val.regs[0]}")
+        elif dom == 'x':
+            self.emit16(expr, list(regs), line)
+        else:
+            val = self.emit16(expr, line=line)
+            self.fill_hi(val)
+            self.release(val)
+            self.emit(f"RLLM {regs[0]}, {val.regs[1]}, {val.regs[0]}")
+
+
+    def gen_store(self, addr: int, expr: tuple, line: int):
+        if get_width(expr) == 8:
+            val = self.emit8(expr, 'x')
+            bytes_out = [val.regs[0]]
+        else:
+            val = self.emit16(expr, line=line)
+            self.fill_hi(val)
+            bytes_out = val.regs
+        addr_hi, addr_lo = self.alloc('x'), self.alloc('x')
+        for idx, reg in enumerate(bytes_out):
+            cur = (addr + idx) & 0xFFFF
+            if not idx or cur >> 8 != addr >> 8:
+                self.emit(f"LDI {addr_hi}, 0x{cur >> 8:02X}")
+            self.emit(f"LDI {addr_lo}, 0x{cur & 0xFF:02X}")
+            self.emit(f"RSTORE {reg}, {addr_hi}, {addr_lo}")
+        self.release(_Val('xx', [], [addr_hi, addr_lo]))
+        self.release(val)
+
+
+    def gen_block(self, stmts: list, top: bool):
+        for stmt in stmts:
+            start = (self.cycles, self.num_insts, self.num_rns_ops, self.num_conversions)
+            kind, line = stmt[0], stmt[1]
+            self.lines.append(f"# line {line + 1}: {self.src_lines[line].split('#', 1)[0].strip()}")
+            self.costs = {}
+            if kind in ('decl', 'assign'):
+                self.gen_assign(stmt[2], stmt[3], line)
+            elif kind == 'store':
+                self.gen_store(stmt[2], stmt[3], line)
+            else:
+                count = stmt[2]
+                counter = self.alloc('x')
+                label = f"LOOP_{self.num_loops}"
+                self.num_loops += 1
+                self.emit(f"LDI {counter}, 0x{count:02X}")
+                self.lines.append(f"{label}:")
+                outer = self.weight
+                self.weight *= count
+                self.gen_block(stmt[3], False)
+                one = self.alloc('x')
+                self.emit(f"LDI {one}, 0x01")
+                self.emit(f"COMPARE {counter}, {one}")
+                self.emit(f"SUB {counter}, {counter}, {one}")
+                self.emit(f"JMPGT {label}")
+                self.cycles += JUMP_PENALTY * (count - 1) * outer # squashed slots behind the taken back-edges
+                self.weight = outer
+                self.release(_Val('xx', [], [counter, one]))
+            if top:
+                self.stmt_stats.append((
+                    line, self.cycles - start[0], self.num_insts - start[1],
+                    self.num_rns_ops - start[2], self.num_conversions - start[3]
+                ))
+
+
+    def __init__(self, stmts: list, src_lines: list, widths: dict, homes: dict, mode: str):
+        '''
+        Code generation for one choice of variable homes ({name: 'x' / 'm'}) and domain mode.
+        Raises _OutOfRegs if the homes leave too few registers for the temporaries.
+        '''
+        self.mode = mode
+        self.src_lines = src_lines
+        self.widths = widths
+        self.free = {'x': list(range(NUM_REGS)), 'm': list(range(NUM_REGS))}
+        self.home = {} # name -> ('x' / 'm', [registers])
+        for name, dom in homes.items():
+            num = 2 if dom == 'x' and widths[name] == 16 else 1
+            self.home[name] = (dom, [self.alloc(dom) for _ in range(num)])
+        self.costs = {}
+        self.lines = []
+        self.stmt_stats = [] # (line, cycles, instructions, RNS ops, conversions) per top-level statement
+        self.cycles = 0
+        self.weight = 1
+        self.num_insts = 0
+        self.num_rns_ops = 0
+        self.num_conversions = 0
+        self.num_loops = 0
+        self.gen_block(stmts, True)
+        self.cycles += PIPELINE_DRAIN
+
+
+
+def get_shift_add_len(value: int) -> int:
+    """
+    Instructions in the SHL / ADD sequence for x * value (value > 1).
+    """
+    bits = bin(value)[3:]
+    return len(bits) + bits.count('1')
+
+
+class ASMExpr:
+    def parse_expr(self, text: str, line: int) -> tuple:
+        try:
+            tree = ast.parse(text.strip(), mode='eval')
+        except SyntaxError:
+            raise ValueError(f"Line {line + 1}: can't parse '{text.strip()}'")
+        return self.build_node(tree.body, text, line)
+
+
+    def build_node(self, node, text: str, line: int) -> tuple:
+        if isinstance(node, ast.Constant) and type(node.value) is int:
+            if not 0 <= node.value <= 0xFFFF:
+                raise ValueError(f"Line {line + 1}: constant {node.value} doesn't fit 16 bits")
+            return ('const', node.value)
+        if isinstance(node, ast.Name):
+            if node.id not in self.widths:
+                raise ValueError(f"Line {line + 1}: '{node.id}' is not declared")
+            return ('var', node.id, self.widths[node.id])
+        if isinstance(node, ast.BinOp) and type(node.op) in BIN_OPS:
+            return make_op(
+                BIN_OPS[type(node.op)], self.build_node(node.left, text, line), self.build_node(node.right, text, line), line
+            )
+        raise ValueError(f"Line {line + 1}: can't compile '{text.strip()}' (+ - * << & | on variables and constants)")
+
+
+    def get_const(self, text: str, line: int, low: int, high: int) -> int:
+        node = self.parse_expr(text, line)
+        if node[0] != 'const' or not low <= node[1] <= high:
+            raise ValueError(f"Line {line + 1}: '{text.strip()}' must be a constant {low}..{high}")
+        return node[1]
+
+
+    def parse(self, lines: list) -> list:
+        """
+        Statements: ('decl' / 'assign', line, name, expr), ('store', line, addr, expr), ('repeat', line, count, body).
+        """
+        blocks = [[]]
+        for idx, line in enumerate(lines):
+            code = line.split('#', 1)[0].strip()
+            if not code:
+                continue
+            decl, assign = DECL_LINE.match(code), ASSIGN_LINE.match(code)
+            repeat, store = REPEAT_LINE.match(code), STORE_LINE.match(code)
+            if code == '}':
+                if len(blocks) == 1:
+                    raise ValueError(f"Line {idx + 1}: '}}' without repeat")
+                blocks.pop()
+            elif repeat:
+                stmt = ('repeat', idx, self.get_const(repeat.group(1), idx, 1, 0xFF), [])
+                blocks[-1].append(stmt)
+                blocks.append(stmt[3])
+            elif store:
+                addr = self.get_const(store.group(1), idx, 0, 0xFFFF)
+                blocks[-1].append(('store', idx, addr, self.parse_expr(store.group(2), idx)))
+            elif decl:
+                name = decl.group(2)
+                if name in self.widths or name in KEYWORDS:
+                    raise ValueError(f"Line {idx + 1}: '{name}' is already declared")
+                expr = self.parse_expr(decl.group(3), idx)
+                self.widths[name] = 8 if decl.group(1) == "u8" else 16
+                blocks[-1].append(('decl', idx, name, expr))
+            elif assign:
+                name, op = assign.group(1), assign.group(2)
+                if name not in self.widths:
+                    raise ValueError(f"Line {idx + 1}: '{name}' is not declared")
+                expr = self.parse_expr(assign.group(3), idx)
+                if op:
+                    expr = make_op(op, ('var', name, self.widths[name]), expr, idx)
+                blocks[-1].append(('assign', idx, name, expr))
+            else:
+                raise ValueError(f"Line {idx + 1}: can't parse '{code}'")
+        if len(blocks) > 1:
+            raise ValueError(f"repeat without '}}'")
+        return blocks[0]
+
+
+    def run_reference(self) -> dict:
+        """
+        Execute the source directly. Returns {address: byte} of the stores.
+        """
+        values = {}
+        mem = {}
+
+        def evaluate(node):
+            if node[0] == 'const':
+                return node[1]
+            if node[0] == 'var':
+                return values[node[1]]
+            return eval_op(node[1], evaluate(node[2]), evaluate(node[3]), node[4])
+
+        def run(stmts):
+            for stmt in stmts:
+                if stmt[0] in ('decl', 'assign'):
+                    values[stmt[2]] = evaluate(stmt[3]) & ((1 << self.widths[stmt[2]]) - 1)
+                elif stmt[0] == 'store':
+                    val = evaluate(stmt[3])
+                    for idx in range(get_width(stmt[3]) // 8):
+                        mem[(stmt[2] + idx) & 0xFFFF] = (val >> (8 * idx)) & 0xFF
+                else:
+                    for _ in range(stmt[2]):
+                        run(stmt[3])
+
+        run(self.stmts)
+        return mem
+
+
+    def try_homes(self, homes: dict, mode: str):
+        try:
+            return _ExprGen(self.stmts, self.src_lines, self.widths, homes, mode)
+        except _OutOfRegs:
+            return None
+
+
+    def find_homes(self, mode: str) -> _ExprGen:
+        """
+        Hill-climb over variable homes: flip one variable between the files while that lowers the predicted cycles.
+        """
+        names = list(self.widths)
+        best = None
+        for start in ('x', 'm'):
+            homes = {name: start for name in names}
+            gen = self.try_homes(homes, mode)
+            if gen is not None and (best is None or gen.cycles < best[1].cycles):
+                best = (homes, gen)
+        if best is None:
+            raise _OutOfRegs(f"--domain {mode}: the variables don't fit in the {NUM_REGS} + {NUM_REGS} registers with room for temporaries")
+        homes, gen = best
+        improved = True
+        while improved:
+            improved = False
+            for name in names:
+                cand = dict(homes, **{name: 'm' if homes[name] == 'x' else 'x'})
+                cand_gen = self.try_homes(cand, mode)
+                if cand_gen is not None and cand_gen.cycles < gen.cycles:
+                    homes, gen, improved = cand, cand_gen, True
+        self.homes[mode] = homes
+        return gen
+
+
+    def getLines(self) -> list:
+        return self.lines
+
+
+    def __init__(self, lines: Iterable[str], name: str = "<source>", domain: str = "auto"):
+        '''
+        Taking the lines of an expression source, compile it to RISC-RNS assembly. Each mode (all 8-bit arithmetic
+        as integer ops, as RNS ops where the ISA has one, or picked per node by the cost model) is compiled and its
+        predicted cycles kept in ASMExpr.predicted. domain 'auto' keeps the cheapest; 'int' / 'rns' force one.
+        The assembly can be obtained with ASMExpr.getLines().
+        '''
+        if domain not in MODES:
+            raise ValueError(f"Unknown domain '{domain}' (one of {', '.join(MODES)})")
+        self.src_lines = [line.rstrip('\n') for line in lines]
+        self.widths = {} # name -> 8 / 16, in declaration order
+        self.stmts = self.parse(self.src_lines)
+        self.homes = {} # mode -> {name: 'x' / 'm'}
+        self.gens = {} # mode -> _ExprGen, for the modes whose code fits the registers
+        errors = {}
+        for mode in MODES:
+            try:
+                self.gens[mode] = self.find_homes(mode)
+            except _OutOfRegs as e:
+                errors[mode] = e
+        self.predicted = {mode: gen.cycles for mode, gen in self.gens.items()}
+        if domain == "auto":
+            if not self.gens:
+                raise errors["auto"]
+            domain_used = min(self.gens, key=lambda mode: (self.predicted[mode], MODES.index(mode)))
+        elif domain in errors:
+            raise errors[domain]
+        self.mode = domain if domain != "auto" else domain_used
+        self.gen = self.gens[self.mode]
+
+        insts = [inst for inst in self.gen.lines if not inst.startswith('#') and not inst.endswith(':')]
+        self.lines = [
+            f"# Compiled by ASMExpr.py from {name} (--domain {domain}: {self.mode} chosen), "
+            f"predicted {self.gen.cycles} cycles",
+            "# homes: " + ", ".join(f"{var} -> {'/'.join(regs)}" for var, (_, regs) in self.gen.home.items()),
+        ]
+        if insts and insts[0].split()[0] != "LDI":
+            self.lines.append("NOP") # instruction 0 issues twice out of reset
+        self.lines.extend(self.gen.lines)
+
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        print("""\033[1;31mUsage: \033[22mpython ASMExpr.py <source> <output_asm_file>\033[0m\n
+        \033[1;32mAdditional optional arguments:\033[0m\n
+        \033[32m--domain <auto | int | rns>\033[0m\n
+        \tauto (default): pick the domain of each 8-bit operation with the cost model, and keep the cheapest program.
+        \tint: integer ops only (multiplies as shift-and-add). rns: RNS ops wherever the ISA has one.\n
+        \033[32m--v_out <Instr_Mem.v>\033[0m\n
+        \tAlso write the program as an Instr_Mem.v (BinToV case statement)\n
+        \033[32m--check\033[0m\n
+        \tRun the program on ISASim and compare the stored bytes with the source's semantics, and on PipelineSim
+        \tfor the measured cycle count
+        """)
+        sys.exit(1)
+
+    src_path, out_path = sys.argv[1], sys.argv[2]
+    domain = sys.argv[sys.argv.index("--domain") + 1] if "--domain" in sys.argv else "auto"
+    src_fname = src_path.replace('\\', '/').split('/')[-1]
+    try:
+        with open(src_path, 'r') as fileobj:
+            expr = ASMExpr(fileobj, src_fname, domain)
+    except OSError:
+        print(f"\033[1;31mError: Could not open source file {src_path}\033[0m")
+        sys.exit(1)
+    except ValueError as e:
+        print(f"\033[1;31mError: {e}\033[0m")
+        sys.exit(1)
+
+    print(f"\n\033[1;32mDomain | Predicted cycles | Instructions | RNS ops | Conversions\033[0m")
+    for mode in MODES:
+        if mode not in expr.gens:
+            print(f"{mode}\t | doesn't fit the registers")
+            continue
+        gen = expr.gens[mode]
+        mark = " <" if mode == expr.mode else ""
+        print(f"{mode}\t | {gen.cycles}\t\t    | {gen.num_insts}\t\t   | {gen.num_rns_ops}\t     | {gen.num_conversions}{mark}")
+
+    print(f"\n\033[1;32mLine | Cycles | RNS ops | Source ({expr.mode})\033[0m")
+    for line, cycles, _, rns_ops, _ in expr.gen.stmt_stats:
+        print(f"{line + 1}\t| {cycles}\t | {rns_ops}\t   | {expr.src_lines[line].split('#', 1)[0].strip()}")
+
+    with open(out_path, 'w') as asm_fout:
+        asm_fout.writelines(line + '\n' for line in expr.getLines())
+    print(f"\033[1;32mAssembly written to {out_path}\033[0m")
+
+    asm_to_bin = ASMtoBin(io.StringIO('\n'.join(expr.getLines())))
+    if "--v_out" in sys.argv:
+        v_path = sys.argv[sys.argv.index("--v_out") + 1]
+        bin_to_v = BinToV(src_fname, asm_to_bin.getProg(), asm_to_bin.label_addresses)
+        with open(v_path, 'w') as v_fout:
+            v_fout.writelines(line + '\n' for line in bin_to_v.getVerilogLines())
+        print(f"\033[1;32mVerilog module written to {v_path}\033[0m")
+
+    if "--check" in sys.argv:
+        from ISASim import ISASim, words_from_bin_prog, DATA_MEM_DEPTH
+        from PipelineSim import PipelineSim
+        words = words_from_bin_prog(asm_to_bin.getBinProg())
+        ref_mem = expr.run_reference()
+        expected = bytearray(DATA_MEM_DEPTH)
+        for addr, val in ref_mem.items():
+            expected[addr] = val
+        failed = False
+        for sim in (ISASim(words), PipelineSim(words)):
+            sim_name = type(sim).__name__
+            sim.run()
+            bad = [addr for addr in range(DATA_MEM_DEPTH) if sim.data_mem[addr] != expected[addr]]
+            for addr in bad[:10]:
+                print(f"\033[1;31m{sim_name}: data_mem[0x{addr:04X}] = 0x{sim.data_mem[addr]:02X}, expected 0x{expected[addr]:02X}\033[0m")
+            failed = failed or bool(bad)
+            if not bad:
+                print(f"\033[1;32m{sim_name}: data memory matches the source ({len(ref_mem)} bytes stored)\033[0m")
+        print(f"\033[1;32mPipelineSim: {sim.cycles} cycles, predicted {expr.gen.cycles}\033[0m")
+        sys.exit(1 if failed else 0)
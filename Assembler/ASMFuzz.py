@@ -0,0 +1,494 @@
+"""
+Differential fuzzer: random RISC-RNS programs run on ISASim (or BlockSim) and on PipelineSim, and their architectural
+state is compared.
+
+ISASim executes the ISA as the RTL implements it, one instruction at a time. PipelineSim clocks the pipeline
+registers, hazards included. A program that follows the documented pipeline rules must end in the same state on both,
+so any difference is an undocumented hazard, or a bug in one of the models (or in ASMSched, with --schedule).
+
+Programs are built from the opcode tables in ASMtoV.py and assembled with ASMtoBin. A program is kept as a tree of
+units (straight-line instructions, forward if-blocks, bounded loops, CALLs of leaf subroutines), and render() lays it
+out following the rules the README / PipelineSim document:
+    - Instruction 0 is a NOP (it issues twice out of reset), and every label is followed by a NOP, so no jump is
+      ever the first instruction at a jump target or return address.
+    - Every J-type instruction is followed by JUMP_SHADOW NOPs. That also keeps CALL / JR out of jump shadows.
+    - RLOAD's address registers are not written in the JUMP_SHADOW slots in front of it (RLOAD takes no bypass).
+      A label or a jump counts as a write of every register, since the slots in front of it depend on the path.
+    - Loops count down in x7 with SHL. No other instruction writes x7, so every loop ends.
+    - Subroutines are leaves, so the call stack never goes deeper than one entry.
+Conditional jumps get a COMPARE (JMPGT / JMPLT / JMPEQ) or a carry op (JMPC) in the slots whose flags they read.
+
+A failing program is shrunk over the same tree: units are deleted (halving chunks first), bodies are flattened, and
+instructions are replaced by NOPs, for as long as the two models still disagree. The reproducer is written as .asm.
+Programs are generated and checked across a process pool; the run reports programs per second until --count / --time
+is reached or Ctrl-C.
+"""
+import sys
+import os
+import io
+import random
+from time import perf_counter
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+from ASMtoV import ASMtoBin, R_type_opcodes, I_type_opcodes
+from ISASim import ISASim, words_from_bin_prog, UART_DATA_PORT, UART_RX_PRESENT_PORT
+from PipelineSim import PipelineSim, JUMP_SHADOW
+
+COUNTER_REG = 7 # loop counter, written only by the loop units
+NUM_GEN_REGS = 7 # x0 .. x6 / m0 .. m7 for everything else
+FLAG_JUMPS = ("JMPGT", "JMPLT", "JMPEQ")
+CARRY_OPS = ("ADD", "SUB", "SHL")
+# ops the generator draws from; NOTBIT and the rest of R_type_opcodes get the same weight
+OP_WEIGHTS = {
+    "ADD": 3, "SUB": 3, "SHL": 2, "AND": 1, "OR": 1, "NOT": 1, "ANDBIT": 2, "ORBIT": 2, "NOTBIT": 1, "COMPARE": 2,
+    "RLOAD": 2, "RSTORE": 3, "ADDM": 3, "SUBM": 3, "MULM": 3, "RLLM": 2, "UNRLL": 2, "UNRLU": 2,
+    "LDI": 6, "OUTPUT": 2, "INPUT": 1,
+}
+OUTPUT_PORTS = (UART_DATA_PORT, 0x10, 0x20)
+INPUT_PORTS = (UART_DATA_PORT, UART_RX_PRESENT_PORT)
+MAX_STEPS = 200_000
+MAX_CYCLES = 1_000_000
+DEFAULT_MAX_FAILS = 20
+
+assert set(OP_WEIGHTS) <= set(R_type_opcodes) | set(I_type_opcodes)
+
+
+class FuzzProg:
+    """
+    A generated program: main units, leaf subroutines (lists of units) and the UART RX bytes it is given.
+    Units:
+        ('op', text)
+        ('if', [setup texts], jump op, [body units])    jump over the body
+        ('loop', trips, [body units])
+        ('call', subroutine index)
+    """
+    def get_reg(self, rng: random.Random, kind: str = 'x') -> str:
+        return f"{kind}{rng.randrange(NUM_GEN_REGS)}"
+
+
+    def get_src(self, rng: random.Random) -> str:
+        return self.get_reg(rng, rng.choice('xm'))
+
+
+    def get_op(self, rng: random.Random) -> str:
+        op = rng.choices(list(OP_WEIGHTS), weights=list(OP_WEIGHTS.values()))[0]
+        if op == "LDI":
+            return f"LDI {self.get_reg(rng)}, 0x{rng.randrange(256):02X}"
+        if op == "OUTPUT":
+            return f"OUTPUT {self.get_reg(rng)}, 0x{rng.choice(OUTPUT_PORTS):02X}"
+        if op == "INPUT":
+            return f"INPUT {self.get_reg(rng)}, 0x{rng.choice(INPUT_PORTS):02X}"
+        if op == "COMPARE":
+            return f"COMPARE {self.get_src(rng)}, {self.get_src(rng)}"
+        if op in ("UNRLL", "UNRLU"):
+            return f"{op} {self.get_reg(rng)}, {self.get_reg(rng, 'm')}"
+        if op in ("ADDM", "SUBM", "MULM"):
+            return f"{op} {self.get_reg(rng, 'm')}, {self.get_src(rng)}, {self.get_src(rng)}"
+        if op == "RLLM":
+            return f"RLLM {self.get_reg(rng, 'm')}, {self.get_reg(rng)}, {self.get_reg(rng)}"
+        if op in ("NOT", "SHL", "NOTBIT"):
+            src = self.get_src(rng)
+            return f"{op} {self.get_reg(rng)}, {src}, {src}"
+        return f"{op} {self.get_reg(rng)}, {self.get_src(rng)}, {self.get_src(rng)}"
+
+
+    def get_units(self, rng: random.Random, size: int, depth: int, in_loop: bool, allow_calls: bool) -> list:
+        units = []
+        while len(units) < size:
+            roll = rng.random()
+            if roll < 0.12 and depth < 2:
+                jop = rng.choice(FLAG_JUMPS + ("JMPC", "JMP"))
+                if jop in FLAG_JUMPS:
+                    setup = [f"COMPARE {self.get_src(rng)}, {self.get_src(rng)}"]
+                    if rng.random() < 0.3:
+                        # the jump also reads the flags from 2 slots back
+                        filler = self.get_op(rng)
+                        setup.append("NOP" if filler.startswith("COMPARE") else filler)
+                elif jop == "JMPC":
+                    src = self.get_reg(rng)
+                    op = rng.choice(CARRY_OPS)
+                    setup = [f"{op} {self.get_reg(rng)}, {src}, {self.get_reg(rng) if op != 'SHL' else src}", "NOP"]
+                else:
+                    setup = []
+                units.append(('if', setup, jop, self.get_units(rng, rng.randint(1, 6), depth + 1, in_loop, allow_calls)))
+            elif roll < 0.18 and depth < 2 and not in_loop:
+                units.append(('loop', rng.randint(1, 5), self.get_units(rng, rng.randint(1, 8), depth + 1, True, allow_calls)))
+            elif roll < 0.24 and allow_calls and self.subs:
+                units.append(('call', rng.randrange(len(self.subs))))
+            else:
+                units.append(('op', self.get_op(rng)))
+        return units
+
+
+    def __init__(self, seed: int, size: int = 40):
+        '''
+        Generate the program for seed. size is roughly the number of units in main.
+        '''
+        rng = random.Random(seed)
+        self.seed = seed
+        self.subs = []
+        self.subs = [self.get_units(rng, rng.randint(1, 6), 1, False, False) for _ in range(rng.randint(0, 3))]
+        self.main = self.get_units(rng, size, 0, False, True)
+        self.uart_rx = bytes(rng.randrange(256) for _ in range(rng.randint(0, 8)))
+
+
+def render(prog: FuzzProg) -> list:
+    """
+    Lay a FuzzProg out as ASM lines, following the pipeline rules in the module docstring.
+    """
+    lines = []
+    recent = [] # registers written by each of the last JUMP_SHADOW slots (None: unknown)
+    num_labels = [0]
+
+    def emit(text: str, defs):
+        lines.append(text)
+        recent.append(defs)
+        del recent[:-JUMP_SHADOW]
+
+    def emit_label(label: str):
+        lines.append(f"{label}:")
+        recent.append(None)
+        del recent[:-JUMP_SHADOW]
+        emit("NOP", set())
+
+    def emit_jump(text: str):
+        emit(text, None)
+        for _ in range(JUMP_SHADOW):
+            emit("NOP", set())
+
+    def new_label(prefix: str) -> str:
+        num_labels[0] += 1
+        return f"{prefix}_{num_labels[0]}"
+
+    def emit_op(text: str):
+        parts = text.replace(',', ' ').split()
+        if parts[0] == "RLOAD":
+            addr_regs = {parts[2].lower(), parts[3].lower()}
+            while any(defs is None or defs & addr_regs for defs in recent):
+                emit("NOP", set())
+        if parts[0] in ("RSTORE", "OUTPUT", "COMPARE", "NOP"):
+            defs = set()
+        elif parts[0] in ("ADDM", "SUBM", "MULM", "RLLM"):
+            defs = {f"m{parts[1][1:]}"}
+        else:
+            defs = {f"x{parts[1][1:]}"}
+        emit(text, defs)
+
+    def emit_units(units: list):
+        for unit in units:
+            if unit[0] == 'op':
+                emit_op(unit[1])
+            elif unit[0] == 'if':
+                _, setup, jop, body = unit
+                label = new_label("SKIP")
+                for text in setup:
+                    emit_op(text)
+                emit_jump(f"{jop} {label}")
+                emit_units(body)
+                emit_label(label)
+            elif unit[0] == 'loop':
+                _, trips, body = unit
+                label = new_label("LOOP")
+                emit_op(f"LDI x{COUNTER_REG}, 0x{(1 << (8 - trips)) & 0xFF:02X}")
+                emit_label(label)
+                emit_units(body)
+                emit_op("LDI x0, 0x00")
+                emit_op(f"SHL x{COUNTER_REG}, x{COUNTER_REG}, x{COUNTER_REG}")
+                emit_op(f"COMPARE x{COUNTER_REG}, x0")
+                emit_jump(f"JMPGT {label}")
+            elif unit[0] == 'call':
+                emit_jump(f"CALL SUB_{unit[1]}")
+
+    emit("NOP", set())
+    if prog.subs:
+        emit_jump("JMP MAIN")
+        for idx, body in enumerate(prog.subs):
+            emit_label(f"SUB_{idx}")
+            emit_units(body)
+            emit_jump("JR RA")
+        emit_label("MAIN")
+    emit_units(prog.main)
+    for _ in range(JUMP_SHADOW):
+        emit("NOP", set())
+    return lines
+
+
+def run_models(lines: list, uart_rx: bytes, schedule: bool = False, blocks: bool = False) -> dict:
+    """
+    Assemble lines and run them on both models. Returns {'status': 'ok' | 'diff' | 'timeout', 'diffs': [...]}.
+    """
+    if schedule:
+        from ASMSched import ASMSched
+        lines = ASMSched(lines).getLines()
+    words = words_from_bin_prog(ASMtoBin(io.StringIO('\n'.join(lines))).getBinProg())
+    if blocks:
+        from BlockSim import BlockSim
+        isa = BlockSim(words, uart_rx=uart_rx, stop_on_rx_wait=False)
+    else:
+        isa = ISASim(words, uart_rx=uart_rx, stop_on_rx_wait=False)
+    pipe = PipelineSim(words, uart_rx=uart_rx, stop_on_rx_wait=False)
+    isa_reason = isa.run(MAX_STEPS)
+    pipe_reason = pipe.run(MAX_CYCLES)
+    if isa_reason == 'max_steps' or pipe_reason == 'max_cycles':
+        return {"status": "timeout", "diffs": [f"halt: {isa_reason} / {pipe_reason}"]}
+
+    diffs = []
+    if isa_reason != pipe_reason:
+        diffs.append(f"halt: {isa_reason} / {pipe_reason}")
+    for name, isa_regs, pipe_regs in (("x", isa.regs, pipe.regs), ("m", isa.rns_regs, pipe.rns_regs)):
+        diffs.extend(f"{name}{idx}: {a} / {b}" for idx, (a, b) in enumerate(zip(isa_regs, pipe_regs)) if a != b)
+    if isa.data_mem != pipe.data_mem:
+        addrs = [addr for addr in range(len(isa.data_mem)) if isa.data_mem[addr] != pipe.data_mem[addr]]
+        diffs.extend(f"data_mem[{addr}]: {isa.data_mem[addr]} / {pipe.data_mem[addr]}" for addr in addrs[:4])
+        if len(addrs) > 4:
+            diffs.append(f"... {len(addrs) - 4} more data_mem bytes")
+    if isa.uart_tx != pipe.uart_tx:
+        diffs.append(f"uart_tx: {bytes(isa.uart_tx).hex()} / {bytes(pipe.uart_tx).hex()}")
+    if isa.io_writes != pipe.io_writes:
+        diffs.append(f"io_writes: {isa.io_writes} / {pipe.io_writes}")
+    if len(isa.uart_rx) != len(pipe.uart_rx):
+        diffs.append(f"uart_rx left: {len(isa.uart_rx)} / {len(pipe.uart_rx)}")
+    if isa.stack_overflows != pipe.stack_overflows or isa.stack != pipe.stack:
+        diffs.append(f"call stack: {isa.stack} ({isa.stack_overflows} dropped) / {pipe.stack} ({pipe.stack_overflows} dropped)")
+    return {"status": "diff" if diffs else "ok", "diffs": diffs}
+
+
+def check_seed(seed: int, opts: dict) -> tuple:
+    """
+    Worker: generate, render and run the program for seed. Returns (seed, status, diffs).
+    """
+    prog = FuzzProg(seed, opts["size"])
+    try:
+        result = run_models(render(prog), prog.uart_rx, opts["schedule"], opts["blocks"])
+    except Exception as e:
+        return seed, "error", [f"{type(e).__name__}: {e}"]
+    return seed, result["status"], result["diffs"]
+
+
+def get_variants(units: list):
+    """
+    Smaller versions of a unit list, biggest cuts first: deleted chunks, then each unit flattened or simplified.
+    """
+    chunk = len(units) // 2
+    while chunk >= 1:
+        for start in range(0, len(units), chunk):
+            yield units[:start] + units[start + chunk:]
+        chunk //= 2
+    for idx, unit in enumerate(units):
+        if unit[0] in ('if', 'loop'):
+            body = unit[-1]
+            yield units[:idx] + body + units[idx + 1:]
+            for new_body in get_variants(body):
+                yield units[:idx] + [unit[:-1] + (new_body,)] + units[idx + 1:]
+            if unit[0] == 'loop' and unit[1] > 1:
+                yield units[:idx] + [('loop', 1, body)] + units[idx + 1:]
+        elif unit[0] == 'op' and unit[1] != "NOP":
+            yield units[:idx] + [('op', "NOP")] + units[idx + 1:]
+
+
+def shrink(prog: FuzzProg, opts: dict) -> tuple:
+    """
+    Greedily shrink a failing program while the models still disagree. Returns (ASM lines, diffs).
+    """
+    def fails() -> list:
+        try:
+            result = run_models(render(prog), prog.uart_rx, opts["schedule"], opts["blocks"])
+        except Exception as e:
+            return [f"{type(e).__name__}: {e}"]
+        return result["diffs"] if result["status"] == "diff" else None
+
+    diffs = fails()
+    changed = True
+    while changed:
+        changed = False
+        for where in ["main"] + list(range(len(prog.subs))):
+            units = prog.main if where == "main" else prog.subs[where]
+            for variant in get_variants(units):
+                if where == "main":
+                    prog.main = variant
+                else:
+                    prog.subs[where] = variant
+                new_diffs = fails()
+                if new_diffs:
+                    diffs, units, changed = new_diffs, variant, True
+                    break
+            if where == "main":
+                prog.main = units
+            else:
+                prog.subs[where] = units
+        if prog.uart_rx:
+            rx = prog.uart_rx
+            prog.uart_rx = rx[:len(rx) // 2]
+            new_diffs = fails()
+            if new_diffs:
+                diffs, changed = new_diffs, True
+            else:
+                prog.uart_rx = rx
+    return render(prog), diffs
+
+
+def shrink_seed(seed: int, opts: dict) -> tuple:
+    """
+    Worker: shrink the program for seed. Returns (seed, ASM lines, diffs).
+    """
+    lines, diffs = shrink(FuzzProg(seed, opts["size"]), opts)
+    return seed, lines, diffs
+
+
+class ASMFuzz:
+    def save_repro(self, seed: int, lines: list, diffs: list, uart_rx: bytes) -> str:
+        os.makedirs(self.out_dir, exist_ok=True)
+        path = os.path.join(self.out_dir, f"fuzz_{seed}.asm")
+        with open(path, 'w') as fileobj:
+            fileobj.write(f"#ASMFuzz.py seed {seed}: ISASim{'/BlockSim' if self.opts['blocks'] else ''} vs PipelineSim"
+                          f"{' (after ASMSched)' if self.opts['schedule'] else ''}, ISASim value / PipelineSim value\n")
+            fileobj.writelines(f"#   {diff}\n" for diff in diffs)
+            if uart_rx:
+                fileobj.write(f"#UART RX bytes: {uart_rx.hex()}\n")
+            fileobj.writelines(line + '\n' for line in lines)
+        return path
+
+
+    def print_status(self):
+        elapsed = perf_counter() - self.start
+        print(
+            f"\033[32m{self.num_run} programs in {elapsed:.0f}s ({self.num_run / max(elapsed, 1e-9):.1f}/s) | "
+            f"{self.num_fails} failing, {self.num_timeouts} timed out, {self.num_errors} errors\033[0m", flush=True
+        )
+
+
+    def run(self, count: int = None, seconds: float = None, status_interval: float = 10.0):
+        """
+        Check seeds base_seed, base_seed + 1, ... until count programs have run, seconds have passed, or Ctrl-C.
+        Failures are shrunk in the same pool and written to out_dir.
+        """
+        self.start = perf_counter()
+        next_status = self.start + status_interval
+        next_seed = self.base_seed
+        in_flight = {}
+        max_in_flight = 4 * (self.jobs or os.cpu_count() or 1)
+        with ProcessPoolExecutor(max_workers=self.jobs) as pool:
+            try:
+                while True:
+                    stop = (count is not None and next_seed - self.base_seed >= count) or \
+                           (seconds is not None and perf_counter() - self.start >= seconds)
+                    while not stop and len(in_flight) < max_in_flight and (count is None or next_seed - self.base_seed < count):
+                        in_flight[pool.submit(check_seed, next_seed, self.opts)] = "check"
+                        next_seed += 1
+                    if not in_flight:
+                        break
+                    done, _ = wait(in_flight, timeout=max(0.1, next_status - perf_counter()), return_when=FIRST_COMPLETED)
+                    for future in done:
+                        kind = in_flight.pop(future)
+                        if kind == "check":
+                            self.add_result(pool, in_flight, *future.result())
+                        else:
+                            seed, lines, diffs = future.result()
+                            path = self.save_repro(seed, lines, diffs, FuzzProg(seed, self.opts["size"]).uart_rx)
+                            self.repros.append(path)
+                            print(f"\033[1;31mSeed {seed}: {len(lines)} line reproducer written to {path}\033[0m")
+                            for diff in diffs:
+                                print(f"\033[31m    {diff}\033[0m")
+                    if perf_counter() >= next_status:
+                        self.print_status()
+                        next_status += status_interval
+            except KeyboardInterrupt:
+                print("\033[1;33mInterrupted, waiting for running programs\033[0m")
+                for future in in_flight:
+                    future.cancel()
+        self.print_status()
+
+
+    def add_result(self, pool: ProcessPoolExecutor, in_flight: dict, seed: int, status: str, diffs: list):
+        self.num_run += 1
+        if status == "timeout":
+            self.num_timeouts += 1
+        elif status == "error":
+            self.num_errors += 1
+            print(f"\033[1;31mSeed {seed}: {diffs[0]}\033[0m")
+        elif status == "diff":
+            self.num_fails += 1
+            if self.num_fails <= self.max_fails:
+                in_flight[pool.submit(shrink_seed, seed, self.opts)] = "shrink"
+
+
+    def __init__(self, out_dir: str, opts: dict, base_seed: int = 0, jobs: int = None, max_fails: int = DEFAULT_MAX_FAILS):
+        '''
+        Differential fuzzer. opts: size (units in main), schedule (run ASMSched on every program), blocks (BlockSim
+        as the functional model). Up to max_fails failing programs are shrunk and written to out_dir.
+        '''
+        self.out_dir = out_dir
+        self.opts = opts
+        self.base_seed = base_seed
+        self.jobs = jobs
+        self.max_fails = max_fails
+        self.num_run = 0
+        self.num_fails = 0
+        self.num_timeouts = 0
+        self.num_errors = 0
+        self.repros = []
+
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("""\033[1;31mUsage: \033[22mpython ASMFuzz.py <output_dir>\033[0m\n
+        \033[1;32mAdditional optional arguments:\033[0m\n
+        \033[32m--count <n>\033[0m\n
+        \tStop after n programs (default: run until --time or Ctrl-C)
+        \033[32m--time <seconds>\033[0m\n
+        \tStop after this long
+        \033[32m--seed <n>\033[0m\n
+        \tFirst seed (default: 0). Program k is generated from seed + k, so any failure can be regenerated.
+        \033[32m--size <n>\033[0m\n
+        \tUnits (instructions, if-blocks, loops, calls) in each program's main body (default: 40)
+        \033[32m--jobs <n>\033[0m\n
+        \tNumber of worker processes (default: one per core)
+        \033[32m--max_fails <n>\033[0m\n
+        \tShrink and write at most n failing programs (default: 20); later ones are only counted
+        \033[32m--schedule\033[0m\n
+        \tRun every program through ASMSched.py first, so its NOP placement is fuzzed too
+        \033[32m--blocks\033[0m\n
+        \tUse BlockSim.py instead of ISASim as the functional model
+        \033[32m--status <seconds>\033[0m\n
+        \tSeconds between progress lines (default: 10)
+        \033[32m--print <seed>\033[0m\n
+        \tPrint the program for one seed and its result instead of fuzzing
+        """)
+        sys.exit(1)
+
+    opts = {"size": 40, "schedule": "--schedule" in sys.argv, "blocks": "--blocks" in sys.argv}
+    count = None
+    seconds = None
+    base_seed = 0
+    jobs = None
+    max_fails = DEFAULT_MAX_FAILS
+    status_interval = 10.0
+    if "--count" in sys.argv:
+        count = int(sys.argv[sys.argv.index("--count") + 1])
+    if "--time" in sys.argv:
+        seconds = float(sys.argv[sys.argv.index("--time") + 1])
+    if "--seed" in sys.argv:
+        base_seed = int(sys.argv[sys.argv.index("--seed") + 1])
+    if "--size" in sys.argv:
+        opts["size"] = int(sys.argv[sys.argv.index("--size") + 1])
+    if "--jobs" in sys.argv:
+        jobs = int(sys.argv[sys.argv.index("--jobs") + 1])
+    if "--max_fails" in sys.argv:
+        max_fails = int(sys.argv[sys.argv.index("--max_fails") + 1])
+    if "--status" in sys.argv:
+        status_interval = float(sys.argv[sys.argv.index("--status") + 1])
+
+    if "--print" in sys.argv:
+        seed = int(sys.argv[sys.argv.index("--print") + 1])
+        prog = FuzzProg(seed, opts["size"])
+        print('\n'.join(render(prog)))
+        result = run_models(render(prog), prog.uart_rx, opts["schedule"], opts["blocks"])
+        print(f"\033[1;32m{result['status']}\033[0m")
+        for diff in result["diffs"]:
+            print(f"\033[31m    {diff}\033[0m")
+        sys.exit(0)
+
+    fuzz = ASMFuzz(sys.argv[1], opts, base_seed, jobs, max_fails)
+    fuzz.run(count, seconds, status_interval)
+    sys.exit(1 if fuzz.num_fails or fuzz.num_errors else 0)
@@ -0,0 +1,250 @@
+"""
+Subroutine inlining and call-depth checking for RISC-RNS assembly (ASMtoV.py --inline).
+
+ctrl_CallRetStack holds 8 entries, but it only pushes while sp < 3'b111, so 7 CALLs can be outstanding. The
+8th is dropped silently, and its JR RA then returns to the wrong place. ASMCallGraph builds the static call graph
+(functions are CALL targets, a function's body is what it reaches before its JR RA) and finds the deepest
+chain of CALLs from address 0. check_call_depth() refuses a program whose chain can exceed MAX_CALL_DEPTH, or
+one that recurses.
+
+ASMInline replaces the CALL of a small leaf subroutine with the subroutine's body. A leaf subroutine here is
+straight-line code from its label to a JR RA, with no labels or jumps in between, and at most
+INLINE_MAX_INSTS instructions besides NOPs. A call site is left alone where inlining would change what the
+pipeline does:
+    - The CALL is the first instruction at a label / return address (the pipeline ignores it there), or is
+      within 3 slots of an earlier jump, except in the 2nd slot behind a conditional jump. That is the one
+      shadow slot where a squashed CALL doesn't push, so it behaves like squashed inline code.
+    - The instruction at the return address is a jump (ignored after a JR, but it would run inline).
+The body's leading NOPs (jump-target padding) are dropped. NOPs are added around it only where a hazard
+window would cross the new seams (see ASMLayout.get_join_pad). A subroutine that is no longer called or jumped to,
+and isn't reached by falling through, is removed.
+"""
+from typing import Iterable
+
+from ASMtoV import J_type_opcodes
+from ASMSched import SchedInst, read_asm_lines, JUMP_SHADOW, COND_JUMPS
+from ASMLayout import get_join_pad
+from ISASim import CALL_STACK_DEPTH
+
+MAX_CALL_DEPTH = CALL_STACK_DEPTH - 1 # ctrl_CallRetStack pushes while sp < 3'b111
+INLINE_MAX_INSTS = 8
+
+
+class ASMCallGraph:
+    def get_succs(self, idx: int) -> list:
+        inst = self.insts[idx]
+        fall = [idx + 1] if idx + 1 < len(self.insts) else []
+        if inst.op == "JR":
+            return fall if idx in self.block_starts else []
+        if inst.op not in J_type_opcodes or inst.op == "CALL":
+            return fall
+        targ = self.label_idx.get(inst.parts[1].upper())
+        targ = [targ] if targ is not None and targ < len(self.insts) else []
+        if inst.op == "JMP" and idx not in self.block_starts:
+            return targ
+        return targ + fall
+
+
+    def get_callees(self, entry: int) -> list:
+        """
+        Labels CALLed from the code reachable from entry before a JR RA.
+        """
+        seen, work, callees = set(), [entry], []
+        while work:
+            idx = work.pop()
+            if idx in seen:
+                continue
+            seen.add(idx)
+            inst = self.insts[idx]
+            if inst.op == "CALL" and inst.parts[1].upper() not in callees:
+                callees.append(inst.parts[1].upper())
+            work.extend(self.get_succs(idx))
+        return callees
+
+
+    def get_depth(self, label: str, active: tuple) -> tuple:
+        """
+        (depth, deepest chain) of the CALLs made from label's code, label included unless it is the entry.
+        """
+        if label in active:
+            raise ValueError(f"Recursive call chain {' -> '.join(active + (label,))}: the call stack depth is unbounded")
+        if label in self.depths:
+            return self.depths[label]
+        entry = 0 if label is None else self.label_idx.get(label)
+        if entry is None:
+            raise ValueError(f"CALL to undefined label '{label}'")
+        best = (0, ())
+        for callee in self.get_callees(entry):
+            depth, chain = self.get_depth(callee, active + ((label,) if label else ()))
+            if depth + 1 > best[0]:
+                best = (depth + 1, (callee,) + chain)
+        self.depths[label] = best
+        return best
+
+
+    def __init__(self, lines: Iterable[str]):
+        '''
+        Taking the lines of an ASM source, build its call graph. ASMCallGraph.max_depth is the most CALLs
+        that can be outstanding at once, and ASMCallGraph.deepest the labels of that chain.
+        '''
+        self.insts = []
+        self.label_idx = {}
+        self.block_starts = set()
+        prev = None
+        for kind, text in read_asm_lines(lines):
+            if kind == 'label':
+                self.label_idx.setdefault(text, len(self.insts))
+                self.block_starts.add(len(self.insts))
+            else:
+                if prev is not None and prev.op == "CALL":
+                    self.block_starts.add(len(self.insts))
+                prev = SchedInst(text)
+                self.insts.append(prev)
+        self.depths = {}
+        self.max_depth, self.deepest = self.get_depth(None, ()) if self.insts else (0, ())
+
+
+def check_call_depth(lines: Iterable[str]) -> int:
+    """
+    Raise ValueError if the program can have more than MAX_CALL_DEPTH CALLs outstanding. Returns the max depth.
+    """
+    graph = ASMCallGraph(lines)
+    if graph.max_depth > MAX_CALL_DEPTH:
+        raise ValueError(
+            f"Call depth {graph.max_depth} ({' -> '.join(graph.deepest)}) exceeds the {MAX_CALL_DEPTH} CALLs "
+            f"ctrl_CallRetStack can hold"
+        )
+    return graph.max_depth
+
+
+class ASMInline:
+    def index_labels(self):
+        self.label_pos = {}
+        for pos, (kind, item) in enumerate(self.items):
+            if kind == 'label':
+                self.label_pos.setdefault(item, pos)
+
+
+    def find_leaves(self):
+        """
+        self.leaves = {label: [body SchedInsts without leading NOPs]} for every inlinable subroutine.
+        """
+        called = {inst.parts[1].upper() for kind, inst in self.items if kind == 'inst' and inst.op == "CALL"}
+        self.leaves = {}
+        for label in called:
+            pos = self.label_pos.get(label)
+            if pos is None:
+                continue
+            nxt = pos + 1
+            while nxt < len(self.items) and self.items[nxt][0] == 'label':
+                nxt += 1
+            body = []
+            while nxt < len(self.items) and self.items[nxt][0] == 'inst' and self.items[nxt][1].op not in J_type_opcodes:
+                body.append(self.items[nxt][1])
+                nxt += 1
+            if nxt >= len(self.items) or self.items[nxt][0] != 'inst' or self.items[nxt][1].op != "JR":
+                continue
+            while body and body[0].op == "NOP":
+                body.pop(0)
+            if not body or sum(1 for inst in body if inst.op != "NOP") > self.max_insts:
+                continue
+            self.leaves[label] = body
+
+
+    def get_stream(self, pos: int, step: int, count: int) -> list:
+        """
+        Up to count instructions from item pos, going forward (step 1) or backward (step -1), skipping labels.
+        """
+        insts = []
+        while 0 <= pos < len(self.items) and len(insts) < count:
+            if self.items[pos][0] == 'inst':
+                insts.append(self.items[pos][1])
+            pos += step
+        return insts if step > 0 else insts[::-1]
+
+
+    def can_inline(self, pos: int) -> bool:
+        prev_pos = pos - 1
+        if prev_pos < 0 or self.items[prev_pos][0] == 'label' or self.items[prev_pos][1].op == "CALL":
+            return False
+        prev = self.get_stream(pos - 1, -1, JUMP_SHADOW)
+        jump_dists = [len(prev) - idx for idx, inst in enumerate(prev) if inst.op in J_type_opcodes]
+        # in the 2nd shadow slot of a conditional jump a squashed CALL is gated, the same as squashed inline code
+        if jump_dists and (jump_dists != [2] or prev[-2].op not in COND_JUMPS):
+            return False
+        ret_head = self.get_stream(pos + 1, 1, 1)
+        return not (ret_head and ret_head[0].op in J_type_opcodes)
+
+
+    def inline_calls(self):
+        out = []
+        for pos, (kind, item) in enumerate(self.items):
+            if kind == 'inst' and item.op == "CALL" and item.parts[1].upper() in self.leaves and self.can_inline(pos):
+                body = self.leaves[item.parts[1].upper()]
+                tail = self.get_stream(pos - 1, -1, JUMP_SHADOW)
+                ret_head = self.get_stream(pos + 1, 1, JUMP_SHADOW)
+                pad_in = get_join_pad(tail, body + ret_head)
+                new_insts = [SchedInst("NOP") for _ in range(pad_in)] + [SchedInst(inst.text) for inst in body]
+                pad_out = get_join_pad(tail + new_insts, ret_head)
+                new_insts += [SchedInst("NOP") for _ in range(pad_out)]
+                out.extend(('inst', inst) for inst in new_insts)
+                self.inlined[item.parts[1].upper()] = self.inlined.get(item.parts[1].upper(), 0) + 1
+            else:
+                out.append((kind, item))
+        self.items = out
+        self.index_labels()
+
+
+    def remove_dead_leaves(self):
+        """
+        Drop inlined subroutines nothing jumps to / calls / falls into any more: label(s), body, JR RA and its padding.
+        """
+        referenced = {inst.parts[1].upper() for kind, inst in self.items if kind == 'inst' and inst.op in J_type_opcodes and len(inst.parts) > 1}
+        for label in self.inlined:
+            pos = self.label_pos[label]
+            start = pos
+            while start > 0 and self.items[start - 1][0] == 'label':
+                start -= 1
+            end = pos
+            while end < len(self.items) and self.items[end][0] == 'label':
+                end += 1
+            labels = [item for _, item in self.items[start:end]]
+            if any(lbl in referenced for lbl in labels):
+                continue
+            prev = self.get_stream(start - 1, -1, JUMP_SHADOW + 1)
+            last_jump = max((idx for idx, inst in enumerate(prev) if inst.op in J_type_opcodes), default=None)
+            if last_jump is None or prev[last_jump].op not in ("JMP", "JR") or any(inst.op != "NOP" for inst in prev[last_jump + 1:]):
+                continue # reached by falling through
+            while end < len(self.items) and not (self.items[end][0] == 'inst' and self.items[end][1].op == "JR"):
+                end += 1
+            end += 1
+            while end < len(self.items) and self.items[end][0] == 'inst' and self.items[end][1].op == "NOP":
+                end += 1
+            del self.items[start:end]
+            self.index_labels()
+            self.removed.append(label)
+
+
+    def getLines(self) -> list:
+        return [f"{item}:" if kind == 'label' else item.text for kind, item in self.items]
+
+
+    def __init__(self, lines: Iterable[str], max_insts: int = INLINE_MAX_INSTS):
+        '''
+        Taking the lines of an ASM source, inline every call of a leaf subroutine with at most max_insts
+        non-NOP instructions. The new source can be obtained with ASMInline.getLines().
+        '''
+        self.max_insts = max_insts
+        self.items = [(kind, SchedInst(text) if kind == 'inst' else text) for kind, text in read_asm_lines(lines)]
+        self.index_labels()
+        self.inlined = {} # label -> call sites inlined
+        self.removed = []
+
+        # inlining a subroutine's calls can make the subroutine itself a leaf, so repeat until nothing changes
+        while True:
+            num_inlined = sum(self.inlined.values())
+            self.find_leaves()
+            self.inline_calls()
+            if sum(self.inlined.values()) == num_inlined:
+                break
+        self.remove_dead_leaves()
@@ -0,0 +1,353 @@
+"""
+Basic-block layout for RISC-RNS assembly (ASMtoV.py --layout).
+
+A taken jump costs the 3 slots it squashes, plus the jump itself, so ASMLayout reorders the source's blocks so
+that the likely path falls through. Blocks are split the same way ASMSched splits them (at labels and after
+J-types). The NOP padding behind a JMP / JR stays with its block. Two steps:
+    - Branch inversion: take a conditional jump 'COMPARE a, b / Jc X' whose fall-through block is just
+      [NOPs] [S] 'JMP T', where the T side is the likely one. It becomes 'J!c T' followed by 'JMP X'.
+      The ISA has no inverted conditions, so J!c is two jumps on the same COMPARE (JMPEQ -> JMPGT + JMPLT, ...).
+      This works because ctrl_BranchPred still sees the COMPARE from 2 slots back. If S is not empty, it moves
+      into a new block right in front of T, and T's old fall-through predecessor gets a 'JMP T'.
+      Because of the inversion, the not-taken padding and the unconditional JMP T drop off the likely path.
+      This is what removes the JMP ADD_LOOP / JMP MUL_LOOP / JMP UART_OUT back-edges of Full_Test.asm.
+    - Chain layout: blocks joined by a fall-through can't be separated, so they form chains. A chain ending in
+      'JMP T' can be followed directly by the chain that starts at T, and the JMP is then dropped.
+      Links are picked greedily by weight (Pettis-Hansen). The entry chain stays first. A chain that runs off
+      the end of the program stays last.
+The likely side is taken from a PipelineSim --report_out JSON if one is given: taken = flush_cycles / 3,
+not taken = retired - taken, per jump address. Without one, the static heuristic is that backward jumps are taken.
+Wherever two pieces of code become adjacent that used to have a taken jump between them, NOPs are inserted as
+needed so that no flag, carry, RLOAD or CALL / JR hazard window reaches across the seam. A jump as the first
+instruction of a block is ignored by the pipeline when the block is reached through a jump / return. So such
+a block is treated as falling through, and it is never made a fall-through target.
+Labels move with their blocks, so ASMtoBin resolves every jump target of the new order.
+"""
+import json
+from typing import Iterable
+
+from ASMtoV import J_type_opcodes
+from ASMSched import SchedInst, read_asm_lines, JUMP_SHADOW, CARRY_OPS, STACK_OPS
+
+PROG_MEM_DEPTH = 2 ** 10 # 10-bit J-type address field
+STATIC_BACKWARD_WEIGHT = 10
+FLAG_JUMPS = ("JMPGT", "JMPLT", "JMPEQ")
+INVERTED_JUMPS = {
+    "JMPEQ": ("JMPGT", "JMPLT"),
+    "JMPGT": ("JMPLT", "JMPEQ"),
+    "JMPLT": ("JMPGT", "JMPEQ"),
+}
+SEAM_INSTS = 3 # instructions each side of a seam that a hazard window can span
+
+
+def get_join_pad(tail: list, head: list) -> int:
+    """
+    NOPs needed between tail and head (SchedInsts) when head used to be reached from tail through a taken jump.
+    """
+    for pad in range(JUMP_SHADOW + 1):
+        ok = True
+        for i, prev in enumerate(reversed(tail[-SEAM_INSTS:]), start=1):
+            for j, inst in enumerate(head[:SEAM_INSTS]):
+                dist = i + pad + j
+                if prev.op == "COMPARE" and inst.op in FLAG_JUMPS and dist <= 2:
+                    ok = False
+                elif prev.op in CARRY_OPS and inst.op == "JMPC" and dist == 2:
+                    ok = False
+                elif inst.op == "RLOAD" and prev.defs & inst.uses and dist < 3:
+                    ok = False
+                elif prev.op in J_type_opcodes and inst.op in STACK_OPS and dist <= JUMP_SHADOW:
+                    ok = False
+        if ok:
+            return pad
+    return JUMP_SHADOW
+
+
+class LayoutBlock:
+    """
+    Labels, instructions, and the index of the J-type that ends the block (or None). NOPs behind a JMP / JR are kept as pad.
+    """
+    __slots__ = ("labels", "insts", "term", "addrs", "ret_block")
+
+    def __init__(self, labels: list):
+        self.labels = labels
+        self.insts = []
+        self.term = None
+        self.addrs = [] # source instruction index of each inst (None for inserted ones)
+        self.ret_block = False
+
+    def get_term_op(self):
+        return self.insts[self.term].op if self.term is not None else None
+
+
+class ASMLayout:
+    def read_blocks(self, lines: Iterable[str]):
+        self.blocks = [LayoutBlock([])]
+        addr = 0
+        for kind, text in read_asm_lines(lines):
+            cur = self.blocks[-1]
+            if kind == 'label':
+                if cur.insts:
+                    cur = LayoutBlock([])
+                    cur.ret_block = self.blocks[-1].get_term_op() == "CALL"
+                    self.blocks.append(cur)
+                cur.labels.append(text)
+                continue
+
+            inst = SchedInst(text)
+            if cur.term is not None and not (inst.op == "NOP" and cur.get_term_op() in ("JMP", "JR")):
+                cur = LayoutBlock([])
+                cur.ret_block = self.blocks[-1].get_term_op() == "CALL"
+                self.blocks.append(cur)
+            cur.insts.append(inst)
+            cur.addrs.append(addr)
+            if inst.op in J_type_opcodes and cur.term is None:
+                cur.term = len(cur.insts) - 1
+            addr += 1
+        self.num_src_insts = addr
+        if not self.blocks[0].insts and not self.blocks[0].labels:
+            self.blocks.pop(0)
+
+
+    def get_block_idx(self, label: str):
+        for idx, block in enumerate(self.blocks):
+            if label in block.labels:
+                return idx
+        return None
+
+
+    def get_first_addr(self, idx: int):
+        return next((addr for addr in self.blocks[idx].addrs if addr is not None), None)
+
+
+    def get_taken(self, block: LayoutBlock) -> tuple:
+        """
+        (taken, not taken) weights of the jump ending block.
+        """
+        addr = block.addrs[block.term]
+        if self.profile is not None and addr is not None:
+            row = self.profile[addr]
+            taken = row["flush_cycles"] / JUMP_SHADOW
+            return taken, max(row["retired"] - taken, 0)
+        targ_idx = self.get_block_idx(block.insts[block.term].parts[1].upper())
+        targ_addr = self.get_first_addr(targ_idx) if targ_idx is not None else None
+        backward = targ_addr is not None and addr is not None and targ_addr <= addr
+        return (STATIC_BACKWARD_WEIGHT, 1) if backward else (1, STATIC_BACKWARD_WEIGHT)
+
+
+    def is_ignored_jump(self, block: LayoutBlock) -> bool:
+        """
+        True if block's jump is the first thing at a jump target / return address, where the pipeline ignores it.
+        """
+        return block.term == 0 and (bool(block.labels) or block.ret_block)
+
+
+    def falls_through(self, block: LayoutBlock) -> bool:
+        return block.get_term_op() not in ("JMP", "JR") or self.is_ignored_jump(block)
+
+
+    def new_label(self, base: str) -> str:
+        label, num = f"{base}_ROT", 0
+        while label in self.all_labels:
+            num += 1
+            label = f"{base}_ROT{num}"
+        self.all_labels.add(label)
+        return label
+
+
+    def invert_branches(self):
+        idx = 0
+        rot_targets = set()
+        while idx + 1 < len(self.blocks):
+            block, latch = self.blocks[idx], self.blocks[idx + 1]
+            idx += 1
+            op = block.get_term_op()
+            if op not in INVERTED_JUMPS or block.term < 2 or self.is_ignored_jump(block):
+                continue
+            if block.insts[block.term - 1].op != "COMPARE" or block.insts[block.term - 2].op == "COMPARE":
+                continue
+            if latch.labels or latch.get_term_op() != "JMP" or self.is_ignored_jump(latch):
+                continue
+            body = latch.insts[:latch.term]
+            lead = 0
+            while lead < len(body) and body[lead].op == "NOP":
+                lead += 1
+            stay = body[lead:]
+
+            targ_label = latch.insts[latch.term].parts[1].upper()
+            targ_idx = self.get_block_idx(targ_label)
+            if targ_idx is None or targ_idx == idx:
+                continue
+            exit_w, stay_w = self.get_taken(block)
+            back_w, _ = self.get_taken(latch)
+            if stay_w <= exit_w or (self.profile is None and back_w < STATIC_BACKWARD_WEIGHT):
+                continue
+            if stay:
+                targ_block = self.blocks[targ_idx]
+                pred = self.blocks[targ_idx - 1] if targ_idx > 0 else None
+                if targ_label in rot_targets or targ_block.insts[0].op in J_type_opcodes:
+                    continue
+                # T's fall-through entry will come through a JMP, so it mustn't depend on what precedes T
+                if pred is not None and self.falls_through(pred) and get_join_pad(pred.insts, targ_block.insts):
+                    continue
+
+            exit_label = block.insts[block.term].parts[1]
+            inv_ops = INVERTED_JUMPS[op]
+            new_targ = targ_label
+            if stay:
+                new_targ = self.new_label(targ_label)
+                rot_targets.add(targ_label)
+            block.insts[block.term:] = [SchedInst(f"{inv_ops[0]} {new_targ}"), SchedInst(f"{inv_ops[1]} {new_targ}")]
+            block.addrs[block.term:] = [None, None]
+            block.term += 1
+            exit_block = LayoutBlock([])
+            exit_block.insts = [SchedInst(f"JMP {exit_label}")] + [SchedInst("NOP") for _ in range(JUMP_SHADOW)]
+            exit_block.addrs = [None] * len(exit_block.insts)
+            exit_block.term = 0
+            self.blocks[idx] = exit_block
+            self.branches_inverted += 1
+            self.jumps_removed += 1
+
+            if stay:
+                rot_block = LayoutBlock([new_targ])
+                pad = get_join_pad(stay, targ_block.insts)
+                rot_block.insts = stay + [SchedInst("NOP") for _ in range(pad)]
+                rot_block.addrs = [None] * len(rot_block.insts)
+                self.blocks.insert(targ_idx, rot_block)
+                if targ_idx < idx:
+                    idx += 1
+                if pred is not None and self.falls_through(pred):
+                    if pred.get_term_op() == "CALL":
+                        # the slot behind a CALL is its return address, where a jump would be ignored
+                        pred.insts.append(SchedInst("NOP"))
+                        pred.addrs.append(None)
+                    pred.insts.append(SchedInst(f"JMP {targ_label}"))
+                    pred.insts.extend(SchedInst("NOP") for _ in range(JUMP_SHADOW))
+                    pred.addrs.extend([None] * (JUMP_SHADOW + 1))
+                    pred.term = len(pred.insts) - JUMP_SHADOW - 1
+                    self.jumps_added += 1
+
+
+    def find_chains(self):
+        self.chains = [[]]
+        for idx, block in enumerate(self.blocks):
+            self.chains[-1].append(idx)
+            if not self.falls_through(block) and idx + 1 < len(self.blocks):
+                self.chains.append([])
+        self.chain_of = {idx: cidx for cidx, chain in enumerate(self.chains) for idx in chain}
+
+
+    def get_chain_insts(self, chain: list, drop_jump: bool = False) -> list:
+        insts = [inst for idx in chain for inst in self.blocks[idx].insts]
+        if drop_jump:
+            last = self.blocks[chain[-1]]
+            insts = insts[:len(insts) - len(last.insts) + last.term]
+        return insts
+
+
+    def link_chains(self):
+        """
+        Greedily make 'JMP T' chain ends fall through into the chain starting at T.
+        """
+        last_cidx = len(self.chains) - 1
+        ends_open = self.falls_through(self.blocks[self.chains[-1][-1]])
+        edges = []
+        for cidx, chain in enumerate(self.chains):
+            block = self.blocks[chain[-1]]
+            if block.get_term_op() != "JMP" or self.is_ignored_jump(block):
+                continue
+            targ_idx = self.get_block_idx(block.insts[block.term].parts[1].upper())
+            if targ_idx is None:
+                continue
+            dcidx = self.chain_of[targ_idx]
+            if self.chains[dcidx][0] != targ_idx or dcidx in (cidx, 0) or (ends_open and dcidx == last_cidx):
+                continue
+            if self.blocks[targ_idx].insts and self.blocks[targ_idx].insts[0].op in J_type_opcodes:
+                continue
+            edges.append((-self.get_taken(block)[0], cidx, dcidx))
+
+        self.next_chain = {}
+        prev_chain = {}
+        group = list(range(len(self.chains)))
+
+        def find(cidx):
+            while group[cidx] != cidx:
+                cidx = group[cidx]
+            return cidx
+
+        for _, cidx, dcidx in sorted(edges):
+            if cidx in self.next_chain or dcidx in prev_chain or find(cidx) == find(dcidx):
+                continue
+            self.next_chain[cidx] = dcidx
+            prev_chain[dcidx] = cidx
+            group[find(dcidx)] = find(cidx)
+
+        heads = [cidx for cidx in range(len(self.chains)) if cidx not in prev_chain]
+        tail_cidx = last_cidx if ends_open else None
+        tail_head = None
+        if tail_cidx is not None:
+            tail_head = tail_cidx
+            while tail_head in prev_chain:
+                tail_head = prev_chain[tail_head]
+        order = [cidx for cidx in heads if cidx != tail_head]
+        if tail_head is not None and tail_head not in order:
+            order.append(tail_head)
+        self.chain_order = order
+
+
+    def emit(self):
+        self.out_lines = []
+        self.out_insts = 0
+        for head in self.chain_order:
+            cidx = head
+            while cidx is not None:
+                chain = self.chains[cidx]
+                nxt = self.next_chain.get(cidx)
+                insts = self.get_chain_insts(chain, drop_jump=nxt is not None)
+                for idx in chain:
+                    block = self.blocks[idx]
+                    self.out_lines.extend(f"{label}:" for label in block.labels)
+                    keep = len(block.insts)
+                    if nxt is not None and idx == chain[-1]:
+                        keep = block.term
+                    self.out_lines.extend(inst.text for inst in block.insts[:keep])
+                    self.out_insts += keep
+                if nxt is not None:
+                    pad = get_join_pad(insts, self.get_chain_insts(self.chains[nxt]))
+                    self.out_lines.extend("NOP" for _ in range(pad))
+                    self.out_insts += pad
+                    self.jumps_removed += 1
+                cidx = nxt
+        if self.out_insts > PROG_MEM_DEPTH:
+            raise ValueError(f"Layout needs {self.out_insts} instructions, more than the {PROG_MEM_DEPTH} a 10-bit jump address reaches")
+
+
+    def getLines(self) -> list:
+        return self.out_lines
+
+
+    def __init__(self, lines: Iterable[str], profile: dict = None):
+        '''
+        Taking the lines of an ASM source and optionally a PipelineSim report (PipelineSim.py --report_out) of
+        that same source, reorder its blocks so the likely path falls through.
+        The new source (labels + instructions, no comments) can be obtained with ASMLayout.getLines().
+        '''
+        self.read_blocks(lines)
+        self.profile = None
+        if profile is not None:
+            self.profile = profile["per_addr"]
+            if len(self.profile) != self.num_src_insts:
+                raise ValueError(f"Profile has {len(self.profile)} instructions, the source has {self.num_src_insts}")
+        self.all_labels = {label for block in self.blocks for label in block.labels}
+        self.branches_inverted = 0
+        self.jumps_removed = 0
+        self.jumps_added = 0
+
+        self.invert_branches()
+        self.find_chains()
+        self.link_chains()
+        self.emit()
+
+
+def load_profile(path: str) -> dict:
+    with open(path, 'r') as fileobj:
+        return json.load(fileobj)
@@ -0,0 +1,270 @@
+"""
+Macro / repeat-block preprocessor for RISC-RNS assembly.
+
+Runs in front of ASMtoBin.rm_labels_comments (and in front of the source passes in ASMtoV.py / ASMAssembler.py),
+so stanzas that used to be copied by hand can be written once:
+
+    .equ LAST, 0xFF                 # constant; an expression of numbers and earlier constants
+                                    # (+ - * // % << >> & | ^ ~, parentheses)
+    .macro STORE_NEXT src, lim      # parameters are used as \\src, \\lim in the body
+    RSTORE \\src, x6, x7
+    COMPARE x7, \\lim
+    JMPEQ DONE                      # DONE is defined in the body, so each expansion gets its own copy
+    ADD x7, x7, x1
+    DONE:
+    .endm
+
+    .rept 4, i                      # body repeated 4 times; the optional name is the iteration (\\i = 0..3)
+    STORE_NEXT x3, x5
+    .endr
+
+    LDI x2, LAST                    # constants are substituted in operands (as 0x..)
+    LDI x3, \\i * 2 + 1             # so are expressions, e.g. of the .rept variable (in a .rept with i)
+
+Labels defined inside a macro body or .rept block are local to each expansion: they, and the references to
+them in the same body, are renamed <LABEL>__<n>. Labels that are only referenced in the body stay global.
+Macros may call other macros and hold .rept blocks; recursion stops at MAX_EXPANSION_DEPTH.
+
+Lines outside any directive are passed through untouched, so a source without directives comes out identical.
+ASMMacro.line_map[i] = (site, body) for output line i: site is the original line (0-based) the code appears
+from (the macro call / .rept at top level), body is the original line it was written on. ASMtoV.py --print_jumps
+uses it to print original line numbers.
+"""
+import ast
+import re
+import operator
+from typing import Iterable
+
+MAX_EXPANSION_DEPTH = 16
+MAX_OUTPUT_LINES = 2 ** 16 # far beyond what instruction memory holds; stops a runaway .rept
+DIRECTIVES = (".equ", ".macro", ".endm", ".rept", ".endr")
+
+REG_OPERAND = re.compile(r"^[xXmM]\d+$")
+NUM_OPERAND = re.compile(r"^(0x[0-9a-fA-F]+|\d+)$")
+IDENT_OPERAND = re.compile(r"^[A-Za-z_]\w*$") # a label, unless it is a .equ constant
+PARAM_REF = re.compile(r"\\(\w+)")
+EXPR_OPS = {
+    ast.Add: operator.add, ast.Sub: operator.sub, ast.Mult: operator.mul, ast.FloorDiv: operator.floordiv,
+    ast.Mod: operator.mod, ast.LShift: operator.lshift, ast.RShift: operator.rshift,
+    ast.BitAnd: operator.and_, ast.BitOr: operator.or_, ast.BitXor: operator.xor,
+    ast.USub: operator.neg, ast.UAdd: operator.pos, ast.Invert: operator.invert,
+}
+
+
+def has_directives(lines: Iterable[str]) -> bool:
+    """
+    True if the source uses the preprocessor at all. Cheap enough to call on every source.
+    """
+    return any(line.split('#', 1)[0].strip().lower().startswith(DIRECTIVES) for line in lines)
+
+
+def split_code(line: str) -> tuple:
+    """
+    (code, comment) of a source line; comment keeps its '#'.
+    """
+    code, sep, comment = line.rstrip('\n').partition('#')
+    return code.strip(), sep + comment
+
+
+class ASMMacro:
+    def get_where(self, body: int) -> str:
+        return f"Line {body + 1}" + (f" ({self.trace[-1]})" if self.trace else "")
+
+
+    def eval_expr(self, text: str, body: int) -> int:
+        """
+        Evaluate a constant expression over numbers and .equ names.
+        """
+        def walk(node):
+            if isinstance(node, ast.Expression):
+                return walk(node.body)
+            if isinstance(node, ast.Constant) and isinstance(node.value, int):
+                return node.value
+            if isinstance(node, ast.Name) and node.id.upper() in self.equs:
+                return self.equs[node.id.upper()]
+            if isinstance(node, ast.BinOp) and type(node.op) in EXPR_OPS:
+                return EXPR_OPS[type(node.op)](walk(node.left), walk(node.right))
+            if isinstance(node, ast.UnaryOp) and type(node.op) in EXPR_OPS:
+                return EXPR_OPS[type(node.op)](walk(node.operand))
+            raise ValueError(f"{self.get_where(body)}: can't evaluate '{text.strip()}'")
+        try:
+            return walk(ast.parse(text.strip(), mode='eval'))
+        except (SyntaxError, ZeroDivisionError):
+            raise ValueError(f"{self.get_where(body)}: can't evaluate '{text.strip()}'")
+
+
+    def subst_params(self, code: str, params: dict, body: int, strict: bool = True) -> str:
+        """
+        Replace \\name with the value of parameter name. Unless strict, unknown names (parameters of a block
+        nested further in) are left alone.
+        """
+        def get_param(match):
+            name = match.group(1).lower()
+            if name in params:
+                return params[name]
+            if strict:
+                raise ValueError(f"{self.get_where(body)}: '\\{match.group(1)}' is not a parameter here")
+            return match.group(0)
+        return PARAM_REF.sub(get_param, code) if '\\' in code else code
+
+
+    def subst_operands(self, code: str, body: int, local_labels: dict = None) -> str:
+        """
+        Rename local labels and evaluate constant operands of one instruction / label line. Returns code unchanged
+        when there is nothing to substitute.
+        """
+        if code.endswith(':'):
+            label = code[:-1].strip().upper()
+            return f"{local_labels[label]}:" if local_labels and label in local_labels else code
+        words = code.split(maxsplit=1)
+        if len(words) < 2:
+            return code
+        # operands are comma separated; an expression operand may contain spaces
+        parts = [words[0]] + [op.strip() for op in (words[1].split(',') if ',' in words[1] else words[1].split())]
+        operands = []
+        for part in parts[1:]:
+            if local_labels and part.upper() in local_labels:
+                operands.append(local_labels[part.upper()])
+            elif REG_OPERAND.match(part) or NUM_OPERAND.match(part) or part.upper() == "RA":
+                operands.append(part)
+            elif part.upper() in self.equs or not IDENT_OPERAND.match(part):
+                # a constant, or an expression such as \i + 1 / 4*3 / K+1
+                val = self.eval_expr(part, body)
+                if not 0 <= val <= 0xFF:
+                    raise ValueError(f"{self.get_where(body)}: '{part}' = {val} doesn't fit an 8-bit immediate")
+                operands.append(f"0x{val:02X}")
+            else:
+                operands.append(part) # a label
+        if operands == parts[1:]:
+            return code
+        return f"{parts[0]} {', '.join(operands)}"
+
+
+    def get_block(self, items: list, pos: int, open_dir: str, close_dir: str) -> tuple:
+        """
+        Lines of the block opened at items[pos], up to the matching close directive. Returns (body items, next pos).
+        """
+        depth = 1
+        end = pos + 1
+        while end < len(items):
+            word = split_code(items[end][0])[0].split(maxsplit=1)
+            word = word[0].lower() if word else ''
+            if word == open_dir:
+                depth += 1
+            elif word == close_dir:
+                depth -= 1
+                if depth == 0:
+                    return items[pos + 1:end], end + 1
+            end += 1
+        raise ValueError(f"{self.get_where(items[pos][1])}: {open_dir} without {close_dir}")
+
+
+    def localize(self, body: list, params: dict, outer_labels: dict = None) -> dict:
+        """
+        Fresh names for the labels defined in a macro body / .rept block, for one expansion. A .rept block
+        also sees the local labels of the body it is in (outer_labels).
+        """
+        self.num_expansions += 1
+        local_labels = dict(outer_labels or {})
+        for line, idx in body:
+            code = self.subst_params(split_code(line)[0], params, idx, strict=False)
+            if code.endswith(':'):
+                label = code[:-1].strip().upper()
+                local_labels[label] = f"{label}__{self.num_expansions}"
+        return local_labels
+
+
+    def emit(self, line: str, site: int, body: int):
+        if len(self.lines) >= MAX_OUTPUT_LINES:
+            raise ValueError(f"{self.get_where(body)}: expansion is over {MAX_OUTPUT_LINES} lines")
+        self.lines.append(line)
+        self.line_map.append((site, body))
+
+
+    def expand(self, items: list, params: dict, local_labels: dict, site: int, depth: int):
+        """
+        Expand items ([(line, original index)]) into self.lines. site is the top-level line they come from
+        (None at top level: each line is its own site).
+        """
+        if depth > MAX_EXPANSION_DEPTH:
+            raise ValueError(f"{self.get_where(items[0][1] if items else 0)}: macros nest deeper than {MAX_EXPANSION_DEPTH} (recursive macro?)")
+        pos = 0
+        while pos < len(items):
+            raw, body = items[pos]
+            line_site = body if site is None else site
+            code, comment = split_code(raw)
+            code = self.subst_params(code, params, body)
+            words = code.split(maxsplit=1)
+            word = words[0].lower() if words else ''
+            args = words[1] if len(words) > 1 else ''
+
+            if word == ".equ":
+                name, _, expr = args.replace(',', ' ', 1).partition(' ')
+                if not name or not expr.strip():
+                    raise ValueError(f"{self.get_where(body)}: .equ needs a name and a value")
+                if name.upper() in self.equs:
+                    raise ValueError(f"{self.get_where(body)}: constant '{name}' is already defined")
+                self.equs[name.upper()] = self.eval_expr(expr, body)
+                pos += 1
+            elif word == ".macro":
+                name, _, arg_list = args.replace(',', ' ', 1).partition(' ')
+                if not name:
+                    raise ValueError(f"{self.get_where(body)}: .macro needs a name")
+                if name.upper() in self.macros:
+                    raise ValueError(f"{self.get_where(body)}: macro '{name}' is already defined")
+                mac_body, pos = self.get_block(items, pos, ".macro", ".endm")
+                self.macros[name.upper()] = ([arg.lower() for arg in arg_list.replace(',', ' ').split()], mac_body)
+            elif word == ".rept":
+                count_expr, _, var = args.partition(',')
+                count = self.eval_expr(count_expr, body)
+                if count < 0:
+                    raise ValueError(f"{self.get_where(body)}: .rept count {count} is negative")
+                rept_body, pos = self.get_block(items, pos, ".rept", ".endr")
+                for idx in range(count):
+                    rept_params = dict(params, **({var.strip().lower(): str(idx)} if var.strip() else {}))
+                    self.trace.append(f"rept {idx + 1}/{count} from line {body + 1}")
+                    self.num_repts += 1
+                    self.expand(rept_body, rept_params, self.localize(rept_body, rept_params, local_labels), line_site, depth + 1)
+                    self.trace.pop()
+            elif word in (".endm", ".endr"):
+                raise ValueError(f"{self.get_where(body)}: {word} without {'.macro' if word == '.endm' else '.rept'}")
+            elif word.upper() in self.macros:
+                arg_names, mac_body = self.macros[word.upper()]
+                arg_vals = [arg.strip() for arg in args.split(',')] if args.strip() else []
+                if len(arg_vals) != len(arg_names):
+                    raise ValueError(f"{self.get_where(body)}: macro {word.upper()} takes {len(arg_names)} arguments, got {len(arg_vals)}")
+                # a local label of the caller passed as an argument refers to the caller's copy
+                arg_vals = [local_labels.get(arg.upper(), arg) if local_labels else arg for arg in arg_vals]
+                mac_params = dict(zip(arg_names, arg_vals))
+                self.trace.append(f"macro {word.upper()} from line {body + 1}")
+                self.num_macro_calls += 1
+                self.expand(mac_body, mac_params, self.localize(mac_body, mac_params), line_site, depth + 1)
+                self.trace.pop()
+                pos += 1
+            else:
+                if code:
+                    new_code = self.subst_operands(code, body, local_labels)
+                    if new_code != split_code(raw)[0]:
+                        raw = f"{new_code} {comment}".rstrip()
+                self.emit(raw.rstrip('\n'), line_site, body)
+                pos += 1
+
+
+    def getLines(self) -> list:
+        return self.lines
+
+
+    def __init__(self, lines: Iterable[str]):
+        '''
+        Taking the lines of an ASM source, expand .equ / .macro / .rept. The expanded source can be obtained
+        with ASMMacro.getLines(), and ASMMacro.line_map maps each of its lines back to the original source.
+        '''
+        self.equs = {} # NAME -> value
+        self.macros = {} # NAME -> ([parameter names], [(line, original index)])
+        self.lines = []
+        self.line_map = []
+        self.trace = [] # expansions we're inside of, for error messages
+        self.num_expansions = 0
+        self.num_macro_calls = 0
+        self.num_repts = 0
+        self.expand([(line, idx) for idx, line in enumerate(lines)], {}, None, None, 0)
@@ -0,0 +1,212 @@
+"""
+Peephole optimizer for RISC-RNS assembly (ASMtoV.py --optimize).
+
+Runs on the source lines, before ASMSched / ASMtoBin. Every rewrite keeps the program's behavior, including
+the pipeline timing the hand-written code depends on:
+    - Jump chains: a jump to a label whose code is NOP(s) followed by a JMP is retargeted to that JMP's target.
+      At least one NOP is required: a JMP as the first instruction at a jump target is ignored by the pipeline.
+    - Redundant LDIs: an LDI of a value the register is already known to hold (from an earlier LDI in the same
+      block, with no write in between).
+    - Dead instructions: anything without a side effect whose results are never read. Liveness is computed over
+      the whole program (every register is assumed live at a CALL, a JR and the end of the program).
+      This removes dead LDIs and the dead half of an UNRLU / UNRLL pair. ADD / SUB / SHL additionally need
+      no JMPC 2 slots behind them, since they set the carry.
+    - Redundant COMPAREs: a COMPARE with no JMPGT / JMPLT / JMPEQ in the 2 slots behind it (the only ones
+      ctrl_BranchPred reads its flags in), or a repeat of the COMPARE right in front of it.
+A removed instruction first becomes a NOP, which keeps every slot distance the same. The NOP is then dropped
+if nothing timing-sensitive follows it closely: no J-type or RLOAD in the next JUMP_SHADOW slots, and it
+isn't instruction 0. Otherwise it stays; ASMSched (--schedule) removes what it can of those later.
+"""
+from typing import Iterable
+
+from ASMtoV import J_type_opcodes, split_inst
+from ASMSched import SchedInst, read_asm_lines, JUMP_SHADOW, CARRY_OPS
+
+FLAG_JUMPS = ("JMPGT", "JMPLT", "JMPEQ")
+ALL_REGS = frozenset([f"X{idx}" for idx in range(8)] + [f"M{idx}" for idx in range(8)])
+# ops with no effect besides writing their destination register (and the carry, for CARRY_OPS)
+PURE_OPS = (
+    "LDI", "ADD", "SUB", "SHL", "AND", "OR", "NOT", "ANDBIT", "ORBIT", "NOTBIT",
+    "ADDM", "SUBM", "MULM", "RLLM", "UNRLL", "UNRLU", "RLOAD"
+)
+TIMING_OPS = tuple(J_type_opcodes) + ("RLOAD",)
+MAX_CHAIN = 16
+
+
+def get_imm(imm: str) -> int:
+    return int(imm[2:], 16) if imm.lower().startswith("0x") else int(imm)
+
+
+class ASMPeep:
+    def get_succs(self, idx: int) -> list:
+        """
+        Successors of instruction idx. Every jump keeps its fall-through too (shadow slots, ignored jumps),
+        which can only make more registers live.
+        """
+        inst = self.insts[idx]
+        succs = [idx + 1] if idx + 1 < len(self.insts) else []
+        if inst.op in J_type_opcodes and inst.op != "JR":
+            targ = self.label_idx.get(inst.parts[1].upper())
+            if targ is not None and targ < len(self.insts):
+                succs.append(targ)
+        return succs
+
+
+    def find_live(self) -> list:
+        """
+        Registers live after each instruction.
+        """
+        num_insts = len(self.insts)
+        succs = [self.get_succs(idx) for idx in range(num_insts)]
+        live_in = [set() for _ in range(num_insts)]
+        live_out = [set() for _ in range(num_insts)]
+        changed = True
+        while changed:
+            changed = False
+            for idx in reversed(range(num_insts)):
+                inst = self.insts[idx]
+                out = set(ALL_REGS) if not succs[idx] else set().union(*(live_in[succ] for succ in succs[idx]))
+                if inst.op in ("CALL", "JR"):
+                    out = set(ALL_REGS)
+                new_in = (out - inst.defs) | inst.uses
+                if new_in != live_in[idx] or out != live_out[idx]:
+                    live_in[idx], live_out[idx] = new_in, out
+                    changed = True
+        return live_out
+
+
+    def fold_jump_chains(self):
+        for inst in self.insts:
+            if inst.op not in J_type_opcodes or inst.op == "JR":
+                continue
+            label = inst.parts[1].upper()
+            for _ in range(MAX_CHAIN):
+                idx = self.label_idx.get(label)
+                if idx is None:
+                    break
+                nxt = idx
+                while nxt < len(self.insts) and self.insts[nxt].op == "NOP":
+                    nxt += 1
+                if nxt == idx or nxt >= len(self.insts) or self.insts[nxt].op != "JMP":
+                    break
+                new_label = self.insts[nxt].parts[1].upper()
+                if new_label == label:
+                    break
+                label = new_label
+            if label != inst.parts[1].upper():
+                self.retarget(inst, label)
+                self.jumps_retargeted += 1
+
+
+    def retarget(self, inst: SchedInst, label: str):
+        inst.text = f"{inst.parts[0]} {label}"
+        inst.parts = split_inst(inst.text)
+
+
+    def kill(self, idx: int, kind: str):
+        self.killed[idx] = kind
+        self.insts[idx] = SchedInst("NOP")
+
+
+    def fold_ldis(self):
+        known = {}
+        for idx, inst in enumerate(self.insts):
+            if idx in self.block_starts:
+                known = {}
+            if inst.op == "LDI":
+                reg = f"X{inst.parts[1][1:]}"
+                value = get_imm(inst.parts[2])
+                if known.get(reg) == value and idx != 0:
+                    self.kill(idx, "ldi")
+                    continue
+                known[reg] = value
+            else:
+                for reg in inst.defs:
+                    known.pop(reg, None)
+            if inst.op in J_type_opcodes:
+                known = {}
+
+
+    def get_op_at(self, idx: int):
+        return self.insts[idx].op if idx < len(self.insts) else None
+
+
+    def fold_dead(self) -> bool:
+        """
+        One round of dead instruction / COMPARE removal. Returns True if anything was removed.
+        """
+        live_out = self.find_live()
+        num_killed = len(self.killed)
+        for idx, inst in enumerate(self.insts):
+            if idx == 0:
+                continue
+            if inst.op == "COMPARE":
+                window = [self.get_op_at(idx + 1), self.get_op_at(idx + 2)]
+                prev = self.insts[idx - 1]
+                if not any(op in FLAG_JUMPS for op in window):
+                    self.kill(idx, "compare")
+                elif prev.op == "COMPARE" and prev.uses == inst.uses and prev.parts[1:] == inst.parts[1:] \
+                        and self.get_op_at(idx + 2) not in FLAG_JUMPS and idx not in self.block_starts:
+                    self.kill(idx, "compare")
+            elif inst.op in PURE_OPS and not (inst.defs & live_out[idx]):
+                if inst.op in CARRY_OPS and self.get_op_at(idx + 2) == "JMPC":
+                    continue
+                self.kill(idx, "dead")
+        return len(self.killed) != num_killed
+
+
+    def compact(self):
+        """
+        Drop killed slots where that doesn't move anything timing-sensitive.
+        """
+        keep = [True] * len(self.insts)
+        for idx in sorted(self.killed):
+            if idx == 0:
+                continue
+            nxt, ahead = idx + 1, []
+            while nxt < len(self.insts) and len(ahead) < JUMP_SHADOW:
+                if keep[nxt]:
+                    ahead.append(self.insts[nxt].op)
+                nxt += 1
+            if not any(op in TIMING_OPS for op in ahead):
+                keep[idx] = False
+                self.slots_removed += 1
+
+        self.out_lines = []
+        for idx, inst in enumerate(self.insts):
+            self.out_lines.extend(f"{label}:" for label in self.labels_at.get(idx, []))
+            if keep[idx]:
+                self.out_lines.append(inst.text)
+        self.out_lines.extend(f"{label}:" for label in self.labels_at.get(len(self.insts), []))
+
+
+    def getLines(self) -> list:
+        return self.out_lines
+
+
+    def __init__(self, lines: Iterable[str]):
+        '''
+        Taking the lines of an ASM source, apply the peephole rewrites above.
+        The optimized source (labels + instructions, no comments) can be obtained with ASMPeep.getLines().
+        '''
+        self.insts = []
+        self.labels_at = {} # instruction index -> labels defined right before it
+        self.label_idx = {}
+        for kind, text in read_asm_lines(lines):
+            if kind == 'label':
+                self.labels_at.setdefault(len(self.insts), []).append(text)
+                self.label_idx.setdefault(text, len(self.insts))
+            else:
+                self.insts.append(SchedInst(text))
+        self.block_starts = set(self.labels_at)
+
+        self.killed = {} # instruction index -> 'ldi' / 'dead' / 'compare'
+        self.jumps_retargeted = 0
+        self.slots_removed = 0
+
+        self.fold_jump_chains()
+        self.fold_ldis()
+        while self.fold_dead():
+            pass
+        self.compact()
+        self.num_killed = {kind: list(self.killed.values()).count(kind) for kind in ("ldi", "dead", "compare")}
@@ -0,0 +1,332 @@
+"""
+Static cycle-cost profile of an assembled RISC-RNS program (ASMtoV.py --profile).
+
+ASMProfile builds the control-flow graph of an ASMtoBin program. Leaders are address 0, every label, every
+J-type target, and the slot after every J-type. Edges follow the jumps:
+    - JMP: its target.
+    - JMPGT / JMPLT / JMPEQ / JMPC: its target and the fall-through.
+    - CALL: the fall-through, which is the return address. The call itself is recorded per block, and its target
+      becomes a function entry.
+    - JR: no edges (the return).
+Loops are the natural loops of the back edges: u -> h where h dominates u. Loops with the same header are merged.
+Nothing here knows trip counts, so each loop is costed per iteration, with every block of its body run once:
+    - 1 cycle per slot, NOP padding included (and also reported on its own).
+    - JUMP_PENALTY cycles per jump taken on every iteration: the back-edge jumps and any other JMP that stays in the loop.
+      A taken jump squashes the 3 slots behind it.
+    - For each CALL, the callee's straight-line cost, plus the CALL's and the JR's penalties.
+    - RLOAD / RSTORE: Data_Mem's ~28ns access is what sets the ~30ns clock floor (see the README). So every
+      cycle is costed at clk_ns, and the time spent in data memory per iteration is reported as mem_ns_per_iter.
+Hotness is a guess: each loop nesting level is assumed to run LOOP_TRIP_GUESS times, and loops are ranked
+by cycles_per_iter * LOOP_TRIP_GUESS ** depth. The top HOT_LOOPS loops are flagged as hot. The same guess
+gives program.est_cycles, the sum over blocks of (slots + taken-jump penalty) * LOOP_TRIP_GUESS ** loop depth.
+ASMProfile.getProfile() returns a dict with sorted keys and lists, so JSON dumps of two revisions of a
+program can be diffed directly.
+"""
+import io
+from typing import Iterable
+
+from ASMtoV import ASMtoBin, J_type_opcodes, RNS_dest_insts, split_inst, get_inst_regs
+
+COND_JUMPS = ("JMPGT", "JMPLT", "JMPEQ", "JMPC")
+MEM_OPS = ("RLOAD", "RSTORE")
+IO_OPS = ("INPUT", "OUTPUT")
+MIX_CLASSES = ("rns", "int", "mem", "io", "control", "nop")
+
+JUMP_PENALTY = 3 # slots squashed behind a taken jump
+CLK_NS = 30 # clock period floor set by Data_Mem (README)
+DATA_MEM_NS = 28 # Data_Mem access time (README)
+LOOP_TRIP_GUESS = 10
+HOT_LOOPS = 3
+
+
+def get_mix_class(parts: list) -> str:
+    """
+    Class of an instruction (as split by split_inst) for the instruction mix: one of MIX_CLASSES.
+    An instruction is RNS-domain if it writes a mod-domain register or reads one.
+    """
+    op = parts[0].upper()
+    if op == "NOP":
+        return "nop"
+    if op in J_type_opcodes:
+        return "control"
+    if op in MEM_OPS:
+        return "mem"
+    if op in IO_OPS:
+        return "io"
+    defs, uses = get_inst_regs(parts)
+    if op in RNS_dest_insts or any(reg.startswith('M') for reg in uses):
+        return "rns"
+    return "int"
+
+
+def get_mix(parts_list) -> dict:
+    mix = {cls: 0 for cls in MIX_CLASSES}
+    for parts in parts_list:
+        mix[get_mix_class(parts)] += 1
+    return mix
+
+
+def get_est_cycles(lines: Iterable[str]) -> int:
+    """
+    program.est_cycles of an ASM source, to compare two versions of a program.
+    """
+    asm_to_bin = ASMtoBin(io.StringIO('\n'.join(line.rstrip('\n') for line in lines)))
+    return ASMProfile(asm_to_bin.getProg(), asm_to_bin.symbols).getProfile()["program"]["est_cycles"]
+
+
+class ASMProfile:
+    def find_blocks(self):
+        """
+        Split the program into basic blocks: self.blocks = {start: [end (exclusive), succs, call targets]}.
+        """
+        num_insts = len(self.ops)
+        leaders = {0} | set(self.symbols.by_name.values())
+        for addr, op in enumerate(self.ops):
+            if op in J_type_opcodes:
+                leaders.add(addr + 1)
+                if op != "JR":
+                    leaders.add(self.targets[addr])
+        leaders = sorted(addr for addr in leaders if addr < num_insts)
+
+        self.blocks = {}
+        for idx, start in enumerate(leaders):
+            end = leaders[idx + 1] if idx + 1 < len(leaders) else num_insts
+            last = end - 1
+            op = self.ops[last]
+            succs, calls = [], []
+            if op == "JMP":
+                succs = [self.targets[last]]
+            elif op in COND_JUMPS:
+                succs = [self.targets[last], end]
+            elif op == "CALL":
+                calls = [self.targets[last]]
+                succs = [end]
+            elif op != "JR":
+                succs = [end]
+            self.blocks[start] = [end, [succ for succ in dict.fromkeys(succs) if succ < num_insts], calls]
+
+        self.func_entries = sorted({0} | {targ for _, _, calls in self.blocks.values() for targ in calls})
+        self.preds = {start: [] for start in self.blocks}
+        for start, (_, succs, _) in self.blocks.items():
+            for succ in succs:
+                self.preds[succ].append(start)
+
+
+    def find_dominators(self):
+        """
+        Iterative dominator sets over all blocks, with every function entry as a root.
+        Blocks that no entry reaches (not in self.reachable) keep the full set and never form loops.
+        """
+        all_blocks = set(self.blocks)
+        self.reachable = set()
+        work = list(self.func_entries)
+        while work:
+            start = work.pop()
+            if start not in self.reachable:
+                self.reachable.add(start)
+                work.extend(self.blocks[start][1])
+        self.dom = {start: ({start} if start in self.func_entries else set(all_blocks)) for start in self.blocks}
+        changed = True
+        while changed:
+            changed = False
+            for start in self.blocks:
+                if start in self.func_entries:
+                    continue
+                preds = self.preds[start]
+                new_dom = set.intersection(*(self.dom[pred] for pred in preds)) if preds else set(all_blocks)
+                new_dom = new_dom | {start}
+                if new_dom != self.dom[start]:
+                    self.dom[start] = new_dom
+                    changed = True
+
+
+    def find_loops(self):
+        """
+        Natural loops, merged by header: self.loops = {header: {"body": set of block starts, "latches": [...]}}.
+        """
+        self.loops = {}
+        for start, (_, succs, _) in self.blocks.items():
+            for succ in succs:
+                if start in self.reachable and succ in self.dom[start]:
+                    loop = self.loops.setdefault(succ, {"body": {succ}, "latches": []})
+                    loop["latches"].append(start)
+                    work = [start]
+                    while work:
+                        node = work.pop()
+                        if node not in loop["body"]:
+                            loop["body"].add(node)
+                            work.extend(pred for pred in self.preds[node] if pred in self.reachable)
+
+
+    def get_addrs(self, body) -> list:
+        return [addr for start in sorted(body) for addr in range(start, self.blocks[start][0])]
+
+
+    def get_func_cost(self, entry: int, active: tuple = ()) -> int:
+        """
+        Straight-line cycles of one call to the function at entry: every block it reaches (up to its JR) once,
+        its own calls included, plus the CALL's and the JR's penalties. Recursive calls add nothing.
+        """
+        if entry in self.func_costs:
+            return self.func_costs[entry]
+        if entry in active:
+            return 0
+        seen, work = set(), [entry]
+        cycles = 2 * JUMP_PENALTY
+        while work:
+            start = work.pop()
+            if start in seen:
+                continue
+            seen.add(start)
+            end, succs, calls = self.blocks[start]
+            cycles += end - start
+            for targ in calls:
+                cycles += self.get_func_cost(targ, active + (entry,))
+            work.extend(succs)
+        self.func_costs[entry] = cycles
+        return cycles
+
+
+    def get_loop_profile(self, header: int, loop: dict) -> dict:
+        body = loop["body"]
+        addrs = self.get_addrs(body)
+        taken_jumps = 0
+        calls = []
+        for start in body:
+            last = self.blocks[start][0] - 1
+            op = self.ops[last]
+            if start in loop["latches"] and op in J_type_opcodes and self.targets.get(last) == header:
+                taken_jumps += 1
+            elif op == "JMP" and self.targets[last] in body:
+                taken_jumps += 1
+            calls.extend(self.blocks[start][2])
+
+        mix = get_mix(self.parts[addr] for addr in addrs)
+        call_cycles = sum(self.get_func_cost(targ) for targ in calls)
+        cycles = len(addrs) + JUMP_PENALTY * taken_jumps + call_cycles
+        mem_ops = mix["mem"] + sum(self.func_mem_ops(targ) for targ in calls)
+        return {
+            "header": header,
+            "label": self.get_label(header),
+            "blocks": sorted(body),
+            "addrs": [min(addrs), max(addrs)],
+            "slots": len(addrs),
+            "nop_slots": mix["nop"],
+            "taken_jumps": taken_jumps,
+            "cond_branches": sum(1 for addr in addrs if self.ops[addr] in COND_JUMPS),
+            "calls": sorted(self.get_label(targ) for targ in calls),
+            "call_cycles": call_cycles,
+            "mem_ops": mem_ops,
+            "cycles_per_iter": cycles,
+            "ns_per_iter": cycles * self.clk_ns,
+            "mem_ns_per_iter": mem_ops * DATA_MEM_NS,
+            "mix": mix,
+        }
+
+
+    def func_mem_ops(self, entry: int) -> int:
+        seen, work = set(), [entry]
+        mem_ops = 0
+        while work:
+            start = work.pop()
+            if start in seen:
+                continue
+            seen.add(start)
+            end, succs, _ = self.blocks[start]
+            mem_ops += sum(1 for addr in range(start, end) if self.ops[addr] in MEM_OPS)
+            work.extend(succs)
+        return mem_ops
+
+
+    def get_label(self, addr: int) -> str:
+        labels = self.symbols.get_labels(addr)
+        return labels[0] if labels else f"10'h{addr:03X}"
+
+
+    def build_profile(self):
+        loop_profiles = [self.get_loop_profile(header, loop) for header, loop in self.loops.items()]
+        for prof in loop_profiles:
+            body = set(prof["blocks"])
+            parents = [other for other in loop_profiles if other is not prof and body < set(other["blocks"])]
+            prof["depth"] = 1 + len(parents)
+            prof["parent"] = min(parents, key=lambda other: len(other["blocks"]))["header"] if parents else None
+            prof["weight"] = prof["cycles_per_iter"] * LOOP_TRIP_GUESS ** prof["depth"]
+
+        ranked = sorted(loop_profiles, key=lambda prof: (-prof["weight"], prof["header"]))
+        for rank, prof in enumerate(ranked):
+            prof["hot"] = rank < HOT_LOOPS
+
+        num_edges = sum(len(succs) for _, succs, _ in self.blocks.values())
+        est_cycles = 0
+        for start, (end, _, _) in self.blocks.items():
+            depth = sum(1 for loop in self.loops.values() if start in loop["body"])
+            penalty = JUMP_PENALTY if self.ops[end - 1] in ("JMP", "CALL", "JR") else 0
+            est_cycles += (end - start + penalty) * LOOP_TRIP_GUESS ** depth
+        self.profile = {
+            "source": self.src_name,
+            "clk_ns": self.clk_ns,
+            "data_mem_ns": DATA_MEM_NS,
+            "jump_penalty": JUMP_PENALTY,
+            "loop_trip_guess": LOOP_TRIP_GUESS,
+            "program": {
+                "insts": len(self.ops),
+                "nop_slots": sum(1 for op in self.ops if op == "NOP"),
+                "mix": get_mix(self.parts),
+                "blocks": len(self.blocks),
+                "edges": num_edges,
+                "loops": len(loop_profiles),
+                "est_cycles": est_cycles,
+                "functions": [
+                    {"entry": entry, "label": self.get_label(entry), "cycles": self.get_func_cost(entry)}
+                    for entry in self.func_entries if entry != 0
+                ],
+            },
+            "blocks": [
+                {"start": start, "end": end - 1, "labels": self.symbols.get_labels(start), "succs": sorted(succs), "calls": calls}
+                for start, (end, succs, calls) in sorted(self.blocks.items())
+            ],
+            "loops": sorted(loop_profiles, key=lambda prof: prof["header"]),
+            "hot_loops": [prof["label"] for prof in ranked[:HOT_LOOPS]],
+        }
+
+
+    def getProfile(self) -> dict:
+        return self.profile
+
+
+    def getSummaryLines(self) -> list:
+        prog = self.profile["program"]
+        lines = [
+            f"{prog['insts']} insts ({prog['nop_slots']} NOP), {prog['blocks']} blocks, {prog['loops']} loops, "
+            f"{len(prog['functions'])} functions",
+            f"Loop{' ' * 20}| Depth | Slots | NOPs | Mem | Cycles/iter | ns/iter | RNS/int",
+        ]
+        for prof in sorted(self.profile["loops"], key=lambda prof: -prof["weight"]):
+            name = ("* " if prof["hot"] else "  ") + prof["label"]
+            lines.append(
+                f"{name + (24 - len(name)) * ' '}| {prof['depth']}\t| {prof['slots']}\t| {prof['nop_slots']}\t| "
+                f"{prof['mem_ops']}\t| {prof['cycles_per_iter']}\t      | {prof['ns_per_iter']}\t| {prof['mix']['rns']}/{prof['mix']['int']}"
+            )
+        return lines
+
+
+    def __init__(self, prog: dict, symbols, src_name: str = None, clk_ns: int = CLK_NS):
+        '''
+        Taking an ASMtoBin program (ASMtoBin.getProg()) and its SymbolTable, build the CFG, find the loops
+        and cost them. The profile (JSON-ready) can be obtained with ASMProfile.getProfile().
+        '''
+        self.src_name = src_name
+        self.clk_ns = clk_ns
+        self.symbols = symbols
+        self.parts = [split_inst(prog[addr][1]) for addr in sorted(prog.keys())]
+        self.ops = [parts[0].upper() for parts in self.parts]
+        self.targets = {
+            addr: int(prog[addr][0], 16) & 0x3FF
+            for addr, op in enumerate(self.ops) if op in J_type_opcodes and op != "JR"
+        }
+        self.func_costs = {}
+
+        self.find_blocks()
+        self.find_dominators()
+        self.find_loops()
+        self.build_profile()
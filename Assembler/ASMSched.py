@@ -0,0 +1,251 @@
+"""
+Hazard-aware NOP scheduling for RISC-RNS assembly.
+
+The hand-written programs pad every jump with NOPs, following the README rule. The RTL does not need that:
+a taken jump squashes the three slots behind it, and a jump that is not taken just runs them, so code in a
+jump's shadow already behaves as if it ran in order. ASMSched removes every NOP from the source and then puts
+back only the ones that the pipeline (PL_IFID / PL_EX / ctrl_CallRetStack) needs:
+    - RLOAD: the ID and EX bypasses are disabled for loads, so an RLOAD needs its address registers to be
+      written at least 3 slots earlier. If an independent instruction from later in the same block can be
+      hoisted into the gap, it is used there instead of a NOP.
+    - CALL / JR: the call stack pushes/pops in ID and ignores squashing (JR never checks it, CALL only in the
+      2nd shadow slot), so a CALL/JR needs to be more than 3 slots behind the last jump.
+    - A jump as the first instruction at a jump target or return address is ignored, because the
+      slot in MEMWB is the squashed one. A NOP goes in front of it.
+    - Instruction 0 issues twice out of reset, so a NOP goes in front of it unless it is idempotent.
+A jump's shadow is not a delay slot: when the jump is taken, anything moved into the shadow is squashed.
+So the pass does not move instructions across jumps. It only fills the load gaps above.
+Conditional jumps only see flags from the 2 slots ahead of them (JMPC: the carry from exactly 2 slots ahead).
+Removing NOPs in front of a jump can change which flag producers it sees, so NOPs go back in until it sees the
+same ones as in the source (e.g. 'ADD; NOP; JMPC' keeps its NOP). A jump whose flags come from further back than
+ctrl_BranchPred can see is left alone and reported in ASMSched.warnings.
+"""
+from typing import Iterable
+
+from ASMtoV import J_type_opcodes, split_inst, get_inst_regs
+
+COND_JUMPS = ("JMPGT", "JMPLT", "JMPEQ", "JMPC")
+UNCOND_JUMPS = ("JMP", "CALL", "JR")
+STACK_OPS = ("CALL", "JR")
+CARRY_OPS = ("ADD", "SUB", "SHL")
+MEM_OPS = ("RLOAD", "RSTORE")
+IO_OPS = ("INPUT", "OUTPUT")
+
+RLOAD_GAP = 3 # writer -> RLOAD distance with both bypasses off
+JUMP_SHADOW = 3 # slots fetched + decoded behind a jump before it resolves
+
+
+class SchedInst:
+    """
+    One instruction of the source: its text (comments removed), split parts, and the registers it writes and reads.
+    """
+    __slots__ = ("text", "parts", "op", "defs", "uses")
+
+    def __init__(self, text: str):
+        self.text = text
+        self.parts = split_inst(text)
+        self.op = self.parts[0].upper()
+        self.defs, self.uses = get_inst_regs(self.parts)
+
+
+def read_asm_lines(lines: Iterable[str]) -> list:
+    """
+    Strip whitespace/comments the same way ASMtoBin.rm_labels_comments does.
+    Returns a list of ('label', <NAME>) / ('inst', <text>) tuples.
+    """
+    items = []
+    for inst_line in lines:
+        inst_line = inst_line.split('#', 1)[0].strip()
+        if not inst_line:
+            continue
+        if inst_line.endswith(':'):
+            items.append(('label', inst_line[:-1].strip().upper()))
+        else:
+            items.append(('inst', inst_line))
+    return items
+
+
+class ASMSched:
+    def is_idempotent(self, inst: SchedInst) -> bool:
+        """
+        True if issuing inst twice in a row (as instruction 0 is out of reset) has the same effect as issuing it once.
+        """
+        if inst.op in IO_OPS or inst.op in STACK_OPS:
+            return False
+        return not (inst.defs & inst.uses)
+
+
+    def get_hazard(self, inst: SchedInst, block_start: bool) -> bool:
+        """
+        True if inst can't be issued in the next slot.
+        """
+        if not self.out_insts:
+            return not self.is_idempotent(inst)
+
+        if inst.op in J_type_opcodes and block_start:
+            return True
+
+        if inst.op in STACK_OPS and any(prev.op in J_type_opcodes for prev in self.out_insts[-JUMP_SHADOW:]):
+            return True
+
+        if inst.op == "RLOAD":
+            for prev in self.data_hist[-(RLOAD_GAP - 1):]:
+                if prev.defs & inst.uses:
+                    return True
+
+        if inst.op in COND_JUMPS:
+            src_seen = self.src_flags.get(id(inst), set())
+            window = self.out_insts[-2:][::-1]
+            if any(id(prev) not in src_seen for prev in self.get_flag_producers(inst, window)):
+                return True # a producer the jump didn't see in the source; push it out of view
+            if inst.op == "JMPC" and window and id(window[0]) in src_seen:
+                return True # the carry producer is 1 slot ahead, it has to be 2
+        return False
+
+
+    def get_flag_producers(self, jump: SchedInst, window: list) -> list:
+        """
+        The instructions a conditional jump reads its flags from, given the slots in front of it (nearest first).
+        """
+        if jump.op == "JMPC":
+            return [inst for inst in window[1:2] if inst.op in CARRY_OPS]
+        return [inst for inst in window[:2] if inst.op == "COMPARE"]
+
+
+    def can_hoist(self, cand: SchedInst, between: list, no_carry: bool) -> bool:
+        """
+        True if cand can move up in front of every instruction in between without changing the result.
+        """
+        if cand.op == "NOP" or cand.op == "COMPARE" or cand.op in J_type_opcodes:
+            return False
+        if no_carry and cand.op in CARRY_OPS:
+            return False
+
+        for inst in between:
+            if cand.uses & inst.defs or cand.defs & inst.uses or cand.defs & inst.defs:
+                return False
+            if cand.op in MEM_OPS and inst.op in MEM_OPS and "RSTORE" in (cand.op, inst.op):
+                return False
+            if cand.op in IO_OPS and inst.op in IO_OPS:
+                return False
+        return True
+
+
+    def find_filler(self, pending: list, no_carry: bool):
+        """
+        Index (in pending) of the first instruction that can be hoisted into the current slot, or None.
+        """
+        for idx in range(1, len(pending)):
+            cand = pending[idx]
+            if cand.op in J_type_opcodes:
+                break
+            if self.can_hoist(cand, pending[:idx], no_carry) and not self.get_hazard(cand, False):
+                return idx
+        return None
+
+
+    def emit(self, inst: SchedInst):
+        self.out_insts.append(inst)
+        self.out_lines.append(inst.text)
+        self.data_hist.append(inst)
+        if inst.op in UNCOND_JUMPS:
+            # only reached through a jump / return, which brings 3 squashed slots along with it
+            self.data_hist = []
+
+
+    def schedule_block(self, labels: list, insts: list, is_target: bool):
+        self.out_lines.extend(f"{label}:" for label in labels)
+
+        no_carry = any(inst.op == "JMPC" for inst in insts)
+        pending = list(insts)
+        block_start = is_target
+        while pending:
+            if not self.get_hazard(pending[0], block_start):
+                self.emit(pending.pop(0))
+            else:
+                filler = None if block_start or not self.out_insts else self.find_filler(pending, no_carry)
+                if filler is not None:
+                    self.emit(pending.pop(filler))
+                    self.slots_filled += 1
+                else:
+                    self.emit(SchedInst("NOP"))
+                    self.nops_inserted += 1
+            block_start = False
+
+
+    def check_flags(self):
+        """
+        Warn about conditional jumps whose flags come from further back than ctrl_BranchPred can see.
+        """
+        for addr, inst in enumerate(self.out_insts):
+            if inst.op not in COND_JUMPS:
+                continue
+            if inst.op == "JMPC":
+                ok = addr >= 2 and self.out_insts[addr - 2].op in CARRY_OPS
+            else:
+                ok = any(prev.op == "COMPARE" for prev in self.out_insts[max(addr - 2, 0):addr])
+            if not ok:
+                self.warnings.append(f"{addr}: '{inst.text}' has no flag producer in the slot(s) ctrl_BranchPred sees")
+            else:
+                window = self.out_insts[max(addr - 2, 0):addr][::-1]
+                seen = {id(prev) for prev in self.get_flag_producers(inst, window)}
+                if seen != self.src_flags.get(id(inst), set()):
+                    self.warnings.append(f"{addr}: '{inst.text}' sees different flags than in the source")
+
+
+    def getLines(self) -> list:
+        return self.out_lines
+
+
+    def __init__(self, lines: Iterable[str]):
+        '''
+        Taking the lines of an ASM source, drop all NOPs and re-insert only those the pipeline needs.
+        The scheduled source (labels + instructions, no comments) can be obtained with ASMSched.getLines(),
+        and fed to ASMtoBin through an io.StringIO.
+        '''
+        self.out_lines = []
+        self.out_insts = []
+        self.data_hist = []
+        self.nops_removed = 0
+        self.nops_inserted = 0
+        self.slots_filled = 0
+        self.warnings = []
+        self.src_flags = {} # id(conditional jump) -> ids of the flag producers it sees in the source
+
+        items = read_asm_lines(lines)
+        targets = set()
+        for kind, text in items:
+            if kind == 'inst':
+                parts = split_inst(text)
+                if parts[0].upper() in J_type_opcodes and len(parts) > 1:
+                    targets.add(parts[1].upper())
+
+        # basic blocks: [labels, insts, is_target]. A block starts at a label or after a jump.
+        blocks = [[[], [], False]]
+        src_window = [] # the last 2 source instructions, NOPs included, nearest first
+        for kind, text in items:
+            cur = blocks[-1]
+            if kind == 'label':
+                if cur[1]:
+                    blocks.append([[], [], False])
+                    cur = blocks[-1]
+                cur[0].append(text)
+                cur[2] = cur[2] or text in targets
+                continue
+
+            inst = SchedInst(text)
+            if inst.op in COND_JUMPS:
+                self.src_flags[id(inst)] = {id(prev) for prev in self.get_flag_producers(inst, src_window)}
+            src_window = [inst] + src_window[:1]
+            if inst.op == "NOP":
+                self.nops_removed += 1
+                continue
+            cur[1].append(inst)
+            if inst.op in J_type_opcodes:
+                # the slot after a CALL is its return address
+                blocks.append([[], [], inst.op == "CALL"])
+
+        for labels, insts, is_target in blocks:
+            self.schedule_block(labels, insts, is_target)
+
+        self.check_flags()
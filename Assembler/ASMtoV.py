@@ -1,7 +1,10 @@
 import sys
+import io
 from typing import TextIO
 from math import floor
 
+from ASMMacro import ASMMacro, has_directives
+
 J_type_opcodes = {
     "JMP": "00111", # 'jump to return address' will be 
     "JMPGT": "01110",
@@ -36,6 +39,77 @@ I_type_opcodes = {
     "OUTPUT": "11010",
     "INPUT": "11011"
 }
+# J-type opcodes (as ints) that take a label; JR's address field is unused
+LABEL_J_OPCODES = {int(opcode, 2) for inst, opcode in J_type_opcodes.items() if inst != "JR"}
+RNS_dest_insts = ("ADDM", "SUBM", "MULM", "RLLM")
+
+
+def split_inst(instruction: str) -> list:
+    """
+    Split an instruction into [mnemonic, operand, ...], the same way ASMtoBin.get_inst_bin does.
+    """
+    return [part.strip() for part in instruction.replace(',', ' ').split()]
+
+
+def get_inst_regs(parts: list) -> tuple:
+    """
+    Registers an instruction (as split by split_inst) writes and reads, as sets of upper-case names ('X3', 'M0').
+    The destination domain is set by the opcode, like the hardware does, not by the prefix written in the source.
+    """
+    op = parts[0].upper()
+    regs = [part.upper() for part in parts[1:]]
+    defs, uses = set(), set()
+
+    if op in J_type_opcodes or op == "NOP":
+        pass
+    elif op == "LDI" or op == "INPUT":
+        defs.add(f"X{regs[0][1:]}")
+    elif op == "OUTPUT":
+        uses.add(f"X{regs[0][1:]}")
+    elif op == "COMPARE":
+        uses.update(regs[0:2])
+    elif op in ("UNRLL", "UNRLU"):
+        uses.add(regs[1])
+        if regs[1].startswith('M'): # UNRLx only writes back for a mod-domain source
+            defs.add(f"X{regs[0][1:]}")
+    elif op == "RSTORE":
+        uses.update((f"X{regs[0][1:]}", regs[1], regs[2]))
+    else:
+        defs.add(f"{'M' if op in RNS_dest_insts else 'X'}{regs[0][1:]}")
+        uses.update(regs[1:3])
+    return defs, uses
+
+class SymbolTable:
+    def define(self, label: str, addr: int, line: int) -> bool:
+        """
+        Define label at instruction address addr. The first definition of a label wins, as it always has;
+        returns False for a redefinition.
+        """
+        if label in self.by_name:
+            return False
+        self.by_name[label] = addr
+        self.lines[label] = line
+        self.by_addr.setdefault(addr, []).append(label)
+        return True
+
+
+    def get_addr(self, label: str):
+        return self.by_name.get(label, None)
+
+
+    def get_labels(self, addr: int) -> list:
+        return self.by_addr.get(addr, [])
+
+
+    def __init__(self):
+        '''
+        Labels of one program, indexed by name (-> address) and by address (-> labels, in definition order).
+        '''
+        self.by_name = {}
+        self.by_addr = {}
+        self.lines = {} # label -> source line index it was defined on
+
+
 
 class ASMtoBin:
     def get_opcode(self, operation: str) -> str:
@@ -81,10 +155,14 @@ class ASMtoBin:
         destreg = self.get_reg_bin(instruction[1], src_reg=False)
         
         if instruction[2].startswith("0x"):
-            imm = bin(int(instruction[2][2:], 16))[2:].zfill(8)
+            imm_val = int(instruction[2][2:], 16)
         elif instruction[2].isdigit():
-            imm = bin(int(instruction[2])).zfill(8)
-        
+            imm_val = int(instruction[2])
+        else:
+            raise ValueError(f"Immediate value must be decimal or 0x.. hex: {instruction}")
+        if imm_val > 0xFF:
+            raise ValueError(f"Immediate value does not fit in 8 bits: {instruction}")
+        imm = bin(imm_val)[2:].zfill(8)
         
         return f"{opcode}{destreg}{imm}"
 
@@ -104,11 +182,12 @@ class ASMtoBin:
             else:
                 raise ValueError(f"Error for instruction: {instruction}.\nInst JR must have RA as target.")
         else:
-            addr = self.label_addresses.get(j_targ, None)[0]
-        
-        if addr is None:
-            raise ValueError(f"Label '{j_targ}' not defined before use.")
-
+            targ_addr = self.symbols.get_addr(j_targ)
+            if targ_addr is None:
+                # forward reference, patched in resolve_fixups() once every label is known
+                self.fixups.append((len(self.bin_prog), j_targ, self.cur_line))
+                targ_addr = 0
+            addr = bin(targ_addr)[2:].zfill(10)
 
         return f"{opcode}0{addr}"
 
@@ -141,8 +220,7 @@ class ASMtoBin:
         """
         Converts an instruction to its binary (hexadecimal) representation.
         """
-        instruction = instruction.replace(',', ' ')
-        parts = [part.strip() for part in instruction.split()]
+        parts = split_inst(instruction)
         
         if parts[0].upper() == "NOP":
             return "0000000000000000", 'N'
@@ -166,8 +244,47 @@ class ASMtoBin:
         return (inst, ityp)
     
     
+    def add_inst(self, inst_line: str, index: int):
+        """
+        Encode one instruction at the next address. Jumps to labels that aren't defined yet get a fixup.
+        """
+        addr = len(self.bin_prog)
+        self.cur_line = index
+        (bin_line, ityp) = self.get_inst_bin(inst_line, index)
+
+        targ_labels = self.symbols.get_labels(addr)
+        targ_label = targ_labels[0] if targ_labels else None
+
+        self.bin_prog.append(bin_line)
+        self.prog[addr] = [self.get_hex_instr(bin_line), inst_line, targ_label]
+
+
+    def resolve_fixups(self):
+        """
+        Patch the jump addresses of forward references, now that every label has been seen.
+        """
+        for addr, label, index in self.fixups:
+            targ_addr = self.symbols.get_addr(label)
+            if targ_addr is None:
+                line = self.line_map[index][1] if self.line_map else index # the line it was written on, before expansion
+                raise ValueError(f"Line {line + 1}: label '{label}' is not defined ({self.prog[addr][1]})")
+            bin_line = self.bin_prog[addr][:6] + bin(targ_addr)[2:].zfill(10)
+            self.bin_prog[addr] = bin_line
+            self.prog[addr][0] = self.get_hex_instr(bin_line)
+            self.print_jumps[index][2] = bin_line[6:]
+        self.fixups = []
+
+
     def rm_labels_comments(self):
-        for index, inst_line in enumerate(self.fileobj.readlines()):
+        """
+        Single pass over the source: strip comments / whitespace, define labels, and encode instructions as they come.
+        """
+        src_lines = self.fileobj.readlines()
+        if has_directives(src_lines):
+            macro = ASMMacro(src_lines)
+            src_lines = macro.getLines()
+            self.line_map = macro.line_map
+        for index, inst_line in enumerate(src_lines):
             inst_line = inst_line.strip()
             # Here, we're checking for labels and storing their addresses
             if not inst_line:
@@ -177,35 +294,25 @@ class ASMtoBin:
                 self.num_invalid += 1
                 continue
             elif ('#' in inst_line):
-                found_comment = False
-                comment_start = 0
-                for i, char in enumerate(inst_line):
-                    if char == '#':
-                        found_comment = True
-                        comment_start = i
-                        break
-                if found_comment:
-                    inst_line = inst_line[:comment_start].strip()
-                    if not inst_line: # just for safety
-                        continue
+                inst_line = inst_line[:inst_line.index('#')].strip()
+                if not inst_line: # just for safety
+                    continue
             #now removed all comments and whitespace, check for labels / split instructions
             
-            if inst_line.strip().endswith(':'):
+            addr_int = len(self.bin_prog)
+            addr = bin(addr_int)[2:].zfill(10)
+            if inst_line.endswith(':'):
                 self.label_lines.append((index, inst_line))
-                label = inst_line.strip()[:-1].upper()
+                label = inst_line[:-1].upper()
                 self.num_labels += 1
-                addr = bin(index + 1 - self.num_labels - self.num_invalid)[2:].zfill(10)
-                
-                
-                self.print_jumps[index] = [addr, inst_line.strip().upper(), None]
+                self.print_jumps[index] = [addr, inst_line.upper(), None]
                 
-                if label not in self.label_addresses:
-                    self.label_addresses[label] = (addr, index + 1 - self.num_labels - self.num_invalid)
+                if self.symbols.define(label, addr_int, index):
+                    self.label_addresses[label] = (addr, addr_int)
             else:
-                addr = bin(index - self.num_labels - self.num_invalid)[2:].zfill(10)
                 self.print_jumps[index] = [addr, inst_line, None]
-                
                 self.file_lines.append((inst_line, index)) # to maintain the original line numbers
+                self.add_inst(inst_line, index)
     
     
     def getProg(self) -> list:
@@ -229,24 +336,16 @@ class ASMtoBin:
         self.label_lines = []
         self.num_labels = 0
         self.num_invalid = 0 #number of lines in og file that are either whitespace or comments
-        self.label_addresses = {}
+        self.label_addresses = {} # {<LABEL>: (<10b addr str>, <addr int>)}, kept in sync with self.symbols
+        self.symbols = SymbolTable()
+        self.fixups = [] # (<inst addr>, <label>, <source line index>) for jumps to labels defined further down
+        self.line_map = None # ASMMacro.line_map if the source used .equ / .macro / .rept; indices below are after expansion
+        self.cur_line = 0
         self.prog = {} # {<isnt addr (int): [<hex>, <text_inst>, <label>]}
         self.bin_prog = []
         
         self.rm_labels_comments()
-        
-        for newidx in range(0, len(self.file_lines)):
-            (inst_line, index) = self.file_lines[newidx]
-            (bin_line, ityp) = self.get_inst_bin(inst_line, index)
-
-            targ_label = [label for label in self.label_addresses.keys() if self.label_addresses[label][1] == newidx]
-            targ_label = targ_label[0] if len(targ_label) else None
-                
-            
-            self.bin_prog.append(bin_line)
-            hex_line = self.get_hex_instr(bin_line)
-            
-            self.prog[newidx] = [hex_line, inst_line, targ_label]
+        self.resolve_fixups()
             
         self.fileobj.close()
         
@@ -279,12 +378,9 @@ class BinToV:
             
             case_line = str(case_line + f" - Jump target for label: {targ_label}") if targ_label else case_line
 
-            if len([key for key in J_type_opcodes.keys() if key in text_inst and key != "JR"]):
-                dest_label = text_inst.split()[-1].strip().upper()
-                dest_addr = self.label_addresses.get(dest_label, None)
-                if dest_addr is None:
-                    raise ValueError(f"Label '{dest_label}' not found for instruction {text_inst}. Error from label_addresses in BinToV.getCaseStatement()")
-                case_line += f" ###Target address is bin {dest_addr[0]}"
+            word = int(hex_inst, 16)
+            if (word >> 11) in LABEL_J_OPCODES:
+                case_line += f" ###Target address is bin {format(word & 0x3FF, '010b')}"
                 
             
             self.case_lines.append(case_line)
@@ -303,6 +399,66 @@ class BinToV:
         return self.case_lines
         
         
+    def getMemLines(self) -> list:
+        """
+        Get the lines of a $readmemh file: one 16-bit hex word per instruction, starting at address 0.
+        Addresses past the end of the program aren't listed, the readmemh wrapper zero-fills them (NOP).
+        """
+        mem_lines = []
+        for instAddr in self.prog.keys():
+            [hex_inst, text_inst, targ_label] = self.prog[instAddr]
+            mem_line = f"{hex_inst} // {hexToInt(instAddr, self.max_int_val, self.hex_addr_len)}: {text_inst}"
+            mem_lines.append(str(mem_line + f" - Jump target for label: {targ_label}") if targ_label else mem_line)
+        return mem_lines
+
+
+    def getCoeLines(self) -> list:
+        """
+        Get the lines of a Xilinx .coe file for a Block Memory Generator ROM, 16 bits wide and 2**prog_ctr_wid deep.
+        Unlisted addresses take the IP's default data (0, NOP).
+        """
+        coe_lines = [
+            f"; Instruction memory init for source program {self.in_file_name}, generated by ASMtoV.py",
+            f"; Block Memory Generator: Single Port ROM, width 16, depth {self.max_int_val}",
+            f"memory_initialization_radix=16;",
+            f"memory_initialization_vector="
+        ]
+        hex_insts = [self.prog[instAddr][0] for instAddr in self.prog.keys()] or ["0000"]
+        coe_lines.extend(f"{hex_inst}," for hex_inst in hex_insts[:-1])
+        coe_lines.append(f"{hex_insts[-1]};")
+        return coe_lines
+
+
+    def getReadmemhVerilogLines(self, mem_file_name: str) -> list:
+        """
+        Get the lines of an Instr_Mem that infers a block RAM initialized from mem_file_name,
+        in place of the case statement. Same ports and the same 1-cycle registered read.
+        """
+        verilog_lines = [
+            f"/*",
+            f"\tInstruction memory module for source program {self.in_file_name}",
+            f"\tGenerated by ASMtoV.py - instructions are loaded from {mem_file_name} with $readmemh",
+            f"*/",
+            f"module Instr_Mem #(parameter PROG_CTR_WID = {self.prog_ctr_wid}, MEM_FILE = \"{mem_file_name}\") (",
+            f"\tinput clk,",
+            f"\tinput [PROG_CTR_WID-1:0] prog_ctr,",
+            f"\toutput reg [15:0] instr_mem_out",
+            f");",
+            f"(* rom_style = \"block\" *) reg [15:0] mem [0:2**PROG_CTR_WID-1];",
+            f"integer i;",
+            f"initial begin",
+            f"\tfor (i = 0; i < 2**PROG_CTR_WID; i = i + 1)",
+            f"\t\tmem[i] = 16'h0000;",
+            f"\t$readmemh(MEM_FILE, mem);",
+            f"end",
+            f"always @(posedge clk) begin",
+            f"\tinstr_mem_out <= mem[prog_ctr];",
+            f"end",
+        ]
+        verilog_lines.extend(self.footer)
+        return verilog_lines
+
+
     def getVerilogLines(self) ->list:
         """
         Get a list of the lines for the verilog file.
@@ -337,6 +493,7 @@ class BinToV:
         
         self.prog_ctr_wid = prog_ctr_wid
         self.prog = prog
+        self.in_file_name = in_file_name
 
         self.header = [
             f"/*",
@@ -376,7 +533,31 @@ if __name__ == "__main__":
         \033[32m--hex_file_out <dest_file>\033[0\n
         \tOutput hex-encoded instructions to a file.
         \033[32m--print_jumps\033[0\n
-        \tPrint instructions, bin encoding, jump targ addressses + label locations
+        \tPrint instructions, bin encoding, jump targ addressses + label locations.
+        \tLines expanded from a .macro / .rept (see ASMMacro.py) are numbered <original line>/<line in the body>.
+        \033[32m--mem_file_out <dest_file.mem>\033[0\n
+        \tWrite the program as a $readmemh file, and make <output_verilog_file> a block-RAM Instr_Mem that loads it
+        \tinstead of a case statement. Add the .mem to the Vivado project; a program change then only updates the init file.
+        \033[32m--coe_file_out <dest_file.coe>\033[0\n
+        \tWrite the program as a .coe for a Block Memory Generator ROM (16 bits x 2**pc_wid)
+        \033[32m--schedule\033[0\n
+        \tDrop hand-written NOPs and insert only those the pipeline needs (see ASMSched.py).
+        \tLine numbers printed by the other options then refer to the scheduled source.
+        \033[32m--inline\033[0\n
+        \tInline small leaf subroutines at their CALL sites (see ASMInline.py). Runs before all other passes.
+        \033[32m--inline_max <n>\033[0\n
+        \tLargest subroutine --inline inlines, in non-NOP instructions (default: 8)
+        \033[32m--optimize\033[0\n
+        \tRun the peephole pass (see ASMPeep.py) before scheduling / encoding: jump chains, redundant LDIs / COMPAREs,
+        \tdead instructions. Line numbers printed by the other options then refer to the optimized source.
+        \033[32m--layout\033[0\n
+        \tReorder basic blocks so the likely path falls through (see ASMLayout.py). Runs after --optimize, before --schedule.
+        \033[32m--layout_profile <report.json>\033[0\n
+        \tUse a PipelineSim.py --report_out report for --layout instead of the static heuristics. The report must come
+        \tfrom this same source, as assembled with the same --optimize setting and without --layout / --schedule.
+        \033[32m--profile <dest_file.json || 'print'>\033[0\n
+        \tWrite a static profile (CFG, loops, per-loop cycle cost, instruction mix) as JSON (see ASMProfile.py),
+        \tand print the loop summary. 'print' dumps the JSON to the console instead.
         """)
         sys.exit(1)
     
@@ -402,6 +583,15 @@ if __name__ == "__main__":
     bin_fout = None
     hex_fout = None
     print_jumps = False
+    schedule = False
+    optimize = False
+    inline = False
+    inline_max = None
+    layout = False
+    layout_profile = None
+    mem_fout = None
+    coe_fout = None
+    profile_out = None
 
     if (len(sys.argv) > 3):
         if ("--pc_wid" in sys.argv):
@@ -423,19 +613,155 @@ if __name__ == "__main__":
         if ("--print_jumps" in sys.argv):
             print_jumps = True
 
+        if ("--schedule" in sys.argv):
+            schedule = True
+
+        if ("--optimize" in sys.argv):
+            optimize = True
+
+        if ("--inline" in sys.argv):
+            inline = True
+
+        if ("--inline_max" in sys.argv):
+            argidx = sys.argv.index("--inline_max")
+            inline = True
+            inline_max = int(sys.argv[argidx + 1])
+
+        if ("--layout" in sys.argv):
+            layout = True
+
+        if ("--layout_profile" in sys.argv):
+            argidx = sys.argv.index("--layout_profile")
+            layout = True
+            layout_profile = sys.argv[argidx + 1]
+
+        if ("--mem_file_out" in sys.argv):
+            argidx = sys.argv.index("--mem_file_out")
+            mem_fout = open(sys.argv[argidx + 1], 'w')
+
+        if ("--coe_file_out" in sys.argv):
+            argidx = sys.argv.index("--coe_file_out")
+            coe_fout = open(sys.argv[argidx + 1], 'w')
+
+        if ("--profile" in sys.argv):
+            argidx = sys.argv.index("--profile")
+            profile_out = sys.argv[argidx + 1]
+
         #can add handling for other options here later
     
-    asm_to_bin = ASMtoBin(source_file)
+    from ASMInline import ASMInline, check_call_depth, INLINE_MAX_INSTS
+    src_lines = source_file.readlines()
+    source_file.close()
+    line_map = None # expanded line -> (original line, line in the macro / .rept body), while line numbers are still the expansion's
+    if has_directives(src_lines):
+        try:
+            macro = ASMMacro(src_lines)
+        except ValueError as e:
+            print(f"\033[1;31mError: {e}\033[0m")
+            sys.exit(1)
+        src_lines = macro.getLines()
+        if not (inline or optimize or layout or schedule):
+            line_map = macro.line_map
+        print(f"\033[1;32mExpanded: {macro.num_macro_calls} macro calls, {macro.num_repts} .rept iterations, {len(macro.equs)} constants\033[0m")
+    if inline:
+        from ASMProfile import get_est_cycles
+        inl = ASMInline(src_lines, inline_max or INLINE_MAX_INSTS)
+        saved_cycles = get_est_cycles(src_lines) - get_est_cycles(inl.getLines())
+        src_lines = inl.getLines()
+        print(f"\033[1;32mInlined: {sum(inl.inlined.values())} CALL sites of {len(inl.inlined)} subroutines, {len(inl.removed)} subroutines removed\033[0m")
+        print(f"\033[1;32m~{saved_cycles} estimated cycles saved (see ASMProfile.py)\033[0m")
+    source_file = io.StringIO('\n'.join(line.rstrip('\n') for line in src_lines))
+
+    if optimize:
+        from ASMPeep import ASMPeep
+        from ASMProfile import get_est_cycles
+        src_lines = source_file.readlines()
+        source_file.close()
+        peep = ASMPeep(src_lines)
+        saved_cycles = get_est_cycles(src_lines) - get_est_cycles(peep.getLines())
+        source_file = io.StringIO('\n'.join(peep.getLines()))
+        print(
+            f"\033[1;32mOptimized: {peep.num_killed['ldi']} redundant LDIs, {peep.num_killed['compare']} redundant COMPAREs, "
+            f"{peep.num_killed['dead']} dead instructions, {peep.jumps_retargeted} jump chains folded\033[0m"
+        )
+        print(f"\033[1;32m{peep.slots_removed} instruction slots saved, ~{saved_cycles} estimated cycles (see ASMProfile.py)\033[0m")
+
+    if layout:
+        from ASMLayout import ASMLayout, load_profile
+        from ASMProfile import get_est_cycles
+        src_lines = source_file.readlines()
+        source_file.close()
+        try:
+            lay = ASMLayout(src_lines, load_profile(layout_profile) if layout_profile else None)
+        except (OSError, ValueError) as e:
+            print(f"\033[1;31mError: {e}\033[0m")
+            sys.exit(1)
+        source_file = io.StringIO('\n'.join(lay.getLines()))
+        print(f"\033[1;32mLayout: {lay.branches_inverted} branches inverted, {lay.jumps_removed} JMPs removed, {lay.jumps_added} added\033[0m")
+        if not layout_profile:
+            # the static estimate uses the same heuristics as the pass; with a profile, measure with PipelineSim instead
+            saved_cycles = get_est_cycles(src_lines) - get_est_cycles(lay.getLines())
+            print(f"\033[1;32m~{saved_cycles} estimated cycles saved (see ASMProfile.py)\033[0m")
+
+    if schedule:
+        from ASMSched import ASMSched
+        sched = ASMSched(source_file.readlines())
+        source_file.close()
+        source_file = io.StringIO('\n'.join(sched.getLines()))
+        print(f"\033[1;32mScheduled: {sched.nops_removed} NOPs removed, {sched.nops_inserted} inserted, {sched.slots_filled} load slots filled\033[0m")
+        for warning in sched.warnings:
+            print(f"\033[1;33mWarning: {warning}\033[0m")
+
+    src_lines = source_file.readlines()
+    try:
+        check_call_depth(src_lines)
+    except ValueError as e:
+        print(f"\033[1;31mError: {e}\033[0m")
+        sys.exit(1)
+    asm_to_bin = ASMtoBin(io.StringIO(''.join(src_lines)))
     label_addresses = asm_to_bin.label_addresses
     prog = asm_to_bin.getProg()
     
     bin_to_v = BinToV(src_fname, prog, label_addresses, prog_ctr_wid=pc_width)
-    verilog_module_lines = bin_to_v.getVerilogLines()
+    if mem_fout:
+        mem_fname = mem_fout.name.replace('\\', '/').split('/')[-1]
+        mem_fout.writelines([line + '\n' for line in bin_to_v.getMemLines()])
+        mem_fout.close()
+        print(f"\033[1;32m$readmemh file written to {mem_fout.name}\033[0m")
+        verilog_module_lines = bin_to_v.getReadmemhVerilogLines(mem_fname)
+    else:
+        verilog_module_lines = bin_to_v.getVerilogLines()
     
     dest_file.writelines([line + '\n' for line in verilog_module_lines])
     dest_file.close()
     print(f"\033[1;32mVerilog module written to {sys.argv[2]}\033[0m")
+
+    if coe_fout:
+        coe_fout.writelines([line + '\n' for line in bin_to_v.getCoeLines()])
+        coe_fout.close()
+        print(f"\033[1;32m.coe file written to {coe_fout.name}\033[0m")
+
+    if profile_out:
+        import json
+        from ASMProfile import ASMProfile
+        profile = ASMProfile(prog, asm_to_bin.symbols, src_fname)
+        if profile_out == "print":
+            print(json.dumps(profile.getProfile(), indent=1, sort_keys=True))
+        else:
+            with open(profile_out, 'w') as profile_fout:
+                json.dump(profile.getProfile(), profile_fout, indent=1, sort_keys=True)
+            print(f"\033[1;32mStatic profile written to {profile_out}\033[0m")
+        print("\n".join(profile.getSummaryLines()))
     
+    def get_line_num(index: int) -> str:
+        """
+        Original line of an expanded line; '<line>/<body line>' for lines that came from a macro / .rept body.
+        """
+        if line_map is None:
+            return f"{index}"
+        site, body = line_map[index]
+        return f"{site}" if site == body else f"{site}/{body}"
+
     if print_bin:
         og_insts = [
             (
@@ -449,7 +775,7 @@ if __name__ == "__main__":
         
         print(f"\n\033[1;32mLine Num | Original Instruction | Hex Addr | Binary instruction\033[0m")
         [
-            print(f"{line_num}\t | {og_inst} | 10'h{inst_addr}  | {bin_inst}") 
+            print(f"{get_line_num(line_num)}\t | {og_inst} | 10'h{inst_addr}  | {bin_inst}") 
             for ((og_inst, line_num), bin_inst, inst_addr) 
             in zip(og_insts, bin_prog, hex_addr_gen)
         ]
@@ -479,7 +805,7 @@ if __name__ == "__main__":
         for index in asm_to_bin.print_jumps.keys():
             addr, inst_line, j_targ = asm_to_bin.print_jumps[index]
             
-            out_str = f"{index}\t |"
+            out_str = f"{get_line_num(index)}\t |"
             
             line_str = f"{inst_line + (23 - len(inst_line)) * ' '}"
             
@@ -0,0 +1,351 @@
+"""
+Block-translating engine for the RISC-RNS instruction-set simulator.
+
+BlockSim is an ISASim that doesn't interpret one word at a time. Instruction memory is cut into translation units.
+Each unit is compiled once into a specialized Python function, cached by its entry address, and called from
+then on. Architectural results (registers, memory, UART, flags, steps, halt reason) are identical to ISASim.
+    - A unit starts at the address control arrives at (a label / jump target / return address / fall-through) and
+      follows the path straight through it. Conditional jumps become side exits, taken only if their flags say so.
+      JMP / CALL targets that aren't covered yet are translated inline, and a JR whose return address is one of
+      the unit's own CALL sites continues in place. So each unit is a trace of extended basic blocks.
+    - Register indices, immediates, ports, jump targets and moduli are constants in the generated code.
+      The compare/carry history ctrl_BranchPred sees is resolved at translation time, so a conditional jump tests
+      the one or two flag values that can reach it (or is dropped if none can), and a COMPARE right in front of
+      its jump is folded into the test. Flags / carries nothing reads are not computed. NOPs generate no code.
+    - A jump back to the unit's own entry becomes a loop inside the generated function, so loops like ADD_LOOP or
+      the UART polling loops run without leaving it.
+Units are only re-translated when instruction memory changes: BlockSim.write_instr() drops the units covering
+the written address, and run() flushes everything if the words were changed behind its back.
+"""
+import re
+from typing import Iterable
+
+from ISASim import (
+    ISASim, DEFAULT_MODULI, CALL_STACK_DEPTH, UART_DATA_PORT, UART_RX_PRESENT_PORT,
+    JUMP_OPS, RNS_ALU_OPS, JUMP_COND_FLAG, FLAG_GT, FLAG_LT, FLAG_EQ,
+    OP_ADD, OP_SUB, OP_SHL, OP_COMPARE, OP_MULM, OP_SUBM, OP_LDI, OP_UNRLL, OP_UNRLU, OP_RSTORE, OP_RLOAD,
+    OP_INPUT, OP_OUTPUT, OP_RLLM, OP_AND, OP_OR, OP_NOT, OP_ANDBIT, OP_ORBIT, OP_NOTBIT, OP_JMP, OP_JMPGT, OP_JMPLT, OP_JMPEQ, OP_JMPC, OP_CALL, OP_JR
+)
+
+MAX_UNIT_LEN = 512 # instructions per translation unit
+
+# status codes returned by a unit
+UNIT_OK = 0
+UNIT_RX_WAIT = 1
+UNIT_SELF_LOOP = 2
+UNIT_BUDGET = 3
+
+JUMP_COND_CMP = {OP_JMPGT: '>', OP_JMPLT: '<', OP_JMPEQ: '=='}
+
+
+def get_src8(reg: int) -> str:
+    """
+    Expression for the 8-bit operand value of a 4-bit {domain flag, addr} source field.
+    """
+    return f"(rns[{reg & 7}] & 0xFF)" if reg & 8 else f"regs[{reg & 7}]"
+
+
+def get_src_domain(reg: int, domain: int) -> str:
+    """
+    Expression for the operand a source field gives an RNS domain: its own residue for an RNS reg, the 8-bit value for an int reg.
+    """
+    if not reg & 8:
+        return f"regs[{reg & 7}]"
+    return f"(rns[{reg & 7}] & 0xFF)" if domain == 0 else f"(rns[{reg & 7}] >> {8 * domain} & 0xFF)"
+
+
+def drop_dead_defs(body: list) -> list:
+    """
+    Expand the (var, live lines, dead lines) entries of a unit body, depending on whether any other line reads var.
+    """
+    used = set()
+    for line in body:
+        if isinstance(line, str):
+            used.update(re.findall(r"\b(?:fl|cy)\d+\b", line))
+    lines = []
+    for line in body:
+        if isinstance(line, str):
+            lines.append(line)
+        else:
+            var, live_lines, dead_lines = line
+            lines += live_lines if var in used else dead_lines
+    return lines
+
+
+class BlockSim(ISASim):
+    def get_rns_expr(self, op: int, rs1: int, rs2: int) -> str:
+        terms = []
+        for domain, modulus in enumerate(self.moduli):
+            x = get_src_domain(rs1, domain)
+            y = get_src_domain(rs2, domain)
+            if op == OP_MULM:
+                term = f"({x} * {y}) % {modulus}"
+            elif op == OP_SUBM:
+                term = f"(({x} - {y} + {modulus}) & 0x1FF) % {modulus}"
+            else:
+                term = f"(({x} + {y}) & 0xFF) % {modulus}"
+            terms.append(term if domain == 0 else f"(({term}) << {8 * domain})")
+        return " | ".join(terms)
+
+
+    def get_inst_lines(self, addr: int, k: int, hist_f: list, hist_c: list, jumps: int, cmp_ops: dict) -> list:
+        """
+        Python lines for the non-jump instruction at addr, the k-th on its unit's path after jumps taken jumps.
+        Appends its flag / carry expression to the histories, and a COMPARE's operand expressions to cmp_ops.
+        """
+        prog = self.prog
+        op, rd, rs1, rs2, imm = prog.opcode[addr], prog.rd[addr], prog.rs1[addr], prog.rs2[addr], prog.imm[addr]
+        a = get_src8(rs1)
+        b = get_src8(rs2)
+        flag = '0'
+        carry = '0'
+        lines = []
+
+        # flag / carry producers are emitted as (var, lines if var is read later, lines if it isn't), see drop_dead_defs()
+        if op == OP_ADD:
+            carry = f"cy{k}"
+            lines.append((carry, [f"t = {a} + {b}", f"regs[{rd}] = t & 0xFF", f"{carry} = t >> 8"], [f"regs[{rd}] = ({a} + {b}) & 0xFF"]))
+        elif op == OP_SUB:
+            carry = f"cy{k}"
+            lines.append((carry, [f"t = {a} - {b}", f"regs[{rd}] = t & 0xFF", f"{carry} = 1 if t >= 0 else 0"], [f"regs[{rd}] = ({a} - {b}) & 0xFF"]))
+        elif op == OP_SHL:
+            carry = f"cy{k}"
+            lines.append((carry, [f"t = {a}", f"regs[{rd}] = (t << 1) & 0xFF", f"{carry} = t >> 7"], [f"regs[{rd}] = ({a} << 1) & 0xFF"]))
+        elif op == OP_COMPARE:
+            flag = f"fl{k}"
+            cmp_ops[flag] = (a, b)
+            lines.append((flag, [f"{flag} = {FLAG_EQ} if {a} == {b} else ({FLAG_GT} if {a} > {b} else {FLAG_LT})"], []))
+        elif op in RNS_ALU_OPS:
+            lines.append(f"rns[{rd}] = {self.get_rns_expr(op, rs1, rs2)}")
+        elif op == OP_LDI:
+            lines.append(f"regs[{rd}] = {imm}")
+        elif op == OP_UNRLL or op == OP_UNRLU:
+            if rs1 & 8:
+                lines.append(f"regs[{rd}] = rns[{rs1 & 7}] & 0xFF" if op == OP_UNRLL else f"regs[{rd}] = rns[{rs1 & 7}] >> 8 & 0xFF")
+        elif op == OP_RSTORE:
+            lines.append(f"mem[({a} << 8) | {b}] = regs[{rd}]")
+        elif op == OP_RLOAD:
+            lines.append(f"regs[{rd}] = mem[({a} << 8) | {b}]")
+        elif op == OP_INPUT:
+            if imm == UART_DATA_PORT:
+                lines.append(f"regs[{rd}] = rx.popleft() if rx else 0")
+            elif imm == UART_RX_PRESENT_PORT:
+                if self.stop_on_rx_wait:
+                    lines += [
+                        f"if not rx:",
+                        f"    return ({addr + 1}, {hist_f[-1]}, {hist_f[-2]}, {hist_c[-1]}, {hist_c[-2]}, s + {k + 1}, tk + {jumps}, {UNIT_RX_WAIT})"
+                    ]
+                lines.append(f"regs[{rd}] = 1 if rx else 0")
+            else:
+                lines.append(f"regs[{rd}] = 0")
+        elif op == OP_OUTPUT:
+            lines.append(f"tx.append(regs[{rd}])" if imm == UART_DATA_PORT else f"io_writes.append(({imm}, regs[{rd}]))")
+        elif op == OP_RLLM:
+            lines.append(f"rns[{rd}] = ({a} << 8) | {b}")
+        elif op == OP_AND:
+            lines.append(f"regs[{rd}] = 1 if ({a} and {b}) else 0")
+        elif op == OP_OR:
+            lines.append(f"regs[{rd}] = 1 if ({a} or {b}) else 0")
+        elif op == OP_NOT:
+            lines.append(f"regs[{rd}] = 0 if {a} else 1")
+        elif op == OP_ANDBIT:
+            lines.append(f"regs[{rd}] = {a} & {b}")
+        elif op == OP_ORBIT:
+            lines.append(f"regs[{rd}] = {a} | {b}")
+        elif op == OP_NOTBIT:
+            lines.append(f"regs[{rd}] = 0")
+        # NOP and the unused opcodes generate nothing
+
+        hist_f.append(flag)
+        hist_c.append(carry)
+        return lines
+
+
+    def get_jump_cond(self, op: int, hist_f: list, hist_c: list, cmp_ops: dict):
+        """
+        Condition expression for a conditional jump, or None if no flag producer can reach it.
+        A COMPARE right in front of the jump, with nothing else reaching it, is tested directly.
+        """
+        if op == OP_JMPC:
+            return None if hist_c[-2] == '0' else hist_c[-2]
+        if hist_f[-2] == '0' and hist_f[-1] in cmp_ops:
+            a, b = cmp_ops[hist_f[-1]]
+            return f"{a} {JUMP_COND_CMP[op]} {b}"
+        flags = [flag for flag in (hist_f[-1], hist_f[-2]) if flag != '0']
+        if not flags:
+            return None
+        return f"({' | '.join(flags)}) & {JUMP_COND_FLAG[op]}"
+
+
+    def translate(self, entry: int):
+        """
+        Compile the translation unit starting at entry, cache it, and return it.
+        JMP and CALL targets are followed while they lead to code the unit hasn't covered yet. A JR whose CALL is part of
+        the unit continues at the return address, behind a check that the popped address really is that one
+        (it isn't if the CALL was dropped on a full stack).
+        """
+        prog = self.prog
+        n = len(prog)
+        ops, addrs = prog.opcode, prog.addr
+
+        body = []
+        cmp_ops = {}
+        hist_f = ['f2', 'f1']
+        hist_c = ['c2', 'c1']
+        covered = set()
+        ret_addrs = [] # return addresses of the CALLs followed so far
+        addr = entry
+        k = 0      # instructions on the path so far
+        jumps = 0  # jumps taken on the path so far
+
+        def get_exit(targ: int) -> list:
+            # leave the unit through a taken jump: loop if it comes back to the entry
+            if targ == entry:
+                return ["f1 = f2 = c1 = c2 = 0", f"s += {k}", f"tk += {jumps + 1}", "continue"]
+            return [f"return ({targ}, 0, 0, 0, 0, s + {k}, tk + {jumps + 1}, {UNIT_OK})"]
+
+        while True:
+            if addr >= n or addr in covered or k >= MAX_UNIT_LEN:
+                body.append(f"return ({addr}, {hist_f[-1]}, {hist_f[-2]}, {hist_c[-1]}, {hist_c[-2]}, s + {k}, tk + {jumps}, {UNIT_OK})")
+                break
+            covered.add(addr)
+
+            op = ops[addr]
+            if op not in JUMP_OPS:
+                body += self.get_inst_lines(addr, k, hist_f, hist_c, jumps, cmp_ops)
+                k += 1
+                addr += 1
+                continue
+
+            k += 1
+            targ = addrs[addr]
+            if op == OP_JR:
+                if not ret_addrs:
+                    body.append(f"return (stack.pop() if stack else 0, 0, 0, 0, 0, s + {k}, tk + {jumps + 1}, {UNIT_OK})")
+                    break
+                targ = ret_addrs.pop()
+                body += [
+                    f"t = stack.pop() if stack else 0",
+                    f"if t != {targ}:",
+                    f"    return (t, 0, 0, 0, 0, s + {k}, tk + {jumps + 1}, {UNIT_OK})"
+                ]
+            elif op == OP_JMP or op == OP_CALL:
+                if op == OP_JMP and targ == addr:
+                    body.append(f"return ({addr}, {hist_f[-1]}, {hist_f[-2]}, {hist_c[-1]}, {hist_c[-2]}, s + {k}, tk + {jumps}, {UNIT_SELF_LOOP})")
+                    break
+                if op == OP_CALL:
+                    body += [
+                        f"if len(stack) < {CALL_STACK_DEPTH - 1}:",
+                        f"    stack.append({addr + 1})",
+                        f"else:",
+                        f"    sim.stack_overflows += 1"
+                    ]
+                    ret_addrs.append(addr + 1)
+            else:
+                cond = self.get_jump_cond(op, hist_f, hist_c, cmp_ops)
+                if cond is not None:
+                    body.append(f"if {cond}:")
+                    body += ["    " + line for line in get_exit(targ)]
+                hist_f.append('0')
+                hist_c.append('0')
+                addr += 1
+                continue
+
+            # taken for sure: follow it if the target is new code, otherwise leave (or loop)
+            if targ == entry or targ in covered or targ >= n:
+                body += get_exit(targ)
+                break
+            jumps += 1
+            hist_f = ['0', '0']
+            hist_c = ['0', '0']
+            addr = targ
+
+        src_lines = [
+            f"def unit_{entry:03X}(f1, f2, c1, c2, left):",
+            f"    s = 0",
+            f"    tk = 0",
+            f"    while True:",
+            f"        if s + {k} > left:",
+            f"            return ({entry}, f1, f2, c1, c2, s, tk, {UNIT_BUDGET})",
+        ]
+        src_lines.extend("        " + line for line in drop_dead_defs(body))
+        src = "\n".join(src_lines)
+
+        exec(compile(src, f"<unit {entry:03X}>", "exec"), self.unit_globals)
+        unit = self.unit_globals.pop(f"unit_{entry:03X}")
+        self.units[entry] = unit
+        self.unit_addrs[entry] = covered
+        self.unit_src[entry] = src
+        return unit
+
+
+    def flush_units(self):
+        self.units = [None] * (len(self.prog) + 1)
+        self.unit_addrs = {}
+        self.unit_src = {}
+        self.unit_words = self.prog.words.tobytes()
+        self.unit_stop_on_rx_wait = self.stop_on_rx_wait
+
+
+    def write_instr(self, addr: int, word: int):
+        """
+        Write one word of instruction memory, dropping only the units whose code covers addr.
+        """
+        self.prog.set_word(addr, word)
+        for entry, covered in list(self.unit_addrs.items()):
+            if addr in covered:
+                self.units[entry] = None
+                del self.unit_addrs[entry]
+                del self.unit_src[entry]
+        self.unit_words = self.prog.words.tobytes()
+
+
+    def run(self, max_steps: int = 10_000_000) -> str:
+        """
+        Same contract as ISASim.run(). When the step budget runs out partway through a unit, the remaining
+        steps are single-stepped by ISASim.run(), so 'max_steps' stops on exactly the same instruction.
+        """
+        if self.prog.words.tobytes() != self.unit_words or self.stop_on_rx_wait != self.unit_stop_on_rx_wait:
+            self.flush_units()
+        self.unit_globals.update(
+            regs=self.regs, rns=self.rns_regs, mem=self.data_mem, stack=self.stack,
+            rx=self.uart_rx, tx=self.uart_tx, io_writes=self.io_writes, sim=self
+        )
+
+        units = self.units
+        n = len(self.prog)
+        pc = self.pc
+        f1, f2, c1, c2 = self.flags1, self.flags2, self.carry1, self.carry2
+        steps = 0
+        taken = 0
+        status = UNIT_OK
+        while True:
+            if pc >= n:
+                reason = 'end_of_program'
+                break
+            unit = units[pc] or self.translate(pc)
+            pc, f1, f2, c1, c2, unit_steps, unit_taken, status = unit(f1, f2, c1, c2, max_steps - steps)
+            steps += unit_steps
+            taken += unit_taken
+            if status:
+                reason = {UNIT_RX_WAIT: 'rx_wait', UNIT_SELF_LOOP: 'self_loop', UNIT_BUDGET: 'max_steps'}[status]
+                break
+
+        self.pc = pc
+        self.flags1, self.flags2, self.carry1, self.carry2 = f1, f2, c1, c2
+        self.steps += steps
+        self.jumps_taken += taken
+        self.halt_reason = reason
+        if status == UNIT_BUDGET:
+            return ISASim.run(self, max_steps - steps)
+        return reason
+
+
+    def __init__(self, words: Iterable[int], moduli: tuple = DEFAULT_MODULI, uart_rx: Iterable[int] = (), stop_on_rx_wait: bool = True):
+        '''
+        Same arguments as ISASim. Units are translated lazily, the first time control reaches their entry address.
+        BlockSim.unit_src holds the generated source of each unit, for debugging.
+        '''
+        super().__init__(words, moduli, uart_rx, stop_on_rx_wait)
+        self.unit_globals = {}
+        self.flush_units()
@@ -0,0 +1,480 @@
+"""
+Instruction-set simulator for the 8-bit RISC-RNS processor.
+
+Runs an assembled program without Vivado. Each 16-bit word is decoded exactly once into a set of
+parallel arrays (DecodedProg), and ISASim.run() walks those arrays instead of the bit strings.
+Architectural behaviour mirrors the RTL rather than the 'intended' ISA wherever the two differ, so the
+results can be compared against xsim / the board:
+    - Branch flags are not sticky. ctrl_BranchPred only sees the flags of the two instructions ahead of the
+      jump (conds_EX / conds_MEMWB), and a taken jump squashes the next three slots, clearing that history.
+    - RNS_adder sums in 8 bits before the modulo, RNS_sub wraps at 9 bits.
+    - NOTBIT writes 0 (the `logical` module has no bitwise-NOT path).
+    - ctrl_CallRetStack only pushes while sp < 3'b111, so the 8th nested CALL is silently dropped.
+Data memory is modelled architecturally (loads return the stored byte); BRAM output latency is not modelled.
+"""
+import sys
+import re
+from array import array
+from collections import deque
+from time import perf_counter
+from typing import TextIO, Iterable
+
+from ASMtoV import ASMtoBin, J_type_opcodes, R_type_opcodes, I_type_opcodes
+
+PROG_CTR_WID = 10
+PROG_MEM_DEPTH = 2 ** PROG_CTR_WID
+DATA_MEM_DEPTH = 2 ** 16
+NUM_REGS = 8
+CALL_STACK_DEPTH = 8
+
+# Domain order as PL_EX elaborates it: RNS reg bits [7:0] are mod 129, [15:8] are mod 256.
+# processor_top declares MODULI = {9'd129, 9'd256} but doesn't forward it to stage_EX, so the PL_EX default {9'd256, 9'd129} is what's built.
+DEFAULT_MODULI = (129, 256)
+
+# I/O ports, as decoded in top.v
+UART_DATA_PORT = 0x01       # OUTPUT: UART TX data, INPUT: UART RX data
+UART_RX_PRESENT_PORT = 0x02 # INPUT: RX data present
+UART_TX_FULL_PORT = 0x03    # INPUT: TX buffer full
+UART_RX_FULL_PORT = 0x04    # INPUT: RX buffer full (listed in README, not driven by top.v - always reads 0)
+
+OP_NOP = 0
+OP_ADD = int(R_type_opcodes["ADD"], 2)
+OP_SUB = int(R_type_opcodes["SUB"], 2)
+OP_AND = int(R_type_opcodes["AND"], 2)
+OP_OR = int(R_type_opcodes["OR"], 2)
+OP_NOT = int(R_type_opcodes["NOT"], 2)
+OP_SHL = int(R_type_opcodes["SHL"], 2)
+OP_RLOAD = int(R_type_opcodes["RLOAD"], 2)
+OP_RSTORE = int(R_type_opcodes["RSTORE"], 2)
+OP_ANDBIT = int(R_type_opcodes["ANDBIT"], 2)
+OP_ORBIT = int(R_type_opcodes["ORBIT"], 2)
+OP_NOTBIT = int(R_type_opcodes["NOTBIT"], 2)
+OP_COMPARE = int(R_type_opcodes["COMPARE"], 2)
+OP_ADDM = int(R_type_opcodes["ADDM"], 2)
+OP_SUBM = int(R_type_opcodes["SUBM"], 2)
+OP_MULM = int(R_type_opcodes["MULM"], 2)
+OP_UNRLL = int(R_type_opcodes["UNRLL"], 2)
+OP_UNRLU = int(R_type_opcodes["UNRLU"], 2)
+OP_RLLM = int(R_type_opcodes["RLLM"], 2)
+OP_LDI = int(I_type_opcodes["LDI"], 2)
+OP_OUTPUT = int(I_type_opcodes["OUTPUT"], 2)
+OP_INPUT = int(I_type_opcodes["INPUT"], 2)
+OP_JMP = int(J_type_opcodes["JMP"], 2)
+OP_JMPGT = int(J_type_opcodes["JMPGT"], 2)
+OP_JMPLT = int(J_type_opcodes["JMPLT"], 2)
+OP_JMPEQ = int(J_type_opcodes["JMPEQ"], 2)
+OP_JMPC = int(J_type_opcodes["JMPC"], 2)
+OP_CALL = int(J_type_opcodes["CALL"], 2)
+OP_JR = int(J_type_opcodes["JR"], 2)
+
+JUMP_OPS = frozenset(int(code, 2) for code in J_type_opcodes.values())
+RNS_ALU_OPS = frozenset((OP_ADDM, OP_SUBM, OP_MULM))
+
+# branch flag bits, as latched into branch_conds_EX / branch_conds_MEMWB
+FLAG_GT = 1
+FLAG_LT = 2
+FLAG_EQ = 4
+JUMP_COND_FLAG = {OP_JMPGT: FLAG_GT, OP_JMPLT: FLAG_LT, OP_JMPEQ: FLAG_EQ}
+
+
+def parse_moduli(moduli: str) -> tuple:
+    """
+    Parse a moduli set into domain order (domain 0 == RNS reg bits [7:0]).
+    Accepts either a Verilog MODULI literal, i.e. "{9'd256, 9'd129}" (MSB first, as written in PL_EX / processor_top),
+    or a plain comma-seperated list already in domain order, i.e. "129,256".
+    """
+    moduli = moduli.strip()
+    if moduli.startswith('{'):
+        values = [int(val) for val in re.findall(r"\d+'d(\d+)", moduli)]
+        return tuple(reversed(values))
+    return tuple(int(val, 0) for val in moduli.split(',') if val.strip())
+
+
+def words_from_bin_prog(bin_prog: list) -> list:
+    """
+    Convert ASMtoBin.getBinProg() output (list of 16-char binary strings) to integer words.
+    """
+    return [int(inst, 2) for inst in bin_prog]
+
+
+def read_instr_mem_v(fileobj: TextIO) -> list:
+    """
+    Read the case-statement Instr_Mem.v written by BinToV and return the program as integer words.
+    Trailing 16'h0000 padding is dropped, so the returned list ends at the last real instruction.
+    """
+    case_re = re.compile(r"(\d+)'h([0-9A-Fa-f]+)\s*:\s*instr_mem_out\s*<=\s*\d+'h([0-9A-Fa-f]+)")
+    words = {}
+    for line in fileobj:
+        match = case_re.search(line)
+        if match:
+            words[int(match.group(2), 16)] = int(match.group(3), 16)
+
+    last = max((addr for addr, word in words.items() if word), default=-1)
+    return [words.get(addr, 0) for addr in range(last + 1)]
+
+
+def read_hex_file(fileobj: TextIO) -> list:
+    """
+    Read a hex listing (ASMtoV.py --hex_file_out / --mem_file_out, or hand-written listings like haz_detect_test.txt)
+    One or more whitespace-seperated 4-digit words per line, '//' comments are ignored.
+    """
+    words = []
+    for line in fileobj:
+        words.extend(int(tok, 16) for tok in line.split('//', 1)[0].split())
+    return words
+
+
+def load_program(path: str) -> list:
+    """
+    Load a program as integer words from an .asm source, a generated Instr_Mem.v, or a hex listing / .mem file.
+    """
+    if path.lower().endswith('.asm'):
+        return words_from_bin_prog(ASMtoBin(open(path, 'r')).getBinProg())
+    with open(path, 'r') as fileobj:
+        if path.lower().endswith('.v'):
+            return read_instr_mem_v(fileobj)
+        return read_hex_file(fileobj)
+
+
+def rns_alu(moduli: tuple, op: int, a: int, a_rns: bool, b: int, b_rns: bool) -> int:
+    """
+    Evaluate ADDM / SUBM / MULM across every domain, as PL_ALU_RNS does. Returns the packed RNS register value.
+    Integer-domain sources provide their 8-bit value to every domain.
+    """
+    result = 0
+    for domain, modulus in enumerate(moduli):
+        shift = domain * 8
+        x = (a >> shift) & 0xFF if a_rns else a
+        y = (b >> shift) & 0xFF if b_rns else b
+        if op == OP_MULM:
+            res = x * y
+        elif op == OP_SUBM:
+            res = (x - y + modulus) & 0x1FF  # RNS_sub: 9-bit self-determined expression
+        else:
+            res = (x + y) & 0xFF             # RNS_adder: op1 + op2 is 8-bit inside the concatenation
+        result |= (res % modulus) << shift
+    return result
+
+
+class DecodedProg:
+    def __len__(self) -> int:
+        return len(self.words)
+
+
+    def set_word(self, addr: int, word: int):
+        """
+        Overwrite one instruction and its decoded fields.
+        """
+        self.words[addr] = word
+        self.opcode[addr] = word >> 11
+        self.rd[addr] = (word >> 8) & 0x7
+        self.rs2[addr] = (word >> 4) & 0xF
+        self.rs1[addr] = word & 0xF
+        self.imm[addr] = word & 0xFF
+        self.addr[addr] = word & 0x3FF
+
+
+    def __init__(self, words: Iterable[int]):
+        '''
+        Decodes a program once into parallel arrays indexed by instruction address,
+        so the simulators never have to look at the bit strings again.
+            opcode  [15:11]
+            rd      [10:8]   (also op3 for RSTORE / OUTPUT)
+            rs2     [7:4]    {domain flag, addr}
+            rs1     [3:0]    {domain flag, addr}
+            imm     [7:0]    (LDI immediate, I/O port)
+            addr    [9:0]    (J-type target)
+        '''
+        self.words = array('H', words)
+        if len(self.words) > PROG_MEM_DEPTH:
+            raise ValueError(f"Program is {len(self.words)} words long; instruction memory holds {PROG_MEM_DEPTH}")
+
+        self.opcode = array('B', (word >> 11 for word in self.words))
+        self.rd = array('B', ((word >> 8) & 0x7 for word in self.words))
+        self.rs2 = array('B', ((word >> 4) & 0xF for word in self.words))
+        self.rs1 = array('B', (word & 0xF for word in self.words))
+        self.imm = array('B', (word & 0xFF for word in self.words))
+        self.addr = array('H', (word & 0x3FF for word in self.words))
+
+
+
+class ISASim:
+    def run(self, max_steps: int = 10_000_000) -> str:
+        """
+        Run until the program halts or max_steps instructions have executed. Returns the halt reason:
+            'end_of_program'    PC ran past the last instruction (into NOP padding)
+            'self_loop'         unconditional JMP to itself
+            'rx_wait'           polling RX-present with no RX data left to deliver (stop_on_rx_wait)
+            'max_steps'
+        Can be called again to continue from where it stopped.
+        """
+        prog = self.prog
+        ops, rds, rs1s, rs2s, imms, addrs = prog.opcode, prog.rd, prog.rs1, prog.rs2, prog.imm, prog.addr
+        n = len(prog)
+        regs, rns_regs, mem, stack = self.regs, self.rns_regs, self.data_mem, self.stack
+        rx, tx = self.uart_rx, self.uart_tx
+        moduli = self.moduli
+        stack_limit = CALL_STACK_DEPTH - 1
+
+        pc = self.pc
+        flags1, flags2, carry1, carry2 = self.flags1, self.flags2, self.carry1, self.carry2
+        steps = 0
+        taken = 0
+        reason = 'max_steps'
+
+        while steps < max_steps:
+            if pc >= n:
+                reason = 'end_of_program'
+                break
+            op = ops[pc]
+            steps += 1
+            nflags = 0
+            ncarry = 0
+            npc = pc + 1
+
+            if op == OP_NOP:
+                pass
+            elif op in JUMP_OPS:
+                if op == OP_JMP or op == OP_CALL or op == OP_JR:
+                    take = True
+                elif op == OP_JMPC:
+                    take = bool(carry2)
+                else:
+                    take = bool((flags1 | flags2) & JUMP_COND_FLAG.get(op, 0))
+
+                if take:
+                    if op == OP_JR:
+                        npc = stack.pop() if stack else 0
+                    else:
+                        npc = addrs[pc]
+                        if op == OP_CALL:
+                            if len(stack) < stack_limit:
+                                stack.append(pc + 1)
+                            else:
+                                self.stack_overflows += 1
+                        elif op == OP_JMP and npc == pc:
+                            reason = 'self_loop'
+                            break
+                    taken += 1
+                    # squashed shadow: nothing reaches MEMWB to carry flags forward
+                    flags1 = flags2 = carry1 = carry2 = 0
+                    pc = npc
+                    continue
+            else:
+                r1 = rs1s[pc]
+                r2 = rs2s[pc]
+                a = rns_regs[r1 & 7] if r1 & 8 else regs[r1 & 7]
+                b = rns_regs[r2 & 7] if r2 & 8 else regs[r2 & 7]
+                a8 = a & 0xFF
+                b8 = b & 0xFF
+
+                if op == OP_ADD:
+                    res = a8 + b8
+                    regs[rds[pc]] = res & 0xFF
+                    ncarry = res >> 8
+                elif op in RNS_ALU_OPS:
+                    rns_regs[rds[pc]] = rns_alu(moduli, op, a, r1 & 8, b, r2 & 8)
+                elif op == OP_COMPARE:
+                    res = a8 - b8
+                    nflags = FLAG_EQ if res == 0 else (FLAG_GT if res > 0 else FLAG_LT)
+                elif op == OP_LDI:
+                    regs[rds[pc]] = imms[pc]
+                elif op == OP_UNRLL or op == OP_UNRLU:
+                    if r1 & 8:
+                        regs[rds[pc]] = a & 0xFF if op == OP_UNRLL else (a >> 8) & 0xFF
+                elif op == OP_RSTORE:
+                    mem[(a8 << 8) | b8] = regs[rds[pc]]
+                elif op == OP_RLOAD:
+                    regs[rds[pc]] = mem[(a8 << 8) | b8]
+                elif op == OP_INPUT:
+                    port = imms[pc]
+                    if port == UART_DATA_PORT:
+                        val = rx.popleft() if rx else 0
+                    elif port == UART_RX_PRESENT_PORT:
+                        val = 1 if rx else 0
+                        if not rx and self.stop_on_rx_wait:
+                            reason = 'rx_wait'
+                            pc = npc
+                            break
+                    else:
+                        val = 0
+                    regs[rds[pc]] = val
+                elif op == OP_OUTPUT:
+                    port = imms[pc]
+                    if port == UART_DATA_PORT:
+                        tx.append(regs[rds[pc]])
+                    else:
+                        self.io_writes.append((port, regs[rds[pc]]))
+                elif op == OP_SUB:
+                    res = a8 - b8
+                    regs[rds[pc]] = res & 0xFF
+                    ncarry = 1 if res >= 0 else 0
+                elif op == OP_RLLM:
+                    rns_regs[rds[pc]] = (a8 << 8) | b8
+                elif op == OP_SHL:
+                    regs[rds[pc]] = (a8 << 1) & 0xFF
+                    ncarry = a8 >> 7
+                elif op == OP_AND:
+                    regs[rds[pc]] = 1 if (a8 and b8) else 0
+                elif op == OP_OR:
+                    regs[rds[pc]] = 1 if (a8 or b8) else 0
+                elif op == OP_NOT:
+                    regs[rds[pc]] = 0 if a8 else 1
+                elif op == OP_ANDBIT:
+                    regs[rds[pc]] = a8 & b8
+                elif op == OP_ORBIT:
+                    regs[rds[pc]] = a8 | b8
+                elif op == OP_NOTBIT:
+                    regs[rds[pc]] = 0
+                # remaining opcodes decode to NOP in PL_IFID
+
+            flags2 = flags1
+            flags1 = nflags
+            carry2 = carry1
+            carry1 = ncarry
+            pc = npc
+
+        self.pc = pc
+        self.flags1, self.flags2, self.carry1, self.carry2 = flags1, flags2, carry1, carry2
+        self.steps += steps
+        self.jumps_taken += taken
+        self.halt_reason = reason
+        return reason
+
+
+    def get_reg_dump(self) -> list:
+        """
+        Register file contents in the same format tb_rns.v $displays them.
+        """
+        lines = [
+            "--------------------",
+            "Printing Integer Register Contents: "
+        ]
+        lines.extend(f"reg_file [{i}] = {val}" for i, val in enumerate(self.regs))
+        lines.extend([
+            "--------------------",
+            "Printing RNS Domain Register Contents: ",
+            f"Index | D{self.moduli[1]} Bin | D{self.moduli[0]} Bin"
+        ])
+        lines.extend(f"{i}\t| {(val >> 8) & 0xFF:08b} | {val & 0xFF:08b}" for i, val in enumerate(self.rns_regs))
+        lines.append("--------------------")
+        return lines
+
+
+    def get_mem_dump(self) -> list:
+        """
+        Non-zero data memory contents, in the format tb_rns.v $displays them.
+        """
+        lines = ["Printing Data Memory Contents: "]
+        lines.extend(f"data_mem [{addr}] = {val}" for addr, val in enumerate(self.data_mem[:DATA_MEM_DEPTH - 1]) if val)
+        lines.append("--------------------")
+        return lines
+
+
+    def __init__(self, words: Iterable[int], moduli: tuple = DEFAULT_MODULI, uart_rx: Iterable[int] = (), stop_on_rx_wait: bool = True):
+        '''
+        Architectural simulator for the RISC-RNS ISA.
+        words:              program as integer words (see load_program / words_from_bin_prog), or a DecodedProg
+        moduli:             RNS moduli in domain order (domain 0 == RNS reg bits [7:0])
+        uart_rx:            bytes delivered, in order, to INPUT on port 0x01
+        stop_on_rx_wait:    halt when the program polls RX-present after uart_rx has run dry
+
+        UART TX bytes accumulate in ISASim.uart_tx, writes to any other port in ISASim.io_writes.
+        '''
+        self.prog = words if isinstance(words, DecodedProg) else DecodedProg(words)
+        self.moduli = tuple(moduli)
+        if len(self.moduli) != 2:
+            raise ValueError(f"UNRLL / UNRLU only address two RNS domains; got moduli {self.moduli}")
+
+        self.regs = [0] * NUM_REGS
+        self.rns_regs = [0] * NUM_REGS
+        self.data_mem = bytearray(DATA_MEM_DEPTH)
+        self.stack = []
+        self.stack_overflows = 0
+        self.uart_rx = deque(uart_rx)
+        self.uart_tx = bytearray()
+        self.io_writes = []
+        self.stop_on_rx_wait = stop_on_rx_wait
+
+        self.pc = 0
+        self.flags1 = self.flags2 = 0 #compare flags of the last two executed instructions
+        self.carry1 = self.carry2 = 0
+        self.steps = 0
+        self.jumps_taken = 0
+        self.halt_reason = None
+
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("""\033[1;31mUsage: \033[22mpython ISASim.py <program (.asm | Instr_Mem.v | hex listing | .mem)>\033[0m\n
+        \033[1;32mAdditional optional arguments:\033[0m\n
+        \033[32m--max_steps <n>\033[0m\n
+        \tStop after n instructions (default: 10000000)\n
+        \033[32m--moduli <moduli>\033[0m\n
+        \tRNS moduli, either a Verilog literal "{9'd256, 9'd129}" or a domain-ordered list "129,256" (default: 129,256)\n
+        \033[32m--uart_rx <file>\033[0m\n
+        \tFeed the bytes of a file to UART RX\n
+        \033[32m--tx_file_out <file>\033[0m\n
+        \tWrite UART TX bytes to a file (same format as a serial console capture)\n
+        \033[32m--dump_mem\033[0m\n
+        \tPrint non-zero data memory contents\n
+        \033[32m--mem_in <image>\033[0m\n
+        \tPreload data memory from an image (.bin / .mem / .coe / data_mem listing, see MemImage.py)\n
+        \033[32m--mem_out <image>\033[0m\n
+        \tWrite data memory to an image when the run ends (format from the extension, e.g. .bin)\n
+        \033[32m--blocks\033[0m\n
+        \tRun on the block-translating engine (BlockSim.py)
+        """)
+        sys.exit(1)
+
+    try:
+        words = load_program(sys.argv[1])
+    except OSError:
+        print(f"\033[1;31mError: Could not open program {sys.argv[1]}\033[0m")
+        sys.exit(1)
+
+    max_steps = 10_000_000
+    moduli = DEFAULT_MODULI
+    uart_rx = b''
+    tx_fout = None
+
+    if "--max_steps" in sys.argv:
+        max_steps = int(sys.argv[sys.argv.index("--max_steps") + 1])
+    if "--moduli" in sys.argv:
+        moduli = parse_moduli(sys.argv[sys.argv.index("--moduli") + 1])
+    if "--uart_rx" in sys.argv:
+        with open(sys.argv[sys.argv.index("--uart_rx") + 1], 'rb') as rx_fin:
+            uart_rx = rx_fin.read()
+    if "--tx_file_out" in sys.argv:
+        tx_fout = open(sys.argv[sys.argv.index("--tx_file_out") + 1], 'wb')
+
+    start = perf_counter()
+    if "--blocks" in sys.argv:
+        from BlockSim import BlockSim
+        sim = BlockSim(words, moduli=moduli, uart_rx=uart_rx)
+    else:
+        sim = ISASim(words, moduli=moduli, uart_rx=uart_rx)
+    if "--mem_in" in sys.argv:
+        from MemImage import read_image
+        sim.data_mem[:] = read_image(sys.argv[sys.argv.index("--mem_in") + 1]).tobytes()
+    reason = sim.run(max_steps)
+    elapsed = perf_counter() - start
+
+    print("\n".join(sim.get_reg_dump()))
+    if "--dump_mem" in sys.argv:
+        print("\n".join(sim.get_mem_dump()))
+
+    print(f"\033[1;32mHalted ({reason}) at PC 10'h{sim.pc:03X} after {sim.steps} instructions, {sim.jumps_taken} taken jumps\033[0m")
+    print(f"\033[1;32m{len(sim.uart_tx)} bytes sent to UART TX, {elapsed * 1000:.1f} ms ({sim.steps / elapsed / 1e6:.2f} MIPS)\033[0m")
+    if sim.stack_overflows:
+        print(f"\033[1;31mWarning: {sim.stack_overflows} CALLs dropped on a full call/return stack\033[0m")
+
+    if tx_fout:
+        tx_fout.write(sim.uart_tx)
+        tx_fout.close()
+        print(f"\033[1;32mUART TX bytes written to {sys.argv[sys.argv.index('--tx_file_out') + 1]}\033[0m")
+    if "--mem_out" in sys.argv:
+        from MemImage import write_image
+        write_image(sys.argv[sys.argv.index("--mem_out") + 1], sim.data_mem)
+        print(f"\033[1;32mData memory written to {sys.argv[sys.argv.index('--mem_out') + 1]}\033[0m")
@@ -0,0 +1,258 @@
+"""
+Data memory images for the 64K x 8 Data_Mem.
+
+Reads and writes the whole data memory as:
+    .bin    raw 65536-byte image, byte N = address N. Read through numpy.memmap, so nothing is copied until used.
+    .mem    $readmemh file for preloading Data_Mem (the reg-array version) in simulation: one byte per line,
+            '@addr' lines skip over runs of zeros unless written dense.
+    .coe    Block Memory Generator init file for blk_mem_gen_0 (radix 16, up to the last non-zero byte).
+and reads the 'data_mem [addr] = value' listings tb_rns.v, xsim's simulate.log and ISASim / PipelineSim --dump_mem print
+(only non-zero bytes are listed there, so everything else is 0).
+
+diff_images() compares two images with one vectorized != and reports the mismatching address ranges, so checking a
+full-memory test (big_mem_test, Full_Test) takes milliseconds.
+"""
+import os
+import sys
+import re
+import mmap
+from time import perf_counter
+
+import numpy as np
+
+from ISASim import DATA_MEM_DEPTH
+
+DUMP_LINE = re.compile(rb"data_mem\s*\[\s*(\d+)\s*\]\s*=\s*(\d+)")
+MEM_LINE_COMMENT = re.compile(rb"//[^\n]*")
+DUMP_END = DATA_MEM_DEPTH - 1 # tb_rns.v's dump loop stops at k < 65535, so a listing says nothing about the last byte
+MAX_RANGES = 20
+
+
+def get_format(path: str) -> str:
+    """
+    'bin', 'mem', 'coe' or 'dump', from the extension. .hex / .txt are $readmemh; .log is a dump.
+    """
+    ext = path.lower().rsplit('.', 1)[-1] if '.' in path else ''
+    if ext in ('bin', 'img'):
+        return 'bin'
+    if ext in ('mem', 'hex', 'txt'):
+        return 'mem'
+    if ext == 'coe':
+        return 'coe'
+    return 'dump'
+
+
+def read_bin(path: str) -> np.ndarray:
+    """
+    mmap a raw image. Shorter files are an error; the image is read-only.
+    """
+    size = os.path.getsize(path)
+    if size != DATA_MEM_DEPTH:
+        raise ValueError(f"{path} is {size} bytes, a data memory image is {DATA_MEM_DEPTH}")
+    return np.memmap(path, dtype=np.uint8, mode='r', shape=(DATA_MEM_DEPTH,))
+
+
+def parse_readmemh(data: bytes) -> np.ndarray:
+    """
+    $readmemh contents -> image. Handles '@addr' lines and // comments; words wider than 8 bits are an error.
+    """
+    image = np.zeros(DATA_MEM_DEPTH, dtype=np.uint8)
+    tokens = MEM_LINE_COMMENT.sub(b'', data).split()
+    addr = 0
+    run = []
+    def flush():
+        nonlocal addr, run
+        if not run:
+            return
+        if addr + len(run) > DATA_MEM_DEPTH:
+            raise ValueError(f"$readmemh data runs past address {DATA_MEM_DEPTH - 1}")
+        if all(len(tok) == 2 for tok in run):
+            image[addr:addr + len(run)] = np.frombuffer(bytes.fromhex(b''.join(run).decode()), dtype=np.uint8)
+        else:
+            vals = [int(tok, 16) for tok in run]
+            if max(vals) > 0xFF:
+                raise ValueError(f"$readmemh word wider than 8 bits near address {addr}")
+            image[addr:addr + len(run)] = vals
+        addr += len(run)
+        run = []
+
+    for tok in tokens:
+        if tok.startswith(b'@'):
+            flush()
+            addr = int(tok[1:], 16)
+        else:
+            run.append(tok)
+    flush()
+    return image
+
+
+def parse_coe(data: bytes) -> np.ndarray:
+    text = b'\n'.join(line for line in data.splitlines() if not line.lstrip().startswith(b';'))
+    match = re.search(rb"memory_initialization_vector\s*=\s*([^;]*);", text)
+    if not match:
+        raise ValueError("No memory_initialization_vector in .coe")
+    radix = re.search(rb"memory_initialization_radix\s*=\s*(\d+)", text)
+    base = int(radix.group(1)) if radix else 10
+    vals = [int(tok, base) for tok in match.group(1).replace(b',', b' ').split()]
+    if len(vals) > DATA_MEM_DEPTH or (vals and max(vals) > 0xFF):
+        raise ValueError(f".coe vector doesn't fit a {DATA_MEM_DEPTH} x 8 memory")
+    image = np.zeros(DATA_MEM_DEPTH, dtype=np.uint8)
+    image[:len(vals)] = vals
+    return image
+
+
+def parse_dump(data: bytes) -> np.ndarray:
+    """
+    'data_mem [addr] = value' lines (decimal) -> image. Anything else in the file is ignored.
+    """
+    image = np.zeros(DATA_MEM_DEPTH, dtype=np.uint8)
+    pairs = np.array(DUMP_LINE.findall(data), dtype=np.int64).reshape(-1, 2)
+    if len(pairs):
+        if pairs[:, 0].max() >= DATA_MEM_DEPTH or pairs[:, 1].max() > 0xFF:
+            raise ValueError("Dump lists an address or value that doesn't fit Data_Mem")
+        image[pairs[:, 0]] = pairs[:, 1]
+    return image
+
+
+def read_image(path: str, fmt: str = None) -> np.ndarray:
+    """
+    Read any supported image / listing as a 65536-entry uint8 array. Raw images are memory-mapped.
+    """
+    fmt = fmt or get_format(path)
+    if fmt == 'bin':
+        return read_bin(path)
+    if not os.path.getsize(path):
+        return np.zeros(DATA_MEM_DEPTH, dtype=np.uint8)
+    with open(path, 'rb') as fileobj, mmap.mmap(fileobj.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        # a dump is scanned by the regex straight out of the page cache; the others need to be edited as bytes
+        if fmt == 'mem':
+            return parse_readmemh(data[:])
+        if fmt == 'coe':
+            return parse_coe(data[:])
+        return parse_dump(data)
+
+
+def get_mem_lines(image, dense: bool = False) -> list:
+    """
+    $readmemh lines for image. Unless dense, runs of zeros are skipped with '@addr' (Data_Mem powers up as 0).
+    """
+    image = np.asarray(image, dtype=np.uint8)
+    if dense:
+        return [f"{val:02X}" for val in image.tolist()]
+    lines = []
+    nonzero = np.flatnonzero(image)
+    prev = -2
+    for addr, val in zip(nonzero.tolist(), image[nonzero].tolist()):
+        if addr != prev + 1:
+            lines.append(f"@{addr:04X}")
+        lines.append(f"{val:02X}")
+        prev = addr
+    return lines
+
+
+def get_coe_lines(image, src_name: str = None) -> list:
+    image = np.asarray(image, dtype=np.uint8)
+    last = int(np.flatnonzero(image)[-1]) + 1 if image.any() else 1
+    vals = [f"{val:02X}" for val in image[:last].tolist()]
+    return [
+        f"; Data memory init{f' from {src_name}' if src_name else ''}, generated by MemImage.py",
+        f"; Block Memory Generator: Single Port RAM, width 8, depth {DATA_MEM_DEPTH}",
+        f"memory_initialization_radix=16;",
+        f"memory_initialization_vector=",
+    ] + [f"{val}," for val in vals[:-1]] + [f"{vals[-1]};"]
+
+
+def write_image(path: str, image, fmt: str = None, dense: bool = False, src_name: str = None):
+    fmt = fmt or get_format(path)
+    image = np.asarray(image, dtype=np.uint8)
+    if len(image) != DATA_MEM_DEPTH:
+        raise ValueError(f"Image has {len(image)} bytes, expected {DATA_MEM_DEPTH}")
+    if fmt == 'bin':
+        image.tofile(path)
+        return
+    if fmt == 'mem':
+        lines = get_mem_lines(image, dense)
+    elif fmt == 'coe':
+        lines = get_coe_lines(image, src_name)
+    else:
+        lines = [f"data_mem [{addr}] = {val}" for addr, val in zip(np.flatnonzero(image).tolist(), image[image != 0].tolist())]
+    with open(path, 'w') as fileobj:
+        fileobj.writelines(line + '\n' for line in lines)
+
+
+def diff_images(expected, got, end: int = DATA_MEM_DEPTH) -> tuple:
+    """
+    Compare two images below address end. Returns (number of mismatching bytes, [(start, end, expected bytes, got bytes)]) with one
+    entry per run of consecutive mismatching addresses (end inclusive, at most the first 8 bytes of each run).
+    """
+    expected = np.asarray(expected, dtype=np.uint8)
+    got = np.asarray(got, dtype=np.uint8)
+    bad = np.flatnonzero(expected[:end] != got[:end])
+    if not len(bad):
+        return 0, []
+    # a new range starts wherever the next bad address isn't the one right after the last
+    breaks = np.flatnonzero(np.diff(bad) != 1) + 1
+    starts = bad[np.concatenate(([0], breaks))]
+    ends = bad[np.concatenate((breaks - 1, [len(bad) - 1]))]
+    ranges = [(start, end, bytes(expected[start:min(end + 1, start + 8)]), bytes(got[start:min(end + 1, start + 8)]))
+              for start, end in zip(starts.tolist(), ends.tolist())]
+    return len(bad), ranges
+
+
+def get_diff_lines(num_bad: int, ranges: list, max_ranges: int = MAX_RANGES) -> list:
+    if not num_bad:
+        return ["Images match"]
+    lines = [f"{num_bad} bytes differ in {len(ranges)} address range(s)", f"Start  | End    | Bytes  | Expected (first 8)       | Got (first 8)"]
+    for start, end, exp, got in ranges[:max_ranges]:
+        lines.append(f"0x{start:04X} | 0x{end:04X} | {end - start + 1:<6} | {exp.hex(' '):<24} | {got.hex(' ')}")
+    if len(ranges) > max_ranges:
+        lines.append(f"... {len(ranges) - max_ranges} more ranges")
+    return lines
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3 or sys.argv[1] not in ("diff", "convert", "info"):
+        print("""\033[1;31mUsage: \033[22mpython MemImage.py diff <expected> <got>\033[0m
+        \033[1;31m       python MemImage.py convert <in> <out>\033[0m
+        \033[1;31m       python MemImage.py info <image>\033[0m\n
+        Formats follow the extension: .bin (raw 65536 bytes), .mem / .hex / .txt ($readmemh), .coe, anything else is read
+        as a 'data_mem [addr] = value' listing (tb_rns.v / simulate.log / ISASim.py --dump_mem).\n
+        \033[1;32mAdditional optional arguments:\033[0m\n
+        \033[32m--dense\033[0m\n
+        \tconvert: write every address to a .mem, instead of skipping zero runs with @addr
+        \033[32m--max_ranges <n>\033[0m\n
+        \tdiff: number of mismatching ranges to list (default: 20)
+        """)
+        sys.exit(1)
+
+    cmd = sys.argv[1]
+    try:
+        start = perf_counter()
+        if cmd == "diff":
+            if len(sys.argv) < 4:
+                print("\033[1;31mError: diff needs <expected> <got>\033[0m")
+                sys.exit(1)
+            expected, got = read_image(sys.argv[2]), read_image(sys.argv[3])
+            end = DUMP_END if 'dump' in (get_format(sys.argv[2]), get_format(sys.argv[3])) else DATA_MEM_DEPTH
+            num_bad, ranges = diff_images(expected, got, end)
+            elapsed = perf_counter() - start
+            max_ranges = MAX_RANGES
+            if "--max_ranges" in sys.argv:
+                max_ranges = int(sys.argv[sys.argv.index("--max_ranges") + 1])
+            print('\n'.join(get_diff_lines(num_bad, ranges, max_ranges)))
+            print(f"\033[1;32m{end} addresses compared in {elapsed * 1000:.1f} ms\033[0m")
+            sys.exit(1 if num_bad else 0)
+        elif cmd == "convert":
+            if len(sys.argv) < 4:
+                print("\033[1;31mError: convert needs <in> <out>\033[0m")
+                sys.exit(1)
+            image = read_image(sys.argv[2])
+            write_image(sys.argv[3], image, dense="--dense" in sys.argv, src_name=sys.argv[2])
+            print(f"\033[1;32mWrote {sys.argv[3]} ({int(np.count_nonzero(image))} non-zero bytes)\033[0m")
+        else:
+            image = read_image(sys.argv[2])
+            nonzero = np.flatnonzero(image)
+            print(f"{len(nonzero)} non-zero bytes" + (f", addresses 0x{nonzero[0]:04X} - 0x{nonzero[-1]:04X}" if len(nonzero) else ""))
+    except (OSError, ValueError) as e:
+        print(f"\033[1;31mError: {e}\033[0m")
+        sys.exit(1)
@@ -0,0 +1,599 @@
+"""
+Cycle-accurate timing model of the IF/ID -> EX -> MEM/WB pipeline.
+
+Where ISASim executes one instruction at a time, PipelineSim clocks the pipeline registers the way the RTL does:
+    PL_IFID         decode + register read, ID-stage bypass (ctrl_Forward), CALL push / JR RA pop
+    PL_EX           ALU / RNS ALU, EX-stage bypass, branch resolution (ctrl_BranchPred), branch_taken_EX
+    PL_MEMWB        invalidate_instr, register / data memory / IO writes, branch_conds_MEMWB
+    ctrl_ProgCtr    PC redirect from pred_nxt_prog_ctr_EX one cycle after branch_taken_EX
+Operand values travel through the pipeline registers, so the architectural state it ends with is what the
+hardware ends with, hazards included (i.e. RLOAD never takes a bypass, a jump at a jump target is ignored).
+Data memory reads are architectural, as in ISASim.
+
+Per instruction address it counts retirements, squashes, ID/EX bypass hits, stale reads (bypass suppressed
+on RLOAD) and, for jumps, the flush cycles their taken branches cost.
+"""
+import sys
+from collections import deque
+from time import perf_counter
+from typing import Iterable
+
+from ASMtoV import ASMtoBin
+from ISASim import (
+    DecodedProg, rns_alu, load_program, words_from_bin_prog, parse_moduli,
+    DEFAULT_MODULI, DATA_MEM_DEPTH, NUM_REGS, CALL_STACK_DEPTH, JUMP_OPS,
+    UART_DATA_PORT, UART_RX_PRESENT_PORT,
+    OP_NOP, OP_ADD, OP_SUB, OP_AND, OP_OR, OP_NOT, OP_SHL, OP_RLOAD, OP_RSTORE, OP_ANDBIT, OP_ORBIT, OP_NOTBIT,
+    OP_COMPARE, OP_ADDM, OP_SUBM, OP_MULM, OP_UNRLL, OP_UNRLU, OP_RLLM, OP_LDI, OP_OUTPUT, OP_INPUT,
+    OP_JMP, OP_JMPGT, OP_JMPLT, OP_JMPEQ, OP_JMPC, OP_CALL, OP_JR
+)
+
+# README: 'If 2 NOP instructions are not placed after each JMP ... arithmetic instructions will reach MEMWB before any Invalidation signal'
+README_JUMP_NOPS = 2
+# slots behind a taken jump that are fetched and then invalidated (EX_reg[3], IFID_reg[0], IFID_reg[1])
+JUMP_SHADOW = 3
+
+
+def decode_ctrl(opcode: int) -> dict:
+    """
+    Control signals PL_IFID raises for an opcode, plus which operand ports it reads.
+    """
+    ctrl = dict.fromkeys((
+        'add', 'or', 'not', 'and_bit', 'or_bit', 'and', 'carry_in', 'complement', 'compare', 'shl', 'lgcl',
+        'store', 'load', 'write', 'ld_imm', 'mul', 'rns_alu', 'unrl', 'unrl_lower', 'rllm', 'rns_dest',
+        'outp', 'inp', 'uncond', 'jgt', 'jlt', 'jeq', 'jc', 'push', 'pop', 'rd_op1', 'rd_op2', 'rd_op3'
+    ), False)
+    rd_op12 = ('rd_op1', 'rd_op2')
+
+    if opcode == OP_ADD:
+        ctrl.update(dict.fromkeys(('add', 'write') + rd_op12, True))
+    elif opcode == OP_SUB:
+        ctrl.update(dict.fromkeys(('add', 'carry_in', 'complement', 'write') + rd_op12, True))
+    elif opcode == OP_AND:
+        ctrl.update(dict.fromkeys(('and', 'lgcl', 'write') + rd_op12, True))
+    elif opcode == OP_OR:
+        ctrl.update(dict.fromkeys(('or', 'lgcl', 'write') + rd_op12, True))
+    elif opcode == OP_NOT:
+        ctrl.update(dict.fromkeys(('not', 'lgcl', 'write') + rd_op12, True))
+    elif opcode == OP_SHL:
+        ctrl.update(dict.fromkeys(('shl', 'write') + rd_op12, True))
+    elif opcode == OP_RLOAD:
+        ctrl.update(dict.fromkeys(('load', 'write') + rd_op12, True))
+    elif opcode == OP_RSTORE:
+        ctrl.update(dict.fromkeys(('store', 'rd_op3') + rd_op12, True))
+    elif opcode == OP_ANDBIT:
+        ctrl.update(dict.fromkeys(('and_bit', 'lgcl', 'write') + rd_op12, True))
+    elif opcode == OP_ORBIT:
+        ctrl.update(dict.fromkeys(('or_bit', 'lgcl', 'write') + rd_op12, True))
+    elif opcode == OP_NOTBIT:
+        ctrl.update(dict.fromkeys(('lgcl', 'write') + rd_op12, True)) # not_bitwise_true isn't wired into `logical`
+    elif opcode == OP_COMPARE:
+        ctrl.update(dict.fromkeys(('add', 'compare', 'carry_in', 'complement') + rd_op12, True))
+    elif opcode == OP_JMP:
+        ctrl['uncond'] = True
+    elif opcode == OP_JMPGT:
+        ctrl['jgt'] = True
+    elif opcode == OP_JMPLT:
+        ctrl['jlt'] = True
+    elif opcode == OP_JMPEQ:
+        ctrl['jeq'] = True
+    elif opcode == OP_JMPC:
+        ctrl['jc'] = True
+    elif opcode == OP_LDI:
+        ctrl.update(dict.fromkeys(('ld_imm', 'write'), True))
+    elif opcode == OP_OUTPUT:
+        ctrl.update(dict.fromkeys(('outp', 'rd_op3'), True))
+    elif opcode == OP_INPUT:
+        ctrl.update(dict.fromkeys(('inp', 'write'), True))
+    elif opcode in (OP_ADDM, OP_SUBM, OP_MULM):
+        ctrl.update(dict.fromkeys(('rns_alu', 'rns_dest', 'write') + rd_op12, True))
+        ctrl['add'] = opcode != OP_MULM
+        ctrl['complement'] = opcode == OP_SUBM
+        ctrl['mul'] = opcode == OP_MULM
+    elif opcode in (OP_UNRLL, OP_UNRLU):
+        ctrl.update(dict.fromkeys(('unrl', 'rd_op1'), True)) # write_to_regfile <= op1_addr[3], resolved per instruction
+        ctrl['unrl_lower'] = opcode == OP_UNRLL
+    elif opcode == OP_RLLM:
+        ctrl.update(dict.fromkeys(('rllm', 'rns_dest', 'write') + rd_op12, True))
+    elif opcode == OP_CALL:
+        ctrl.update(dict.fromkeys(('uncond', 'push'), True))
+    elif opcode == OP_JR:
+        ctrl.update(dict.fromkeys(('uncond', 'pop'), True))
+    return ctrl
+
+
+CTRL = [decode_ctrl(opcode) for opcode in range(32)]
+
+
+def int_alu(ctrl: dict, op1: int, op2: int) -> tuple:
+    """
+    PL_ALU for one instruction. Returns (dout, cout, gt, lt, eq).
+    """
+    op2 = 0 if ctrl['store'] else ((~op2 & 0xFF) if ctrl['complement'] else op2)
+    total = op1 + op2 + ctrl['carry_in']
+    adder_result, adder_cout = total & 0xFF, total >> 8
+
+    if ctrl['and']:
+        lgcl_result = 1 if (op1 and op2) else 0
+    elif ctrl['and_bit']:
+        lgcl_result = op1 & op2
+    elif ctrl['or']:
+        lgcl_result = 1 if (op1 or op2) else 0
+    elif ctrl['or_bit']:
+        lgcl_result = op1 | op2
+    elif ctrl['not']:
+        lgcl_result = 0 if op1 else 1
+    else:
+        lgcl_result = 0
+
+    shift_result, shift_cout = ((op1 << 1) & 0xFF, op1 >> 7) if ctrl['shl'] else (0, 0)
+
+    dout = adder_result if ctrl['add'] else (lgcl_result if ctrl['lgcl'] else shift_result)
+    cout = adder_cout if ctrl['add'] else shift_cout
+    compare = ctrl['compare']
+    return (
+        dout, cout,
+        compare and adder_cout == 1 and adder_result != 0,
+        compare and adder_cout == 0 and adder_result != 0,
+        compare and adder_result == 0
+    )
+
+
+class _IDEXReg:
+    """
+    IFID_reg and the operand registers that travel with it into EX.
+    """
+    __slots__ = ('addr', 'op', 'ctrl', 'write', 'res_addr', 'op1_addr', 'op2_addr', 'op3_addr',
+                 'op1', 'op2', 'op3', 'imm', 'pred_nxt', 'inv0', 'inv1', 'cause')
+
+    def __init__(self, addr=None, op=OP_NOP):
+        self.addr = addr
+        self.op = op
+        self.ctrl = CTRL[op]
+        self.write = False
+        self.res_addr = self.op1_addr = self.op2_addr = self.op3_addr = 0
+        self.op1 = self.op2 = self.op3 = self.imm = self.pred_nxt = 0
+        self.inv0 = self.inv1 = False
+        self.cause = None
+
+
+class _EXMEMReg:
+    """
+    EX_reg and the EX outputs that feed MEM/WB.
+    """
+    __slots__ = ('addr', 'op', 'result', 'dest', 'write', 'store', 'load', 'outp', 'inp', 'port', 'data_addr',
+                 'gt', 'lt', 'eq', 'carry', 'compare', 'save_cout', 'invalid', 'cause')
+
+    def __init__(self, addr=None, op=OP_NOP):
+        self.addr = addr
+        self.op = op
+        self.result = self.dest = self.port = self.data_addr = 0
+        self.write = self.store = self.load = self.outp = self.inp = False
+        self.gt = self.lt = self.eq = self.carry = self.compare = self.save_cout = False
+        self.invalid = False
+        self.cause = None
+
+
+
+class PipelineSim:
+    def run(self, max_cycles: int = 10_000_000) -> str:
+        """
+        Clock the pipeline until the program halts or max_cycles have elapsed. Halt reasons match ISASim.run():
+            'end_of_program'    an instruction past the end of the program reached MEM/WB un-squashed
+            'self_loop'         branch_taken_EX raised for a JMP to its own address
+            'rx_wait'           INPUT from RX-present reached MEM/WB with no RX data left (stop_on_rx_wait)
+            'max_cycles'
+        """
+        prog, n = self.prog, len(self.prog)
+        rds, rs1s, rs2s, imms, addrs = prog.rd, prog.rs1, prog.rs2, prog.imm, prog.addr
+        regs, rns_regs, mem, rx = self.regs, self.rns_regs, self.data_mem, self.uart_rx
+        retired, squashed = self.retired, self.squashed
+        fwd_id, fwd_ex, flush, stale = self.fwd_id, self.fwd_ex, self.flush, self.stale_reads
+        reason = 'max_cycles'
+        end_cycle = self.cycles + max_cycles
+
+        while self.cycles < end_cycle:
+            #**// MEM/WB //**#
+            m = self.memwb
+            inv = m.invalid
+            reg_wr_en = m.write and not inv
+            if m.inp:
+                io_read = 0
+                if not inv:
+                    if m.port == UART_DATA_PORT:
+                        io_read = rx.popleft() if rx else 0
+                    elif m.port == UART_RX_PRESENT_PORT:
+                        if not rx and self.stop_on_rx_wait:
+                            reason = 'rx_wait'
+                            break
+                        io_read = 1 if rx else 0
+                wr_data = io_read
+            elif m.load:
+                wr_data = mem[m.data_addr]
+            else:
+                wr_data = m.result
+            dest = m.dest
+
+            if m.addr is not None and m.addr >= n and not inv:
+                reason = 'end_of_program'
+                break
+
+            #**// IF/ID //**#
+            f_addr, f_op = self.ifid
+            fc = CTRL[f_op]
+            invalidate_fetch = self.branch_taken_ex
+            nxt = _IDEXReg(f_addr, f_op)
+            if f_addr is not None and f_addr < n:
+                nxt.res_addr = rds[f_addr]
+                nxt.imm = imms[f_addr]
+                nxt.op1_addr = rs1s[f_addr] if fc['rd_op1'] else 0
+                nxt.op2_addr = rs2s[f_addr] if fc['rd_op2'] else 0
+                nxt.op3_addr = rds[f_addr] if fc['rd_op3'] else 0
+                nxt.write = fc['write'] or (fc['unrl'] and bool(rs1s[f_addr] & 8))
+                nxt.pred_nxt = self.ret_addr if fc['pop'] else addrs[f_addr]
+
+                if fc['rd_op1'] or fc['rd_op2'] or fc['rd_op3']:
+                    vals = []
+                    for port, addr4 in ((1, nxt.op1_addr), (2, nxt.op2_addr), (3, nxt.op3_addr)):
+                        val = rns_regs[addr4 & 7] if (addr4 & 8) else regs[addr4 & 7]
+                        if addr4 == dest and reg_wr_en:
+                            if fc['load']:
+                                stale[f_addr] += fc[f'rd_op{port}']
+                            else:
+                                val = wr_data
+                                fwd_id[f_addr] += fc[f'rd_op{port}']
+                        vals.append(val)
+                    nxt.op1, nxt.op2, nxt.op3 = vals[0], vals[1], vals[2] & 0xFF
+
+            push = fc['push'] and not invalidate_fetch
+            pop = fc['pop']
+            push_addr = self.pc
+
+            #**// EX //**#
+            e = self.idex
+            ec = e.ctrl
+            op1, op2, op3 = e.op1, e.op2, e.op3
+            if reg_wr_en:
+                for port, addr4 in ((1, e.op1_addr), (2, e.op2_addr), (3, e.op3_addr)):
+                    if addr4 == dest:
+                        if ec['load']:
+                            stale[e.addr] += ec[f'rd_op{port}']
+                            continue
+                        if port == 1:
+                            op1 = wr_data
+                        elif port == 2:
+                            op2 = wr_data
+                        else:
+                            op3 = wr_data & 0xFF
+                        if e.addr is not None:
+                            fwd_ex[e.addr] += ec[f'rd_op{port}']
+
+            dout, cout, gt, lt, eq = int_alu(ec, op1 & 0xFF, op2 & 0xFF)
+            ex_out = _EXMEMReg(e.addr, e.op)
+            if ec['rns_alu']:
+                ex_out.result = rns_alu(self.moduli, e.op, op1, e.op1_addr & 8, op2, e.op2_addr & 8)
+            elif ec['rllm']:
+                ex_out.result = ((op1 & 0xFF) << 8) | (op2 & 0xFF)
+            elif ec['store']:
+                ex_out.result = op3
+            elif ec['ld_imm']:
+                ex_out.result = e.imm
+            elif ec['unrl']:
+                ex_out.result = (op1 & 0xFF) if ec['unrl_lower'] else ((op1 >> 8) & 0xFF)
+            elif ec['outp']:
+                ex_out.result = op3
+                ex_out.port = e.imm
+            elif ec['inp']:
+                ex_out.port = e.imm
+            else:
+                ex_out.result = dout
+            if ec['store'] or ec['load']:
+                ex_out.data_addr = ((op1 & 0xFF) << 8) | (op2 & 0xFF)
+            ex_out.save_cout = (ec['add'] and not ec['compare']) or ec['shl']
+            ex_out.gt, ex_out.lt, ex_out.eq, ex_out.compare = gt, lt, eq, ec['compare']
+            ex_out.carry = ex_out.save_cout and bool(cout)
+            ex_out.write, ex_out.store, ex_out.load = e.write, ec['store'], ec['load']
+            ex_out.outp, ex_out.inp = ec['outp'], ec['inp']
+            ex_out.dest = (8 if ec['rns_dest'] else 0) | (0 if ec['store'] else e.res_addr)
+            ex_out.invalid = self.branch_taken_ex or e.inv0 or e.inv1
+            ex_out.cause = self.taken_jump if self.branch_taken_ex else e.cause
+
+            # ctrl_BranchPred
+            ex_flags_valid = m.compare and not inv
+            flag_gt = (ex_flags_valid and m.gt) or self.conds_memwb[0]
+            flag_lt = (ex_flags_valid and m.lt) or self.conds_memwb[1]
+            flag_eq = (ex_flags_valid and m.eq) or self.conds_memwb[2]
+            flag_c = (ex_flags_valid and m.carry) or self.conds_memwb[3]
+            branch_taken = (
+                (ec['jgt'] and flag_gt) or (ec['jlt'] and flag_lt) or (ec['jeq'] and flag_eq) or
+                (ec['jc'] and flag_c) or (ec['uncond'] and not inv)
+            )
+
+            #**// Clock edge //**#
+            if m.addr is not None:
+                if inv:
+                    squashed[m.addr] += 1
+                    if m.cause is not None:
+                        flush[m.cause] += 1
+                else:
+                    retired[m.addr] += 1
+                    self.retired_total += 1
+                    if m.op == OP_NOP:
+                        self.nops_retired += 1
+
+            if reg_wr_en:
+                if dest & 8:
+                    rns_regs[dest & 7] = wr_data
+                else:
+                    regs[dest & 7] = wr_data & 0xFF
+            if m.store and not inv:
+                mem[m.data_addr] = wr_data & 0xFF
+            if m.outp and not inv:
+                if m.port == UART_DATA_PORT:
+                    self.uart_tx.append(m.result & 0xFF)
+                else:
+                    self.io_writes.append((m.port, m.result & 0xFF))
+
+            conds = [False, False, False, False]
+            if m.save_cout and not inv:
+                conds[3] = m.carry
+            if m.compare and not inv:
+                conds[0], conds[1], conds[2] = m.gt, m.lt, m.eq
+            self.conds_memwb = conds
+
+            branch_taken_ex = bool(branch_taken) and not self.branch_taken_ex and not e.inv0
+            if branch_taken_ex and e.addr is not None:
+                self.taken_jump = e.addr
+                self.jumps_taken += 1
+                if e.op == OP_JMP and e.pred_nxt == e.addr:
+                    reason = 'self_loop'
+                    self.cycles += 1
+                    break
+
+            nxt.inv0 = invalidate_fetch
+            nxt.inv1 = e.inv0
+            nxt.cause = self.taken_jump if invalidate_fetch else e.cause
+
+            next_pc = self.pred_nxt_ex if self.branch_taken_ex else (self.pc + 1) & (len(self.imem_op) - 1)
+            self.ifid = (self.pc, self.imem_op[self.pc])
+            self.pc = next_pc
+            self.pred_nxt_ex = e.pred_nxt
+            self.branch_taken_ex = branch_taken_ex
+            self.memwb = ex_out
+            self.idex = nxt
+
+            # ctrl_CallRetStack - ret_addr registers the pre-edge top of stack
+            sp = len(self.stack)
+            self.ret_addr = self.stack[sp - 1] if sp else 0
+            if push or pop:
+                # what tb_rns.v prints: push / pop seen at this edge, prog_ctr and sp before it
+                self.stack_events.append((self.cycles, 'push' if push else 'pop', push_addr, sp))
+            if push:
+                if sp < CALL_STACK_DEPTH - 1:
+                    self.stack.append(push_addr)
+                else:
+                    self.stack_overflows += 1
+            elif pop and sp:
+                self.stack.pop()
+
+            self.cycles += 1
+
+        self.halt_reason = reason
+        return reason
+
+
+    def get_jump_shadow_violations(self) -> list:
+        """
+        Jumps not followed by the README_JUMP_NOPS NOPs the README asks for.
+        Returns (jump addr, [non-NOP shadow addrs]).
+        """
+        ops = self.prog.opcode
+        n = len(ops)
+        violations = []
+        for addr in range(n):
+            if ops[addr] in JUMP_OPS:
+                shadow = [a for a in range(addr + 1, min(addr + 1 + README_JUMP_NOPS, n)) if ops[a] != OP_NOP]
+                if shadow:
+                    violations.append((addr, shadow))
+        return violations
+
+
+    def get_report(self) -> dict:
+        """
+        Cycle / CPI summary, per-address counters, and (if labels were given) per-label region totals.
+        """
+        cycles = self.cycles
+        useful = self.retired_total - self.nops_retired
+        per_addr = []
+        for addr in range(len(self.prog)):
+            row = {
+                'addr': addr,
+                'word': self.prog.words[addr],
+                'retired': self.retired[addr],
+                'squashed': self.squashed[addr],
+                'fwd_id': self.fwd_id[addr],
+                'fwd_ex': self.fwd_ex[addr],
+                'flush_cycles': self.flush[addr],
+                'stale_reads': self.stale_reads[addr]
+            }
+            if self.inst_text:
+                row['inst'] = self.inst_text.get(addr, '')
+            per_addr.append(row)
+
+        regions = {}
+        if self.labels:
+            starts = sorted((addr, label) for label, addr in self.labels.items())
+            for idx, (start, label) in enumerate(starts):
+                stop = starts[idx + 1][0] if idx + 1 < len(starts) else len(self.prog)
+                rows = per_addr[start:stop]
+                regions[label] = {
+                    'start': start,
+                    'end': stop - 1,
+                    'cycles': sum(r['retired'] + r['squashed'] for r in rows),
+                    'retired': sum(r['retired'] for r in rows),
+                    'nops': sum(r['retired'] for r in rows if self.prog.opcode[r['addr']] == OP_NOP),
+                    'squashed': sum(r['squashed'] for r in rows),
+                    'flush_cycles': sum(r['flush_cycles'] for r in rows),
+                    'fwd_hits': sum(r['fwd_id'] + r['fwd_ex'] for r in rows)
+                }
+
+        return {
+            'halt_reason': self.halt_reason,
+            'cycles': cycles,
+            'retired': self.retired_total,
+            'retired_non_nop': useful,
+            'cpi': cycles / self.retired_total if self.retired_total else None,
+            'cpi_non_nop': cycles / useful if useful else None,
+            'squashed': sum(self.squashed),
+            'flush_cycles': sum(self.flush),
+            'fwd_id_hits': sum(self.fwd_id),
+            'fwd_ex_hits': sum(self.fwd_ex),
+            'stale_reads': sum(self.stale_reads),
+            'jumps_taken': self.jumps_taken,
+            'jump_shadow_violations': self.get_jump_shadow_violations(),
+            'per_addr': per_addr,
+            'regions': regions
+        }
+
+
+    def __init__(self, words: Iterable[int], moduli: tuple = DEFAULT_MODULI, uart_rx: Iterable[int] = (),
+                 stop_on_rx_wait: bool = True, labels: dict = None, inst_text: dict = None, prog_ctr_wid: int = 10):
+        '''
+        Cycle-level model of processor_top. Arguments match ISASim, plus:
+        labels:     {label: instruction addr}, to total the report per labelled region
+        inst_text:  {instruction addr: source text}, for the report
+
+        Out of reset, Instr_Mem has been fetching address 0 the whole time reset was held,
+        so instruction 0 passes through IF/ID twice - as it does in tb_rns.v.
+        '''
+        self.prog = words if isinstance(words, DecodedProg) else DecodedProg(words)
+        self.moduli = tuple(moduli)
+        self.labels = labels or {}
+        self.inst_text = inst_text or {}
+        n = len(self.prog)
+        self.imem_op = list(self.prog.opcode) + [OP_NOP] * (2 ** prog_ctr_wid - n)
+
+        self.regs = [0] * NUM_REGS
+        self.rns_regs = [0] * NUM_REGS
+        self.data_mem = bytearray(DATA_MEM_DEPTH)
+        self.stack = []
+        self.stack_overflows = 0
+        self.stack_events = [] # (cycle, 'push' / 'pop', prog_ctr, sp before the edge)
+        self.ret_addr = 0
+        self.uart_rx = deque(uart_rx)
+        self.uart_tx = bytearray()
+        self.io_writes = []
+        self.stop_on_rx_wait = stop_on_rx_wait
+
+        # pipeline state directly after reset
+        self.pc = 0
+        self.ifid = (0, self.imem_op[0])
+        self.idex = _IDEXReg()
+        self.memwb = _EXMEMReg()
+        self.branch_taken_ex = False
+        self.pred_nxt_ex = 0
+        self.conds_memwb = [False, False, False, False]
+        self.taken_jump = None
+
+        self.cycles = 0
+        self.retired_total = 0
+        self.nops_retired = 0
+        self.jumps_taken = 0
+        self.halt_reason = None
+        self.retired = [0] * len(self.imem_op)
+        self.squashed = [0] * len(self.imem_op)
+        self.fwd_id = [0] * len(self.imem_op)
+        self.fwd_ex = [0] * len(self.imem_op)
+        self.flush = [0] * len(self.imem_op)
+        self.stale_reads = [0] * len(self.imem_op)
+
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("""\033[1;31mUsage: \033[22mpython PipelineSim.py <program (.asm | Instr_Mem.v | hex listing | .mem)>\033[0m\n
+        \033[1;32mAdditional optional arguments:\033[0m\n
+        \033[32m--max_cycles <n>\033[0m\n
+        \tStop after n clock cycles (default: 10000000)\n
+        \033[32m--moduli <moduli>\033[0m\n
+        \tRNS moduli, either a Verilog literal "{9'd256, 9'd129}" or a domain-ordered list "129,256" (default: 129,256)\n
+        \033[32m--uart_rx <file>\033[0m\n
+        \tFeed the bytes of a file to UART RX\n
+        \033[32m--mem_in <image>\033[0m\n
+        \tPreload data memory from an image (.bin / .mem / .coe / data_mem listing, see MemImage.py)\n
+        \033[32m--mem_out <image>\033[0m\n
+        \tWrite data memory to an image when the run ends (format from the extension, e.g. .bin)\n
+        \033[32m--per_addr\033[0m\n
+        \tPrint the per-address breakdown (addresses that did anything other than retire once)\n
+        \033[32m--report_out <file.json>\033[0m\n
+        \tWrite the full report (per-address counters included) as JSON, e.g. as a profile for ASMtoV.py --layout_profile
+        """)
+        sys.exit(1)
+
+    labels = {}
+    inst_text = {}
+    try:
+        if sys.argv[1].lower().endswith('.asm'):
+            asm_to_bin = ASMtoBin(open(sys.argv[1], 'r'))
+            words = words_from_bin_prog(asm_to_bin.getBinProg())
+            labels = {label: addr for label, (_, addr) in asm_to_bin.label_addresses.items()}
+            inst_text = {addr: inst[1] for addr, inst in asm_to_bin.getProg().items()}
+        else:
+            words = load_program(sys.argv[1])
+    except OSError:
+        print(f"\033[1;31mError: Could not open program {sys.argv[1]}\033[0m")
+        sys.exit(1)
+
+    max_cycles = 10_000_000
+    moduli = DEFAULT_MODULI
+    uart_rx = b''
+    if "--max_cycles" in sys.argv:
+        max_cycles = int(sys.argv[sys.argv.index("--max_cycles") + 1])
+    if "--moduli" in sys.argv:
+        moduli = parse_moduli(sys.argv[sys.argv.index("--moduli") + 1])
+    if "--uart_rx" in sys.argv:
+        with open(sys.argv[sys.argv.index("--uart_rx") + 1], 'rb') as rx_fin:
+            uart_rx = rx_fin.read()
+
+    start = perf_counter()
+    sim = PipelineSim(words, moduli=moduli, uart_rx=uart_rx, labels=labels, inst_text=inst_text)
+    if "--mem_in" in sys.argv:
+        from MemImage import read_image
+        sim.data_mem[:] = read_image(sys.argv[sys.argv.index("--mem_in") + 1]).tobytes()
+    sim.run(max_cycles)
+    elapsed = perf_counter() - start
+    report = sim.get_report()
+    if "--report_out" in sys.argv:
+        import json
+        with open(sys.argv[sys.argv.index("--report_out") + 1], 'w') as report_fout:
+            json.dump(report, report_fout, indent=1)
+    if "--mem_out" in sys.argv:
+        from MemImage import write_image
+        write_image(sys.argv[sys.argv.index("--mem_out") + 1], sim.data_mem)
+
+    print(f"\033[1;32mHalted ({report['halt_reason']}) after {report['cycles']} cycles, {elapsed * 1000:.1f} ms\033[0m")
+    print(f"Retired:        {report['retired']} ({report['retired_non_nop']} excluding NOPs)")
+    print(f"CPI:            {report['cpi'] or 0:.3f} ({report['cpi_non_nop'] or 0:.3f} excluding NOPs)")
+    print(f"Taken jumps:    {report['jumps_taken']}, {report['flush_cycles']} flush cycles, {report['squashed']} squashed slots")
+    print(f"Bypass hits:    {report['fwd_id_hits']} ID, {report['fwd_ex_hits']} EX")
+    if report['stale_reads']:
+        print(f"\033[1;31mStale reads:    {report['stale_reads']} (bypass suppressed for RLOAD operands)\033[0m")
+    for jump_addr, shadow in report['jump_shadow_violations']:
+        print(f"\033[1;31mJump at 10'h{jump_addr:03X} is followed by non-NOP instructions at {', '.join(f'10h{a:03X}' for a in shadow)}\033[0m")
+
+    if report['regions']:
+        print(f"\n\033[1;32mLabel\t\t\t| Addr range  | Cycles  | Retired | NOPs    | Squashed | Flush   | Bypass\033[0m")
+        for label, region in report['regions'].items():
+            print(f"{label + (23 - len(label)) * ' '} | {region['start']:03X} - {region['end']:03X} | {region['cycles']:<7} | "
+                  f"{region['retired']:<7} | {region['nops']:<7} | {region['squashed']:<8} | {region['flush_cycles']:<7} | {region['fwd_hits']}")
+
+    if "--per_addr" in sys.argv:
+        print(f"\n\033[1;32mAddr | Inst                    | Retired | Squashed | Fwd ID | Fwd EX | Flush  | Stale\033[0m")
+        for row in report['per_addr']:
+            if row['retired'] == 1 and not (row['squashed'] or row['fwd_id'] or row['fwd_ex'] or row['flush_cycles'] or row['stale_reads']):
+                continue
+            if not (row['retired'] or row['squashed']):
+                continue
+            inst = row.get('inst', f"16'h{row['word']:04X}")
+            print(f"{row['addr']:03X}  | {inst + (23 - len(inst)) * ' '} | {row['retired']:<7} | {row['squashed']:<8} | "
+                  f"{row['fwd_id']:<6} | {row['fwd_ex']:<6} | {row['flush_cycles']:<6} | {row['stale_reads']}")
@@ -0,0 +1,352 @@
+"""
+Parser for the xsim simulate.log tb_rns.v produces, and an aligner against PipelineSim.
+
+tb_rns.v prints a full ctrl_CallRetStack snapshot on every push / pop (10 lines per event), then the final integer
+and RNS register files and every non-zero Data_Mem byte, so a 5 us run is already ~5000 lines. SimLog reads the
+log a line at a time into columns (numpy arrays):
+    events      kind (EVENT_PUSH / EVENT_POP), prog_ctr, sp before the edge, sim time in ns (-1 if the log
+                predates the time stamps), log line, and the 8-entry stack snapshot (-1 for x)
+    final       integer registers, packed RNS registers (domain 0 in bits [7:0], like ISASim), Data_Mem image
+    uart        UART TX bytes, in order
+SimLog.save() writes the columns to an .npz that SimLog() loads back without re-parsing.
+
+Events are on clock edges, so a sim time maps to a cycle directly (get_cycle), and by_cycle[cycle] holds the last
+event at or before that cycle: get_event_at(time) is a pair of array lookups.
+
+align_trace() runs PipelineSim on the program for the same number of cycles and diffs stack events (order, prog_ctr,
+sp, and cycle where the log has times), final registers, UART output and Data_Mem, reporting the first mismatch
+with its log line number.
+"""
+import sys
+import re
+from time import perf_counter
+
+import numpy as np
+
+from ISASim import load_program, parse_moduli, DEFAULT_MODULI, DATA_MEM_DEPTH, NUM_REGS, CALL_STACK_DEPTH
+from MemImage import diff_images, get_diff_lines, DUMP_END
+
+# tb_rns.v: 'always clk100 = #5 ~clk100', 'reset = #50 1'b0' - cycle 0 is the first posedge with reset low
+CLK_PERIOD_NS = 10
+RESET_NS = 50
+FIRST_EDGE_NS = RESET_NS + CLK_PERIOD_NS // 2
+
+EVENT_PUSH = 0
+EVENT_POP = 1
+EVENT_NAMES = ("push", "pop")
+
+PUSH_LINE = re.compile(r"Pushing ([0-9a-fA-FxXzZ]+) to stack ptr pos (\d+)(?: at (\d+) ns)?")
+POP_LINE = re.compile(r"Popping from stack(?: at (\d+) ns)?")
+POP_FROM_LINE = re.compile(r"Returning to sp pos (\d+) - From ([0-9a-fA-FxXzZ]+)")
+STACK_LINE = re.compile(r"^(\d)\t\s*\| ([0-9a-fA-FxXzZ]+) \|")
+REG_LINE = re.compile(r"reg_file \[(\d+)\] = (\S+)")
+RNS_LINE = re.compile(r"^(\d)\t\| ([01xXzZ]{8}) \| ([01xXzZ]{8})")
+MEM_LINE = re.compile(r"data_mem \[(\d+)\] = (\d+)")
+UART_LINE = re.compile(r"UART TX Data: ([01xXzZ]+)")
+STOP_LINE = re.compile(r"\$stop called at time : (\d+) ns")
+
+
+def get_cycle(time_ns: int) -> int:
+    return (time_ns - FIRST_EDGE_NS) // CLK_PERIOD_NS
+
+
+def get_time(cycle: int) -> int:
+    return FIRST_EDGE_NS + cycle * CLK_PERIOD_NS
+
+
+def get_val(text: str, base: int) -> int:
+    """
+    A $display'd value, -1 if any bit is x / z.
+    """
+    return -1 if any(ch in "xXzZ" for ch in text) else int(text, base)
+
+
+class SimLog:
+    def parse(self, fileobj):
+        kinds, pcs, sps, times, lines, stacks = [], [], [], [], [], []
+        regs = [-1] * NUM_REGS
+        rns = [-1] * NUM_REGS
+        mem_addrs, mem_vals = [], []
+        uart, uart_lines = [], []
+        section = None
+        snapshot = None
+        for line_no, line in enumerate(fileobj, 1):
+            if snapshot is not None:
+                match = STACK_LINE.match(line)
+                if match:
+                    snapshot[int(match.group(1))] = get_val(match.group(2), 16)
+                    continue
+                match = POP_FROM_LINE.search(line)
+                if match: # 2nd header line of a pop
+                    # 'sp - 1' is printed as a 32-bit unsigned, so a pop on an empty stack shows 4294967295
+                    sps[-1] = (int(match.group(1)) + 1) & 0xFFFFFFFF
+                    pcs[-1] = get_val(match.group(2), 16)
+                    continue
+                if line.startswith("Stack contents") or not line.strip():
+                    continue
+                snapshot = None
+
+            if line.startswith("data_mem"):
+                match = MEM_LINE.match(line)
+                if match:
+                    mem_addrs.append(int(match.group(1)))
+                    mem_vals.append(int(match.group(2)))
+                continue
+            match = PUSH_LINE.search(line)
+            if match:
+                kinds.append(EVENT_PUSH)
+                pcs.append(get_val(match.group(1), 16))
+                sps.append(int(match.group(2)))
+                times.append(int(match.group(3)) if match.group(3) else -1)
+            elif line.startswith("Popping"):
+                match = POP_LINE.search(line)
+                kinds.append(EVENT_POP)
+                pcs.append(-1)
+                sps.append(0)
+                times.append(int(match.group(1)) if match and match.group(1) else -1)
+            else:
+                match = UART_LINE.search(line)
+                if match:
+                    uart.append(get_val(match.group(1), 2))
+                    uart_lines.append(line_no)
+                elif "Printing Integer Register" in line:
+                    section = 'regs'
+                elif "Printing RNS Domain Register" in line:
+                    section = 'rns'
+                elif line.startswith("---"):
+                    section = None
+                elif section == 'regs' and REG_LINE.match(line):
+                    match = REG_LINE.match(line)
+                    if int(match.group(1)) < NUM_REGS:
+                        regs[int(match.group(1))] = get_val(match.group(2), 10)
+                elif section == 'rns' and RNS_LINE.match(line):
+                    match = RNS_LINE.match(line)
+                    upper, lower = get_val(match.group(2), 2), get_val(match.group(3), 2)
+                    rns[int(match.group(1))] = -1 if upper < 0 or lower < 0 else (upper << 8) | lower
+                elif STOP_LINE.search(line):
+                    self.stop_time = int(STOP_LINE.search(line).group(1))
+                continue
+            # a new event: its snapshot follows
+            lines.append(line_no)
+            snapshot = [-1] * CALL_STACK_DEPTH
+            stacks.append(snapshot)
+
+        self.kind = np.array(kinds, dtype=np.uint8)
+        self.pc = np.array(pcs, dtype=np.int16)
+        self.sp = np.array(sps, dtype=np.int64).clip(0, CALL_STACK_DEPTH).astype(np.uint8)
+        self.time = np.array(times, dtype=np.int64)
+        self.line = np.array(lines, dtype=np.uint32)
+        self.stack = np.array(stacks, dtype=np.int16).reshape(-1, CALL_STACK_DEPTH)
+        self.regs = np.array(regs, dtype=np.int16)
+        self.rns_regs = np.array(rns, dtype=np.int32)
+        self.data_mem = np.zeros(DATA_MEM_DEPTH, dtype=np.uint8)
+        if mem_addrs:
+            self.data_mem[np.array(mem_addrs)] = np.array(mem_vals)
+        self.uart = np.array(uart, dtype=np.int16)
+        self.uart_line = np.array(uart_lines, dtype=np.uint32)
+
+
+    def index(self):
+        """
+        by_cycle[c] = index of the last event at or before cycle c, -1 before the first. Empty without time stamps.
+        """
+        timed = self.time >= 0
+        if not timed.any():
+            self.by_cycle = np.zeros(0, dtype=np.int32)
+            return
+        cycles = get_cycle(self.time[timed])
+        idxs = np.flatnonzero(timed)
+        end = int(cycles.max()) + 1 if self.stop_time is None else max(int(cycles.max()) + 1, get_cycle(self.stop_time) + 1)
+        marks = np.full(end, -1, dtype=np.int32)
+        marks[cycles] = idxs # events on the same edge: the later one wins
+        self.by_cycle = np.maximum.accumulate(marks)
+
+
+    def save(self, path: str):
+        np.savez(path, kind=self.kind, pc=self.pc, sp=self.sp, time=self.time, line=self.line, stack=self.stack,
+                 regs=self.regs, rns_regs=self.rns_regs, data_mem=self.data_mem, uart=self.uart, uart_line=self.uart_line,
+                 stop_time=np.int64(-1 if self.stop_time is None else self.stop_time))
+
+
+    def load(self, path: str):
+        with np.load(path) as store:
+            for name in ('kind', 'pc', 'sp', 'time', 'line', 'stack', 'regs', 'rns_regs', 'data_mem', 'uart', 'uart_line'):
+                setattr(self, name, store[name])
+            stop_time = int(store['stop_time'])
+        self.stop_time = None if stop_time < 0 else stop_time
+
+
+    def __len__(self) -> int:
+        return len(self.kind)
+
+
+    def get_event(self, idx: int) -> dict:
+        return {
+            'index': idx,
+            'kind': EVENT_NAMES[self.kind[idx]],
+            'prog_ctr': int(self.pc[idx]),
+            'sp': int(self.sp[idx]),
+            'time': int(self.time[idx]),
+            'line': int(self.line[idx]),
+            'stack': self.stack[idx].tolist()
+        }
+
+
+    def get_event_at(self, time_ns: int):
+        """
+        The last stack event at or before time_ns (None if there is none, or the log has no time stamps).
+        """
+        cycle = get_cycle(time_ns)
+        if cycle < 0 or not len(self.by_cycle):
+            return None
+        idx = self.by_cycle[min(cycle, len(self.by_cycle) - 1)]
+        return None if idx < 0 else self.get_event(int(idx))
+
+
+    def __init__(self, path: str):
+        '''
+        Taking an xsim simulate.log from tb_rns.v (or a store written by SimLog.save()), build the columns
+        described above.
+        '''
+        self.stop_time = None
+        if path.lower().endswith('.npz'):
+            self.load(path)
+        else:
+            with open(path, 'r', errors='replace') as fileobj:
+                self.parse(fileobj)
+        self.index()
+
+
+def align_trace(log: SimLog, words: list, moduli: tuple = DEFAULT_MODULI, max_cycles: int = None) -> tuple:
+    """
+    Run PipelineSim for as many cycles as the log covers (up to $stop, or max_cycles) and diff it against the log.
+    Returns (number of mismatches, report lines).
+    """
+    from PipelineSim import PipelineSim
+
+    if max_cycles is None:
+        if log.stop_time is None:
+            raise ValueError("The log has no '$stop called at time' line; give the number of cycles to run")
+        max_cycles = get_cycle(log.stop_time - 1) + 1
+    sim = PipelineSim(words, moduli=moduli, stop_on_rx_wait=False)
+    sim.run(max_cycles)
+
+    report = []
+    num_bad = 0
+    events = sim.stack_events
+    m_cycle = np.array([ev[0] for ev in events], dtype=np.int64)
+    m_kind = np.array([EVENT_PUSH if ev[1] == 'push' else EVENT_POP for ev in events], dtype=np.uint8)
+    m_pc = np.array([ev[2] for ev in events], dtype=np.int16)
+    m_sp = np.array([ev[3] for ev in events], dtype=np.uint8)
+
+    num = min(len(log), len(events))
+    bad = (log.kind[:num] != m_kind[:num]) | (log.pc[:num] != m_pc[:num]) | (log.sp[:num] != m_sp[:num])
+    first = int(np.argmax(bad)) if bad.any() else (num if len(log) != len(events) else None)
+    if first is None:
+        report.append(f"Stack events:   {len(events)} match")
+    else:
+        num_bad += 1
+        report.append(f"Stack events:   diverge at event {first} ({len(log)} in the log, {len(events)} from the model)")
+        if first < len(log):
+            ev = log.get_event(first)
+            report.append(f"    log   line {ev['line']}: {ev['kind']} at prog_ctr {ev['prog_ctr']:03X}, sp {ev['sp']}"
+                          + (f", {ev['time']} ns" if ev['time'] >= 0 else ""))
+        if first < len(events):
+            report.append(f"    model cycle {events[first][0]} ({get_time(events[first][0])} ns): {events[first][1]} at "
+                          f"prog_ctr {events[first][2]:03X}, sp {events[first][3]}")
+
+    timed = np.flatnonzero(log.time[:num] >= 0)
+    if len(timed):
+        drift = timed[get_cycle(log.time[timed]) != m_cycle[timed]]
+        if len(drift):
+            num_bad += 1
+            idx = int(drift[0])
+            report.append(f"Event timing:   {len(drift)} events on a different cycle, first is event {idx} "
+                          f"(log line {int(log.line[idx])}: cycle {get_cycle(int(log.time[idx]))}, model: cycle {int(m_cycle[idx])})")
+        else:
+            report.append(f"Event timing:   {len(timed)} events on the same cycle")
+
+    for name, got, exp in (("Registers", log.regs, sim.regs), ("RNS registers", log.rns_regs, sim.rns_regs)):
+        diffs = [(idx, int(got[idx]), val) for idx, val in enumerate(exp) if got[idx] != val]
+        if diffs:
+            num_bad += 1
+            report.append(f"{name + ':':<16}" + ', '.join(f"[{idx}] log {'x' if g < 0 else hex(g)} model {hex(m)}" for idx, g, m in diffs))
+        else:
+            report.append(f"{name + ':':<16}match")
+
+    m_uart = list(sim.uart_tx)
+    if log.uart.tolist() != m_uart:
+        num_bad += 1
+        first = next((idx for idx, (a, b) in enumerate(zip(log.uart.tolist(), m_uart)) if a != b), min(len(log.uart), len(m_uart)))
+        where = f" (log line {int(log.uart_line[first])})" if first < len(log.uart) else ""
+        report.append(f"UART TX:        {len(log.uart)} bytes in the log, {len(m_uart)} from the model, first difference at byte {first}{where}")
+    else:
+        report.append(f"UART TX:        {len(m_uart)} bytes match")
+
+    mem_bad, ranges = diff_images(sim.data_mem, log.data_mem, DUMP_END)
+    num_bad += bool(mem_bad)
+    report.append(f"Data memory:    " + ("match" if not mem_bad else f"differs (expected = model, got = log)"))
+    if mem_bad:
+        report.extend("    " + line for line in get_diff_lines(mem_bad, ranges))
+    return num_bad, report
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("""\033[1;31mUsage: \033[22mpython SimLog.py <simulate.log | store.npz>\033[0m\n
+        \033[1;32mAdditional optional arguments:\033[0m\n
+        \033[32m--store_out <file.npz>\033[0m\n
+        \tSave the parsed columns, to be loaded again in place of the log\n
+        \033[32m--event <n>\033[0m\n
+        \tPrint stack event n\n
+        \033[32m--time <ns>\033[0m\n
+        \tPrint the last stack event at or before a sim time (needs a log with time stamps)\n
+        \033[32m--program <program (.asm | Instr_Mem.v | hex listing | .mem)>\033[0m\n
+        \tRun PipelineSim.py on the simulated program and diff it against the log\n
+        \033[32m--max_cycles <n>\033[0m\n
+        \tCycles to run the model for (default: up to the log's $stop time)\n
+        \033[32m--moduli <moduli>\033[0m\n
+        \tRNS moduli for the model, as for ISASim.py (default: 129,256)
+        """)
+        sys.exit(1)
+
+    start = perf_counter()
+    try:
+        log = SimLog(sys.argv[1])
+    except OSError:
+        print(f"\033[1;31mError: Could not open {sys.argv[1]}\033[0m")
+        sys.exit(1)
+    elapsed = perf_counter() - start
+    pushes = int(np.count_nonzero(log.kind == EVENT_PUSH))
+    print(f"\033[1;32m{pushes} pushes, {len(log) - pushes} pops, {len(log.uart)} UART TX bytes, "
+          f"{int(np.count_nonzero(log.data_mem))} non-zero data memory bytes, read in {elapsed * 1000:.1f} ms\033[0m")
+
+    if "--store_out" in sys.argv:
+        log.save(sys.argv[sys.argv.index("--store_out") + 1])
+    if "--event" in sys.argv:
+        idx = int(sys.argv[sys.argv.index("--event") + 1])
+        print(log.get_event(idx) if -len(log) <= idx < len(log) else f"\033[1;31mNo event {idx}\033[0m")
+    if "--time" in sys.argv:
+        print(log.get_event_at(int(sys.argv[sys.argv.index("--time") + 1])))
+
+    if "--program" in sys.argv:
+        moduli = DEFAULT_MODULI
+        max_cycles = None
+        if "--moduli" in sys.argv:
+            moduli = parse_moduli(sys.argv[sys.argv.index("--moduli") + 1])
+        if "--max_cycles" in sys.argv:
+            max_cycles = int(sys.argv[sys.argv.index("--max_cycles") + 1])
+        try:
+            words = load_program(sys.argv[sys.argv.index("--program") + 1])
+            start = perf_counter()
+            num_bad, report = align_trace(log, words, moduli, max_cycles)
+        except OSError:
+            print(f"\033[1;31mError: Could not open program {sys.argv[sys.argv.index('--program') + 1]}\033[0m")
+            sys.exit(1)
+        except ValueError as e:
+            print(f"\033[1;31mError: {e}\033[0m")
+            sys.exit(1)
+        print('\n'.join(report))
+        color = "\033[1;31m" if num_bad else "\033[1;32m"
+        print(f"{color}{num_bad} mismatching sections, aligned in {(perf_counter() - start) * 1000:.1f} ms\033[0m")
+        sys.exit(1 if num_bad else 0)